@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарки для модуля database.py на синтетическом каталоге рецептов.
+
+Каждый сценарий создает временную базу данных, заполняет её рецептами
+и печатает время выполнения для нескольких размеров каталога.
+
+Пример запуска:
+    python benchmark.py recipes --sizes 100 1000 5000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List
+
+sys.path.append(os.path.dirname(__file__))
+from database import MultivarkaDatabase
+from shopping_list import build_shopping_list
+
+MEAL_TYPES = ["завтрак", "второй_завтрак", "обед", "полдник", "ужин"]
+PRODUCTS = [f"продукт_{i}" for i in range(200)]
+
+
+def populate_catalogue(database: MultivarkaDatabase, recipes_count: int, seed: int = 42) -> None:
+    """Заполняет базу синтетическими рецептами напрямую через SQL"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(database.db_path)
+    cursor = conn.cursor()
+
+    for i in range(recipes_count):
+        products = rng.sample(PRODUCTS, rng.randint(3, 8))
+        steps = range(1, rng.randint(2, 6))
+        cursor.execute(
+            "INSERT INTO recipes (name, meal_type, is_ready, ingredient_count, instruction_count) VALUES (?, ?, ?, ?, ?)",
+            (f"блюдо_{i}", MEAL_TYPES[i % len(MEAL_TYPES)], False, len(products), len(steps))
+        )
+        recipe_id = cursor.lastrowid
+        ingredients = [
+            (recipe_id, product, rng.randint(1, 500), "г", "quantity")
+            for product in products
+        ]
+        cursor.executemany("""
+            INSERT INTO recipe_ingredients (recipe_id, product_name, quantity, unit, ingredient_type)
+            VALUES (?, ?, ?, ?, ?)
+        """, ingredients)
+        instructions = [(recipe_id, step, f"шаг {step} для блюда {i}") for step in steps]
+        cursor.executemany("""
+            INSERT INTO recipe_instructions (recipe_id, step_number, instruction)
+            VALUES (?, ?, ?)
+        """, instructions)
+
+    conn.commit()
+    conn.close()
+
+
+class QueryCounter:
+    """Подсчитывает SQL-запросы, выполненные через get_connection() базы"""
+
+    def __init__(self, database: MultivarkaDatabase):
+        self.count = 0
+        self._original = database.get_connection
+        database.get_connection = self._get_connection
+
+    def _get_connection(self):
+        conn = self._original()
+        conn.set_trace_callback(self._trace)
+        return conn
+
+    def _trace(self, statement: str):
+        if statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE")):
+            self.count += 1
+
+
+def measure(func: Callable, repeat: int = 3) -> float:
+    """Возвращает лучшее время выполнения функции в миллисекундах"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def bench_recipes(sizes: List[int]) -> None:
+    """Загрузка рецептов: get_all_recipes и get_recipes_by_meal_type"""
+    print(f"{'рецептов':>10} {'запросов':>10} {'all, мс':>10} {'by_type, мс':>12}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = MultivarkaDatabase(os.path.join(tmp_dir, 'bench.db'))
+            populate_catalogue(database, size)
+            counter = QueryCounter(database)
+
+            database.get_all_recipes()
+            queries = counter.count
+
+            all_ms = measure(database.get_all_recipes)
+            by_type_ms = measure(lambda: database.get_recipes_by_meal_type("обед"))
+            print(f"{size:>10} {queries:>10} {all_ms:>10.1f} {by_type_ms:>12.1f}")
+
+
+def bench_pages(sizes: List[int]) -> None:
+    """Список рецептов: весь каталог (get_all_recipes_with_info) против одной страницы по ключу"""
+    print(f"{'рецептов':>10} {'весь, мс':>9} {'стр. 1, мс':>11} {'стр. 100, мс':>13} {'счетчики, мс':>13}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = MultivarkaDatabase(os.path.join(tmp_dir, 'bench.db'))
+            populate_catalogue(database, size)
+
+            full_ms = measure(database.get_all_recipes_with_info)
+            first_ms = measure(lambda: database.get_recipes_page(50))
+            cursor = None
+            for _ in range(99):
+                cursor = database.get_recipes_page(50, cursor)['next_cursor'] or cursor
+            deep_ms = measure(lambda: database.get_recipes_page(50, cursor))
+            counts_ms = measure(database.count_recipes_by_meal_type)
+            print(f"{size:>10} {full_ms:>9.1f} {first_ms:>11.2f} {deep_ms:>13.2f} {counts_ms:>13.3f}")
+
+
+def bench_listing(sizes: List[int]) -> None:
+    """Краткий список рецептов: прежний LEFT JOIN + GROUP BY против хранимого ingredient_count"""
+    join_sql = """
+        SELECT r.id, r.name, r.meal_type, r.is_ready, r.created_at,
+               COUNT(DISTINCT ri.id) as ingredient_count
+        FROM recipes r
+        LEFT JOIN recipe_ingredients ri ON r.id = ri.recipe_id
+        GROUP BY r.id, r.name, r.meal_type, r.is_ready, r.created_at
+        ORDER BY r.created_at DESC
+    """
+    column_sql = f"""
+        SELECT {MultivarkaDatabase._RECIPE_INFO_COLUMNS}
+        FROM recipes r
+        ORDER BY r.created_at DESC, r.id DESC
+    """
+    print(f"{'рецептов':>10} {'JOIN, мс':>9} {'колонка, мс':>12} {'with_info, мс':>14}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = MultivarkaDatabase(os.path.join(tmp_dir, 'bench.db'))
+            populate_catalogue(database, size)
+            conn = database.get_connection()
+            join_ms = measure(lambda: conn.execute(join_sql).fetchall())
+            column_ms = measure(lambda: conn.execute(column_sql).fetchall())
+            conn.close()
+            info_ms = measure(database.get_all_recipes_with_info)
+            print(f"{size:>10} {join_ms:>9.1f} {column_ms:>12.1f} {info_ms:>14.1f}")
+
+
+def bench_concurrency(sizes: List[int]) -> None:
+    """Параллельные чтения склада при одном писателе (размер = число потоков-читателей)"""
+    print(f"{'читателей':>10} {'чтений/с':>10} {'записей/с':>10} {'выдач':>8} {'ожидание, мс':>13}")
+    for readers in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = MultivarkaDatabase(os.path.join(tmp_dir, 'bench.db'))
+            for product in PRODUCTS:
+                database.add_product_to_warehouse(product, 10, "г")
+
+            stop = threading.Event()
+            counts = {'reads': 0, 'writes': 0}
+
+            def reader():
+                while not stop.is_set():
+                    database.load_warehouse()
+                    counts['reads'] += 1
+
+            def writer():
+                rng = random.Random(1)
+                while not stop.is_set():
+                    database.update_product_quantity(rng.choice(PRODUCTS), rng.randint(1, 100))
+                    counts['writes'] += 1
+
+            threads = [threading.Thread(target=reader) for _ in range(readers)]
+            threads.append(threading.Thread(target=writer))
+            duration = 2.0
+            for thread in threads:
+                thread.start()
+            time.sleep(duration)
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+            stats = database.pool.stats()
+            print(f"{readers:>10} {counts['reads'] / duration:>10.0f} {counts['writes'] / duration:>10.0f} "
+                  f"{stats['checkouts']:>8} {stats['wait_total_ms']:>13.1f}")
+
+
+def bench_optimize(sizes: List[int]) -> None:
+    """Подбор меню под склад: optimize_recipe_for_warehouse"""
+    print(f"{'рецептов':>10} {'индекс, мс':>11} {'подбор, мс':>11}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = MultivarkaDatabase(os.path.join(tmp_dir, 'bench.db'))
+            populate_catalogue(database, size)
+            rng = random.Random(7)
+            for product in rng.sample(PRODUCTS, 80):
+                database.add_product_to_warehouse(product, rng.randint(0, 1000), "г",
+                                                  expiration_date=f"2030-01-{rng.randint(10, 28)}")
+
+            build_ms = measure(database.get_recipe_index, repeat=1)
+            optimize_ms = measure(database.optimize_recipe_for_warehouse)
+            print(f"{size:>10} {build_ms:>11.1f} {optimize_ms:>11.1f}")
+
+
+def synthetic_recipes(recipes_count: int, seed: int = 42):
+    """Генерирует рецепты (тип приема пищи, данные блюда) без записи в базу"""
+    rng = random.Random(seed)
+    for i in range(recipes_count):
+        yield MEAL_TYPES[i % len(MEAL_TYPES)], {
+            'блюдо': f"блюдо_{i}",
+            'ингредиенты': [
+                {'продукт': product, 'количество': rng.randint(1, 500), 'единица': "г"}
+                for product in rng.sample(PRODUCTS, rng.randint(3, 8))
+            ],
+            'инструкции': [f"шаг {step}" for step in range(1, rng.randint(2, 6))]
+        }
+
+
+def bench_import(sizes: List[int]) -> None:
+    """Импорт рецептов: add_single_recipe по одному против add_recipes_bulk"""
+    print(f"{'рецептов':>10} {'по одному, рец/с':>17} {'пачками, рец/с':>15}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = MultivarkaDatabase(os.path.join(tmp_dir, 'single.db'))
+            started = time.perf_counter()
+            for meal_type, meal_data in synthetic_recipes(size):
+                database.add_single_recipe(meal_type, meal_data)
+            single_rate = size / (time.perf_counter() - started)
+
+            database = MultivarkaDatabase(os.path.join(tmp_dir, 'bulk.db'))
+            started = time.perf_counter()
+            result = database.add_recipes_bulk(synthetic_recipes(size))
+            bulk_rate = result['imported'] / (time.perf_counter() - started)
+            print(f"{size:>10} {single_rate:>17.0f} {bulk_rate:>15.0f}")
+
+
+def bench_shopping(sizes: List[int]) -> None:
+    """Список покупок: build_shopping_list для меню на N дней (размер = число дней)"""
+    recipes = list(synthetic_recipes(1000))
+    rng = random.Random(3)
+    warehouse = {"склад": {
+        product: {"количество": rng.randint(0, 1000), "единица": "г", "тип": "quantity"}
+        for product in PRODUCTS
+    }}
+    print(f"{'дней':>10} {'блюд':>8} {'продуктов':>10} {'мс':>8}")
+    for days in sizes:
+        menus = []
+        for _ in range(days):
+            menus.append({"меню": {meal_type: meal_data for meal_type, meal_data in rng.sample(recipes, 5)}})
+        result = build_shopping_list(menus, warehouse)
+        elapsed = measure(lambda: build_shopping_list(menus, warehouse))
+        print(f"{days:>10} {days * 5:>8} {len(result):>10} {elapsed:>8.2f}")
+
+
+def bench_plan(sizes: List[int]) -> None:
+    """План меню на неделю: plan_menu, жадный выбор (луч 1) против лучевого поиска (луч 8)"""
+    print(f"{'рецептов':>10} {'индекс, мс':>11} {'жадно':>10} {'мс':>8} {'луч 8':>10} {'мс':>8} {'узлов':>8}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = MultivarkaDatabase(os.path.join(tmp_dir, 'bench.db'))
+            populate_catalogue(database, size)
+            rng = random.Random(7)
+            for product in rng.sample(PRODUCTS, 80):
+                database.add_product_to_warehouse(product, rng.randint(0, 1000), "г",
+                                                  expiration_date=f"2030-01-{rng.randint(10, 28)}")
+
+            build_ms = measure(database.get_recipe_index, repeat=1)
+            greedy = database.plan_menu(7, beam_width=1, time_budget=60)
+            beam = database.plan_menu(7, beam_width=8, time_budget=60)
+            print(f"{size:>10} {build_ms:>11.1f} {greedy['score']:>10.0f} {greedy['elapsed_ms']:>8.1f} "
+                  f"{beam['score']:>10.0f} {beam['elapsed_ms']:>8.1f} {beam['expanded']:>8}")
+
+
+def bench_cookable(sizes: List[int]) -> None:
+    """Что можно приготовить: get_cookable_recipes, построение индекса, изменение склада и запрос"""
+    print(f"{'рецептов':>10} {'индекс, мс':>11} {'изменение, мс':>14} {'запрос, мс':>11} {'готово':>8} {'почти':>8}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = MultivarkaDatabase(os.path.join(tmp_dir, 'bench.db'))
+            populate_catalogue(database, size)
+            rng = random.Random(7)
+            for product in PRODUCTS:
+                database.add_product_to_warehouse(product, rng.randint(0, 1000), "г")
+
+            build_ms = measure(database.get_cookable_recipes, repeat=1)
+            products = rng.sample(PRODUCTS, 10)
+
+            def update():
+                for product in products:
+                    database.update_product_quantity(product, rng.randint(0, 1000))
+                database.get_cookable_recipes()
+
+            update_ms = measure(update)
+            query_ms = measure(lambda: database.get_cookable_recipes(1))
+            recipes = database.get_cookable_recipes(1)
+            ready = sum(1 for recipe in recipes if not recipe['не_хватает'])
+            print(f"{size:>10} {build_ms:>11.1f} {update_ms:>14.1f} {query_ms:>11.2f} "
+                  f"{ready:>8} {len(recipes) - ready:>8}")
+
+
+def bench_search(sizes: List[int]) -> None:
+    """Поиск рецептов: прежний LIKE по названию против FTS5 (страница из 20 результатов)"""
+    like_sql = """
+        SELECT r.id, r.name, r.meal_type, r.is_ready, r.created_at,
+               COUNT(DISTINCT ri.id) as ingredient_count
+        FROM recipes r
+        LEFT JOIN recipe_ingredients ri ON r.id = ri.recipe_id
+        WHERE (r.name LIKE ? OR r.name LIKE ?)
+        GROUP BY r.id ORDER BY r.created_at DESC
+    """
+    print(f"{'рецептов':>10} {'LIKE, мс':>9} {'FTS, мс':>8} {'FTS ингр., мс':>14} {'найдено':>8}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database = MultivarkaDatabase(os.path.join(tmp_dir, 'bench.db'))
+            populate_catalogue(database, size)
+            conn = database.get_connection()
+            like_ms = measure(lambda: conn.execute(like_sql, ("%блюдо_12%", "%блюдо_12%")).fetchall())
+            conn.close()
+            fts_ms = measure(lambda: database.search_recipes("блюдо_12", limit=20))
+            ingredient_ms = measure(lambda: (database.search_recipes("продукт_17", limit=20),
+                                             database.count_search_results("продукт_17")))
+            found = database.count_search_results("продукт_17")
+            print(f"{size:>10} {like_ms:>9.2f} {fts_ms:>8.2f} {ingredient_ms:>14.2f} {found:>8}")
+
+
+SCENARIOS: Dict[str, Callable[[List[int]], None]] = {
+    'recipes': bench_recipes,
+    'pages': bench_pages,
+    'listing': bench_listing,
+    'concurrency': bench_concurrency,
+    'optimize': bench_optimize,
+    'import': bench_import,
+    'shopping': bench_shopping,
+    'plan': bench_plan,
+    'cookable': bench_cookable,
+    'search': bench_search,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки базы данных мультиварки")
+    parser.add_argument('scenario', choices=sorted(SCENARIOS), help="сценарий для запуска")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000],
+                        help="размеры каталога рецептов")
+    args = parser.parse_args()
+
+    print(f"=== {SCENARIOS[args.scenario].__doc__} ===")
+    SCENARIOS[args.scenario](args.sizes)
+
+
+if __name__ == '__main__':
+    main()
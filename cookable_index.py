@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Обратный индекс продукт → рецепты для запросов «что можно приготовить сейчас».
+
+Для каждого рецепта хранится счетчик ингредиентов, которых не хватает на
+складе, а рецепты с малым счетчиком (0 — можно готовить, 1..max_missing —
+почти можно) лежат в отдельных корзинах. При изменении склада пересчитываются
+только рецепты, для которых продукт пересек границу: ноль (продукты
+'availability') или требуемое рецептом количество (списки требований по
+продукту отсортированы, граница находится бинарным поиском). Поэтому
+ответ на запрос занимает время, пропорциональное размеру ответа.
+"""
+
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from recipe_index import RecipeIndex
+
+INFINITY = float('inf')
+# Наибольшее число недостающих ингредиентов, для которого ведутся корзины
+MAX_MISSING = 2
+
+
+def _threshold(state: Optional[Tuple[float, bool]]) -> float:
+    """Наибольшее количество по рецепту, которое покрывает склад в этом состоянии"""
+    if state is None:
+        return -INFINITY
+    quantity, availability = state
+    if availability:
+        # Продукт с простым наличием покрывает любое количество, если он есть
+        return INFINITY if quantity != 0 else -INFINITY
+    return quantity
+
+
+def _present(state: Optional[Tuple[float, bool]]) -> bool:
+    """Покрыт ли ингредиент 'availability' продуктом в этом состоянии"""
+    return state is not None and state[0] != 0
+
+
+class CookableIndex:
+    """Счетчики недостающих ингредиентов рецептов одной ревизии каталога"""
+
+    def __init__(self, recipe_index: RecipeIndex, max_missing: int = MAX_MISSING):
+        self.recipe_index = recipe_index
+        self.revision = recipe_index.revision
+        self.warehouse_revision = None
+        self.max_missing = max_missing
+        self._lock = threading.Lock()
+
+        self._recipes: List[Tuple[str, int]] = []
+        self._missing = array('l')
+        # тип приема пищи -> корзины рецептов по числу недостающих ингредиентов
+        self._buckets: Dict[str, List[set]] = {}
+        # колонка -> (отсортированные количества, номера рецептов в том же порядке)
+        self._quantity_postings: Dict[int, Tuple[List[float], List[int]]] = {}
+        # колонка -> номера рецептов с ингредиентом 'availability'
+        self._availability_postings: Dict[int, List[int]] = {}
+        # колонка -> (количество, тип 'availability') по последнему применённому складу
+        self._stock: Dict[int, Tuple[float, bool]] = {}
+
+        quantity_entries: Dict[int, List[Tuple[float, int]]] = {}
+        for meal_type, meals in recipe_index.meals.items():
+            buckets = self._buckets[meal_type] = [set() for _ in range(max_missing + 1)]
+            for position in range(len(meals)):
+                number = len(self._recipes)
+                self._recipes.append((meal_type, position))
+                ingredients = recipe_index.ingredients(meal_type, position)
+                # На пустом складе не хватает всех ингредиентов
+                self._missing.append(len(ingredients))
+                if len(ingredients) <= max_missing:
+                    buckets[len(ingredients)].add(number)
+                for column, amount, only_availability in ingredients:
+                    if only_availability:
+                        self._availability_postings.setdefault(column, []).append(number)
+                    else:
+                        quantity_entries.setdefault(column, []).append((amount, number))
+
+        for column, entries in quantity_entries.items():
+            entries.sort()
+            self._quantity_postings[column] = ([amount for amount, _ in entries],
+                                               [number for _, number in entries])
+
+    def _adjust(self, number: int, delta: int):
+        """Меняет счетчик рецепта и переносит его между корзинами"""
+        old = self._missing[number]
+        new = old + delta
+        self._missing[number] = new
+        buckets = self._buckets[self._recipes[number][0]]
+        if old <= self.max_missing:
+            buckets[old].discard(number)
+        if new <= self.max_missing:
+            buckets[new].add(number)
+
+    def _apply(self, column: int, old: Optional[Tuple[float, bool]], new: Optional[Tuple[float, bool]]):
+        """Учитывает изменение одного продукта склада"""
+        postings = self._quantity_postings.get(column)
+        if postings is not None:
+            amounts, numbers = postings
+            old_threshold = _threshold(old)
+            new_threshold = _threshold(new)
+            if new_threshold != old_threshold:
+                low, high = sorted((old_threshold, new_threshold))
+                delta = -1 if new_threshold > old_threshold else 1
+                # Пересекли границу только требования в промежутке (low, high]
+                for i in range(bisect_right(amounts, low), bisect_right(amounts, high)):
+                    self._adjust(numbers[i], delta)
+
+        numbers = self._availability_postings.get(column)
+        if numbers is not None and _present(old) != _present(new):
+            delta = -1 if _present(new) else 1
+            for number in numbers:
+                self._adjust(number, delta)
+
+        if new is None:
+            self._stock.pop(column, None)
+        else:
+            self._stock[column] = new
+
+    def sync(self, warehouse_data: Dict, warehouse_revision: Optional[int] = None) -> int:
+        """Применяет разницу между складом и последним учтенным состоянием.
+
+        Возвращает число изменившихся продуктов.
+        """
+        with self._lock:
+            if warehouse_revision is not None and warehouse_revision == self.warehouse_revision:
+                return 0
+            columns = self.recipe_index.columns
+            current = {}
+            for product, product_data in warehouse_data['склад'].items():
+                column = columns.get(product)
+                if column is not None:
+                    current[column] = (product_data['количество'],
+                                       product_data.get('тип', 'quantity') == 'availability')
+
+            changed = 0
+            for column in set(self._stock) | set(current):
+                old = self._stock.get(column)
+                new = current.get(column)
+                if old != new:
+                    self._apply(column, old, new)
+                    changed += 1
+            self.warehouse_revision = warehouse_revision
+            return changed
+
+    def missing_products(self, meal_type: str, position: int) -> List[str]:
+        """Продукты рецепта, которых не хватает на складе"""
+        products = self.recipe_index.products
+        result = []
+        for column, amount, only_availability in self.recipe_index.ingredients(meal_type, position):
+            state = self._stock.get(column)
+            covered = _present(state) if only_availability else amount <= _threshold(state)
+            if not covered:
+                result.append(products[column])
+        return result
+
+    def cookable(self, max_missing: int = 0, meal_type: Optional[str] = None) -> List[Dict]:
+        """Рецепты, которым не хватает не более max_missing ингредиентов (сначала полностью готовые).
+
+        max_missing больше числа корзин индекса — ValueError, а не усеченный ответ.
+        """
+        if not 0 <= max_missing <= self.max_missing:
+            raise ValueError(f"max_missing должен быть от 0 до {self.max_missing}")
+        meal_types = [meal_type] if meal_type is not None else list(self._buckets)
+        result = []
+        with self._lock:
+            for missing in range(max_missing + 1):
+                numbers = []
+                for name in meal_types:
+                    if name in self._buckets:
+                        numbers.extend(self._buckets[name][missing])
+                for number in sorted(numbers):
+                    recipe_meal_type, position = self._recipes[number]
+                    result.append({
+                        "id": self.recipe_index.ids[recipe_meal_type][position],
+                        "название": self.recipe_index.meals[recipe_meal_type][position]['блюдо'],
+                        "тип_приема": recipe_meal_type,
+                        "не_хватает": self.missing_products(recipe_meal_type, position) if missing else []
+                    })
+        return result
@@ -6,18 +6,290 @@
 Заменяет JSON файлы для хранения рецептов и склада.
 """
 
+import base64
+import json
 import sqlite3
 import threading
 import os
-import random
-from typing import Dict, List, Optional, Tuple
+import queue
+import re
+import time
+import weakref
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from cookable_index import CookableIndex
+from meal_sampler import MealSampler
+from menu_planner import MenuPlanner
+from recipe_index import RecipeIndex
+
+
+class PooledConnection:
+    """Соединение из пула: close() возвращает его в пул вместо закрытия"""
+    
+    def __init__(self, pool: 'ConnectionPool', conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    def close(self):
+        """Возвращает соединение в пул (повторный вызов ничего не делает)"""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+    
+    def __del__(self):
+        # Страховка для веток с исключением, где close() не был вызван
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Ограниченный пул постоянных соединений SQLite в режиме WAL.
+    
+    Соединения создаются лениво, не больше size штук. Если все заняты,
+    get_connection() ждет освобождения; время ожидания учитывается
+    в статистике и передается в metrics_hook.
+    """
+    
+    PRAGMAS = (
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA cache_size = -16000",  # ~16 МБ страничного кэша на соединение
+        "PRAGMA mmap_size = 268435456",  # 256 МБ
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA foreign_keys = ON",
+    )
+    
+    def __init__(self, db_path: str, size: int = 8, busy_timeout: float = 5.0,
+                 metrics_hook: Optional[Callable[[float], None]] = None):
+        self.db_path = db_path
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self.metrics_hook = metrics_hook
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Для удобного доступа к колонкам
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def acquire(self) -> PooledConnection:
+        """Выдает свободное соединение, при необходимости ожидая его"""
+        started = time.perf_counter()
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        if self.metrics_hook:
+            self.metrics_hook(waited)
+        return PooledConnection(self, conn)
+    
+    def release(self, conn: sqlite3.Connection):
+        """Возвращает соединение в пул, откатывая незавершенную транзакцию"""
+        try:
+            conn.set_trace_callback(None)
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Сломанное соединение не возвращаем в пул
+            with self._lock:
+                self._created -= 1
+            conn.close()
+            return
+        self._idle.put(conn)
+    
+    def reset_after_fork(self):
+        """В дочернем процессе после fork: забывает соединения родителя, новые откроются лениво.
+        
+        Унаследованные соединения SQLite нельзя использовать и закрывать в дочернем
+        процессе, поэтому они только сохраняются в _abandoned.
+        """
+        self._abandoned = getattr(self, '_abandoned', [])
+        self._abandoned.append(self._idle)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+    
+    def close_all(self):
+        """Закрывает все свободные соединения пула"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+    
+    def stats(self) -> Dict:
+        """Статистика пула: выдачи соединений и время ожидания"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "wait_total_ms": round(self._wait_total * 1000, 3),
+                "wait_max_ms": round(self._wait_max * 1000, 3)
+            }
+
+
+class ExpirationCache:
+    """Кэш числа дней до истечения срока годности, действующий в пределах суток.
+    
+    Дата разбирается один раз на продукт в день; запись сбрасывается при смене
+    срока годности продукта, а весь кэш — при наступлении нового дня.
+    """
+    
+    def __init__(self):
+        self._day = None
+        self._entries: Dict[str, Tuple[str, Optional[int]]] = {}
+        self._lock = threading.Lock()
+    
+    def days_until(self, expiration_date_str: Optional[str], product_name: Optional[str] = None) -> Optional[int]:
+        """Возвращает число дней до истечения срока (None — срока нет или дата некорректна)"""
+        if not expiration_date_str:
+            return None
+        
+        key = product_name if product_name is not None else expiration_date_str
+        today = date.today()
+        with self._lock:
+            if today != self._day:
+                self._entries = {}
+                self._day = today
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == expiration_date_str:
+                return entry[1]
+        
+        try:
+            days = (datetime.strptime(expiration_date_str, '%Y-%m-%d').date() - today).days
+        except ValueError:
+            days = None
+        
+        with self._lock:
+            if self._day == today:
+                self._entries[key] = (expiration_date_str, days)
+        return days
+    
+    def invalidate(self, product_name: Optional[str] = None):
+        """Сбрасывает запись продукта или весь кэш"""
+        with self._lock:
+            if product_name is None:
+                self._entries = {}
+            else:
+                self._entries.pop(product_name, None)
 
 
 class MultivarkaDatabase:
-    def __init__(self, db_path='multivarka.db'):
+    # Колонки recipes для краткой информации о рецепте (см. _recipe_info)
+    _RECIPE_INFO_COLUMNS = ("r.id, r.name, r.meal_type, r.is_ready, r.created_at, "
+                            "r.ingredient_count, r.instruction_count")
+    # Как часто wait_for_change проверяет изменения, сделанные другими процессами
+    REVISION_POLL_SECONDS = 1.0
+    # Не чаще этого счетчики других процессов сверяются с базой (свои видны сразу)
+    REVISION_SYNC_SECONDS = 0.05
+    
+    def __init__(self, db_path='multivarka.db', pool_size: int = 8,
+                 metrics_hook: Optional[Callable[[float], None]] = None):
         self.db_path = db_path
+        # Блокировка единственного писателя; чтения идут параллельно благодаря WAL
         self.lock = threading.Lock()
         self.init_database()
+        self.pool = ConnectionPool(db_path, size=pool_size, metrics_hook=metrics_hook)
+        
+        # Счетчики изменений: увеличиваются после каждого успешного коммита.
+        # Общие значения хранятся в таблице revisions, чтобы кэши других процессов
+        # с той же базой узнавали об изменениях (см. _sync_revisions)
+        self._revisions = {'warehouse': 0, 'recipes': 0, 'current_recipe': 0}
+        # Условие для ожидания изменений (лента событий /api/events)
+        self._revision_changed = threading.Condition()
+        # Отдельное соединение для таблицы revisions и последний PRAGMA data_version
+        self._revision_lock = threading.Lock()
+        self._revision_conn = None
+        self._data_version = None
+        self._revisions_synced_at = None
+        self._sync_revisions()
+        # Снимок склада в памяти: (ревизия склада, данные)
+        self._warehouse_snapshot = None
+        # Скомпилированный индекс рецептов, перестраивается при изменении рецептов
+        self._recipe_index = None
+        # Обратный индекс продукт -> рецепты со счетчиками недостающих ингредиентов
+        self._cookable_index = None
+        # Число рецептов по типам приема пищи: (ревизия рецептов, {тип: количество})
+        self._recipe_counts = None
+        # Разобранное текущее меню: (ревизия меню, ревизия рецептов, меню или None)
+        self._current_menu = None
+        # Случайный выбор блюд по индексу рецептов
+        self._meal_sampler = None
+        self.expiration_cache = ExpirationCache()
+        
+        # Соединения и блокировки родителя не переживают fork (многопроцессный запуск)
+        if hasattr(os, 'register_at_fork'):
+            database_ref = weakref.ref(self)
+            
+            def after_fork_in_child():
+                database = database_ref()
+                if database is not None:
+                    database._after_fork()
+            
+            os.register_at_fork(after_in_child=after_fork_in_child)
+    
+    def _after_fork(self):
+        """Сбрасывает в дочернем процессе соединения, блокировки и кэши, унаследованные от родителя"""
+        self.lock = threading.Lock()
+        self._revision_changed = threading.Condition()
+        self._revision_lock = threading.Lock()
+        if self._revision_conn is not None:
+            self.pool._abandoned = getattr(self.pool, '_abandoned', [])
+            self.pool._abandoned.append(self._revision_conn)
+        self._revision_conn = None
+        self._data_version = None
+        self._revisions_synced_at = None
+        self.pool.reset_after_fork()
+        self._cookable_index = None
+        self._meal_sampler = None
+        self.expiration_cache = ExpirationCache()
+    
+    def close(self):
+        """Закрывает все свободные соединения (например, перед fork рабочих процессов)"""
+        self.pool.close_all()
+        with self._revision_lock:
+            if self._revision_conn is not None:
+                self._revision_conn.close()
+                self._revision_conn = None
+                self._data_version = None
+                self._revisions_synced_at = None
     
     def init_database(self):
         """Инициализирует базу данных с помощью схемы"""
@@ -28,6 +300,8 @@ class MultivarkaDatabase:
             
             with self.lock:
                 conn = sqlite3.connect(self.db_path)
+                # WAL сохраняется в файле БД: читатели не блокируют писателя
+                conn.execute("PRAGMA journal_mode = WAL")
                 conn.executescript(schema)
                 
                 # Проверяем и добавляем колонку expiration_date если её нет
@@ -39,68 +313,314 @@ class MultivarkaDatabase:
                     cursor.execute("ALTER TABLE warehouse ADD COLUMN expiration_date DATE")
                     print("Добавлена колонка expiration_date в таблицу warehouse")
                 
+                # Счетчики ингредиентов и инструкций хранятся в самой таблице рецептов
+                cursor.execute("PRAGMA table_info(recipes)")
+                columns = [column[1] for column in cursor.fetchall()]
+                
+                if 'ingredient_count' not in columns:
+                    cursor.execute("ALTER TABLE recipes ADD COLUMN ingredient_count INTEGER NOT NULL DEFAULT 0")
+                    cursor.execute("ALTER TABLE recipes ADD COLUMN instruction_count INTEGER NOT NULL DEFAULT 0")
+                    cursor.execute("""
+                        UPDATE recipes
+                        SET ingredient_count = (SELECT COUNT(*) FROM recipe_ingredients WHERE recipe_id = recipes.id),
+                            instruction_count = (SELECT COUNT(*) FROM recipe_instructions WHERE recipe_id = recipes.id)
+                    """)
+                    print("Добавлены колонки ingredient_count и instruction_count в таблицу recipes")
+                
+                # Текущее меню раньше хранилось одним JSON в таблице current_recipe
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'current_recipe'")
+                if cursor.fetchone():
+                    self._migrate_current_recipe(cursor)
+                
+                self.fulltext_enabled = self._init_fulltext(conn)
+                
                 conn.commit()
                 conn.close()
         except Exception as e:
             print(f"Ошибка инициализации БД: {e}")
             raise
     
+    @staticmethod
+    def _migrate_current_recipe(cursor):
+        """Переносит текущее меню из JSON в current_menu, сопоставляя блюда с рецептами по названию и типу.
+        
+        Если какие-то блюда не нашлись среди рецептов, старая таблица не удаляется,
+        а переименовывается в current_recipe_unmigrated.
+        """
+        cursor.execute("SELECT recipe_data FROM current_recipe ORDER BY id DESC LIMIT 1")
+        row = cursor.fetchone()
+        migrated = 0
+        unmatched = []
+        if row:
+            for meal_type, meal_data in json.loads(row[0]).get('меню', {}).items():
+                cursor.execute("""
+                    SELECT id FROM recipes
+                    WHERE meal_type = ? AND name = ?
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT 1
+                """, (meal_type, meal_data.get('блюдо')))
+                recipe = cursor.fetchone()
+                if recipe is None:
+                    unmatched.append(f"'{meal_data.get('блюдо')}' ({meal_type})")
+                    continue
+                cursor.execute("""
+                    INSERT OR REPLACE INTO current_menu (meal_type, recipe_id, skip_cooking)
+                    VALUES (?, ?, ?)
+                """, (meal_type, recipe[0], bool(meal_data.get('skip_cooking', False))))
+                migrated += 1
+        if unmatched:
+            cursor.execute("DROP TABLE IF EXISTS current_recipe_unmigrated")
+            cursor.execute("ALTER TABLE current_recipe RENAME TO current_recipe_unmigrated")
+            print(f"Блюда {', '.join(unmatched)} не найдены среди рецептов и не перенесены; "
+                  f"прежнее меню сохранено в таблице current_recipe_unmigrated")
+        else:
+            cursor.execute("DROP TABLE current_recipe")
+        print(f"Текущее меню перенесено в таблицу current_menu ({migrated} блюд)")
+    
+    def _init_fulltext(self, conn) -> bool:
+        """Создает полнотекстовый индекс рецептов (FTS5) и заполняет его для существующих рецептов.
+        
+        Возвращает False, если SQLite собран без FTS5 — тогда поиск работает через LIKE.
+        """
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'recipes_fts'")
+        if cursor.fetchone():
+            return True
+        
+        fulltext_path = os.path.join(os.path.dirname(__file__), 'database_fulltext.sql')
+        with open(fulltext_path, 'r', encoding='utf-8') as f:
+            fulltext_schema = f.read()
+        try:
+            conn.executescript(fulltext_schema)
+        except sqlite3.OperationalError as e:
+            print(f"Полнотекстовый поиск недоступен, используется LIKE: {e}")
+            return False
+        
+        # Переносим в индекс уже существующие рецепты
+        cursor.execute("""
+            INSERT INTO recipes_fts (rowid, name, ingredients, instructions)
+            SELECT r.id, r.name,
+                   COALESCE((SELECT group_concat(product_name, ' ') FROM recipe_ingredients WHERE recipe_id = r.id), ''),
+                   COALESCE((SELECT group_concat(instruction, ' ') FROM recipe_instructions WHERE recipe_id = r.id), '')
+            FROM recipes r
+        """)
+        # «ё» в индексе хранится как «е» (см. database_fulltext.sql)
+        cursor.execute("""
+            UPDATE recipes_fts
+            SET name = replace(replace(name, 'ё', 'е'), 'Ё', 'Е'),
+                ingredients = replace(replace(ingredients, 'ё', 'е'), 'Ё', 'Е'),
+                instructions = replace(replace(instructions, 'ё', 'е'), 'Ё', 'Е')
+        """)
+        if cursor.rowcount > 0:
+            print(f"Полнотекстовый индекс построен для {cursor.rowcount} рецептов")
+        return True
+    
     def get_connection(self):
-        """Возвращает соединение с базой данных"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Для удобного доступа к колонкам
-        return conn
+        """Возвращает соединение из пула; conn.close() возвращает его обратно"""
+        return self.pool.acquire()
+    
+    def get_revisions(self) -> Dict[str, int]:
+        """Возвращает текущие значения счетчиков изменений (с учетом записей других процессов)"""
+        return self._sync_revisions()
+    
+    def _revision(self, name: str) -> int:
+        """Текущее значение одного счетчика изменений"""
+        return self._sync_revisions()[name]
+    
+    def _revision_connection(self) -> sqlite3.Connection:
+        """Соединение для таблицы revisions в режиме автокоммита (открывается лениво, после fork)"""
+        if self._revision_conn is None:
+            self._revision_conn = self.pool._connect()
+            self._revision_conn.isolation_level = None
+        return self._revision_conn
+    
+    def _sync_revisions(self) -> Dict[str, int]:
+        """Подтягивает счетчики, увеличенные другими процессами, и возвращает их копию.
+        
+        Сверка выполняется не чаще раза в REVISION_SYNC_SECONDS, а таблица
+        revisions перечитывается, только если PRAGMA data_version показывает,
+        что база менялась через другие соединения.
+        """
+        now = time.monotonic()
+        synced_at = self._revisions_synced_at
+        if synced_at is not None and now - synced_at < self.REVISION_SYNC_SECONDS:
+            with self._revision_changed:
+                return dict(self._revisions)
+        
+        shared = None
+        try:
+            with self._revision_lock:
+                self._revisions_synced_at = now
+                conn = self._revision_connection()
+                version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if version != self._data_version:
+                    shared = dict(conn.execute("SELECT name, value FROM revisions").fetchall())
+                    self._data_version = version
+        except sqlite3.Error as e:
+            print(f"Ошибка чтения счетчиков изменений: {e}")
+        
+        with self._revision_changed:
+            if shared:
+                changed = False
+                for name, value in shared.items():
+                    if name in self._revisions and value > self._revisions[name]:
+                        self._revisions[name] = value
+                        changed = True
+                if changed:
+                    self._revision_changed.notify_all()
+            return dict(self._revisions)
+    
+    def wait_for_change(self, known: Dict[str, int], timeout: Optional[float] = None) -> Dict[str, int]:
+        """Ждет, пока счетчики изменений отличатся от known, не дольше timeout секунд.
+        
+        Изменения из других процессов проверяются раз в REVISION_POLL_SECONDS.
+        Возвращает текущие счетчики (совпадают с known, если время вышло).
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            current = self._sync_revisions()
+            if current != known:
+                return current
+            wait = self.REVISION_POLL_SECONDS
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return current
+            with self._revision_changed:
+                self._revision_changed.wait_for(lambda: self._revisions != known, wait)
+    
+    @staticmethod
+    def _write_revision(conn, name: str) -> int:
+        """Увеличивает общий счетчик в таблице revisions в той же транзакции, что и данные"""
+        # Без UPDATE ... RETURNING: он появился только в SQLite 3.35
+        conn.execute("UPDATE revisions SET value = value + 1 WHERE name = ?", (name,))
+        return conn.execute("SELECT value FROM revisions WHERE name = ?", (name,)).fetchone()[0]
+    
+    def _bump_revision(self, name: str, shared: int = 0) -> int:
+        """Увеличивает счетчик изменений после коммита и будит ожидающих.
+        
+        shared — значение общего счетчика, записанное _write_revision перед коммитом.
+        """
+        with self._revision_changed:
+            self._revisions[name] = max(self._revisions[name] + 1, shared)
+            self._revision_changed.notify_all()
+            return self._revisions[name]
     
     # === РАБОТА СО СКЛАДОМ ===
     
     def load_warehouse(self) -> Dict:
-        """Загружает данные склада в формате, совместимом с текущим кодом"""
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT product_name, quantity, unit, product_type, expiration_date FROM warehouse")
-            rows = cursor.fetchall()
-            conn.close()
-            
-            warehouse = {"склад": {}}
-            for row in rows:
-                product_data = {
-                    "количество": row['quantity'],
-                    "единица": row['unit'],
-                    "тип": row['product_type']
-                }
-                if row['expiration_date']:
-                    product_data["срок_годности"] = row['expiration_date']
-                warehouse["склад"][row['product_name']] = product_data
-            
-            return warehouse
+        """Загружает данные склада в формате, совместимом с текущим кодом.
+        
+        Данные берутся из снимка в памяти, пока ревизия склада не изменилась;
+        вызывающий код получает копию и может свободно её изменять.
+        """
+        snapshot = self._warehouse_snapshot
+        revision = self._revision('warehouse')
+        if snapshot is None or snapshot[0] != revision:
+            snapshot = (revision, self._read_warehouse())
+            self._warehouse_snapshot = snapshot
+        
+        return {"склад": {name: dict(data) for name, data in snapshot[1]["склад"].items()}}
+    
+    def _read_warehouse(self) -> Dict:
+        """Читает склад из базы данных"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT product_name, quantity, unit, product_type, expiration_date FROM warehouse")
+        rows = cursor.fetchall()
+        conn.close()
+        
+        warehouse = {"склад": {}}
+        for row in rows:
+            warehouse["склад"][row['product_name']] = self._warehouse_product(row)
+        
+        return warehouse
+    
+    @staticmethod
+    def _warehouse_product(row: sqlite3.Row) -> Dict:
+        """Данные продукта склада в формате load_warehouse"""
+        product_data = {
+            "количество": row['quantity'],
+            "единица": row['unit'],
+            "тип": row['product_type']
+        }
+        if row['expiration_date']:
+            product_data["срок_годности"] = row['expiration_date']
+        return product_data
     
     def save_warehouse(self, warehouse_data: Dict) -> bool:
         """Сохраняет данные склада"""
+        return self.sync_warehouse(warehouse_data) is not None
+    
+    def sync_warehouse(self, warehouse_data: Dict) -> Optional[Dict[str, int]]:
+        """Приводит таблицу склада к переданному состоянию, записывая только отличия.
+        
+        Возвращает число добавленных, обновленных и удаленных строк
+        или None при ошибке.
+        """
         try:
             with self.lock:
                 conn = self.get_connection()
                 cursor = conn.cursor()
+                # Чтение и запись в одной транзакции: другие процессы не вклинятся между ними
+                cursor.execute("BEGIN IMMEDIATE")
                 
-                # Очищаем текущий склад
-                cursor.execute("DELETE FROM warehouse")
+                cursor.execute("SELECT product_name, quantity, unit, product_type, expiration_date FROM warehouse")
+                stored = {
+                    row['product_name']: (row['quantity'], row['unit'], row['product_type'], row['expiration_date'])
+                    for row in cursor.fetchall()
+                }
                 
-                # Добавляем новые данные
-                for product_name, product_data in warehouse_data.get("склад", {}).items():
-                    product_type = product_data.get('тип', 'quantity')
-                    expiration_date = product_data.get('срок_годности')
-                    cursor.execute("""
+                new_products = warehouse_data.get("склад", {})
+                upserts = []
+                inserted = 0
+                for product_name, product_data in new_products.items():
+                    values = (
+                        product_data['количество'],
+                        product_data['единица'],
+                        product_data.get('тип', 'quantity'),
+                        product_data.get('срок_годности')
+                    )
+                    current = stored.get(product_name)
+                    if current == values:
+                        continue
+                    if current is None:
+                        inserted += 1
+                    upserts.append((product_name,) + values)
+                
+                deletes = [(product_name,) for product_name in stored if product_name not in new_products]
+                
+                if upserts:
+                    cursor.executemany("""
                         INSERT INTO warehouse (product_name, quantity, unit, product_type, expiration_date)
                         VALUES (?, ?, ?, ?, ?)
-                    """, (product_name, product_data['количество'], product_data['единица'], product_type, expiration_date))
+                        ON CONFLICT(product_name) DO UPDATE SET
+                            quantity = excluded.quantity,
+                            unit = excluded.unit,
+                            product_type = excluded.product_type,
+                            expiration_date = excluded.expiration_date,
+                            updated_at = CURRENT_TIMESTAMP
+                    """, upserts)
                 
-                conn.commit()
+                if deletes:
+                    cursor.executemany("DELETE FROM warehouse WHERE product_name = ?", deletes)
+                
+                if upserts or deletes:
+                    shared_revision = self._write_revision(conn, 'warehouse')
+                    conn.commit()
+                    self._bump_revision('warehouse', shared_revision)
+                    self.expiration_cache.invalidate()
                 conn.close()
-                return True
+                
+                return {
+                    "inserted": inserted,
+                    "updated": len(upserts) - inserted,
+                    "deleted": len(deletes)
+                }
         except Exception as e:
             print(f"Ошибка сохранения склада: {e}")
-            return False
+            return None
     
     def update_product_quantity(self, product_name: str, quantity: float) -> bool:
         """Обновляет количество продукта на складе"""
@@ -123,7 +643,9 @@ class MultivarkaDatabase:
                         WHERE product_name = ?
                     """, (quantity, product_name))
 
+                shared_revision = self._write_revision(conn, 'warehouse')
                 conn.commit()
+                self._bump_revision('warehouse', shared_revision)
                 success = cursor.rowcount > 0
                 conn.close()
                 return success
@@ -144,7 +666,10 @@ class MultivarkaDatabase:
                     WHERE product_name = ?
                 """, (expiration_date, product_name))
                 
+                shared_revision = self._write_revision(conn, 'warehouse')
                 conn.commit()
+                self._bump_revision('warehouse', shared_revision)
+                self.expiration_cache.invalidate(product_name)
                 success = cursor.rowcount > 0
                 conn.close()
                 return success
@@ -158,6 +683,9 @@ class MultivarkaDatabase:
             with self.lock:
                 conn = self.get_connection()
                 cursor = conn.cursor()
+                # Остаток читается и увеличивается в одной транзакции, чтобы параллельные
+                # покупки из других процессов не перезаписали друг друга
+                cursor.execute("BEGIN IMMEDIATE")
                 
                 # Проверяем, есть ли продукт
                 cursor.execute("SELECT quantity, product_type FROM warehouse WHERE product_name = ?", (product_name,))
@@ -190,13 +718,155 @@ class MultivarkaDatabase:
                         VALUES (?, ?, ?, ?, ?)
                     """, (product_name, quantity, unit, product_type, final_expiration_date))
                 
+                shared_revision = self._write_revision(conn, 'warehouse')
                 conn.commit()
+                self._bump_revision('warehouse', shared_revision)
+                self.expiration_cache.invalidate(product_name)
                 conn.close()
                 return True
         except Exception as e:
             print(f"Ошибка добавления продукта: {e}")
             return False
     
+    def update_products_bulk(self, changes: List[Dict]) -> Optional[Dict]:
+        """Применяет пачку изменений склада одной транзакцией.
+        
+        Каждое изменение — словарь с ключом 'продукт' и одним или несколькими из:
+        'количество' (новое количество), 'покупка' (сколько докупили; для нового
+        продукта нужны 'единица' и, при необходимости, 'тип'), 'срок_годности'
+        (дата или None). Изменения с ошибками пропускаются, остальные
+        записываются двумя executemany. Возвращает {'results': [...],
+        'applied': n, 'revision': n} или None при ошибке базы данных.
+        """
+        results = []
+        valid = []
+        for position, change in enumerate(changes):
+            error = self._validate_stock_change(change)
+            results.append({"продукт": change.get('продукт') if isinstance(change, dict) else None,
+                            "success": error is None})
+            if error:
+                results[-1]["error"] = error
+            else:
+                valid.append((position, change))
+        
+        try:
+            with self.lock:
+                conn = self.get_connection()
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                
+                # Текущее состояние затронутых продуктов одним проходом
+                names = list({change['продукт'] for _, change in valid})
+                state = {}
+                for start in range(0, len(names), 500):
+                    chunk = names[start:start + 500]
+                    cursor.execute(f"""
+                        SELECT product_name, quantity, unit, product_type, expiration_date
+                        FROM warehouse
+                        WHERE product_name IN ({', '.join('?' * len(chunk))})
+                    """, chunk)
+                    for row in cursor.fetchall():
+                        state[row['product_name']] = [row['quantity'], row['unit'], row['product_type'],
+                                                      row['expiration_date'], False]
+                
+                # Изменения применяются по порядку к состоянию в памяти
+                for position, change in valid:
+                    error = self._apply_stock_change(state, change)
+                    if error:
+                        results[position]["success"] = False
+                        results[position]["error"] = error
+                
+                touched = {change['продукт'] for position, change in valid if results[position]["success"]}
+                new_rows = []
+                updated_rows = []
+                for product in touched:
+                    quantity, unit, product_type, expiration_date, is_new = state[product]
+                    if quantity == 0:
+                        # Нулевой остаток не хранит срок годности
+                        expiration_date = None
+                    if is_new:
+                        new_rows.append((product, quantity, unit, product_type, expiration_date))
+                    else:
+                        updated_rows.append((quantity, product_type, expiration_date, product))
+                
+                cursor.executemany("""
+                    INSERT INTO warehouse (product_name, quantity, unit, product_type, expiration_date)
+                    VALUES (?, ?, ?, ?, ?)
+                """, new_rows)
+                cursor.executemany("""
+                    UPDATE warehouse
+                    SET quantity = ?, product_type = ?, expiration_date = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE product_name = ?
+                """, updated_rows)
+                
+                shared_revision = self._write_revision(conn, 'warehouse') if touched else None
+                conn.commit()
+                if touched:
+                    revision = self._bump_revision('warehouse', shared_revision)
+                else:
+                    revision = self._revision('warehouse')
+                for product in touched:
+                    self.expiration_cache.invalidate(product)
+                conn.close()
+                
+                applied = sum(1 for result in results if result["success"])
+                return {"results": results, "applied": applied, "revision": revision}
+        except Exception as e:
+            print(f"Ошибка пакетного обновления склада: {e}")
+            return None
+    
+    @staticmethod
+    def _validate_stock_change(change) -> Optional[str]:
+        """Проверяет формат изменения склада; возвращает текст ошибки или None"""
+        if not isinstance(change, dict) or not isinstance(change.get('продукт'), str) or not change['продукт']:
+            return "не указан продукт"
+        if 'количество' not in change and 'покупка' not in change and 'срок_годности' not in change:
+            return "нет изменений"
+        if 'количество' in change and 'покупка' in change:
+            return "нельзя одновременно задать количество и покупку"
+        for key in ('количество', 'покупка'):
+            if key in change:
+                value = change[key]
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                    return f"некорректное значение '{key}'"
+        if change.get('тип', 'quantity') not in ('quantity', 'availability'):
+            return "некорректный тип продукта"
+        expiration_date = change.get('срок_годности')
+        if expiration_date is not None:
+            try:
+                datetime.strptime(expiration_date, '%Y-%m-%d')
+            except (TypeError, ValueError):
+                return "некорректный срок годности"
+        return None
+    
+    @staticmethod
+    def _apply_stock_change(state: Dict[str, list], change: Dict) -> Optional[str]:
+        """Применяет изменение к состоянию [количество, единица, тип, срок, новый] по правилам одиночных методов"""
+        product = change['продукт']
+        entry = state.get(product)
+        
+        if 'покупка' in change:
+            # Как add_product_to_warehouse: наличие ставится в 1, количество прибавляется
+            if entry is None:
+                if not change.get('единица'):
+                    return "для нового продукта нужна единица измерения"
+                entry = state[product] = [change['покупка'], change['единица'], change.get('тип', 'quantity'), None, True]
+            elif change.get('тип') == 'availability' or entry[2] == 'availability':
+                entry[0] = 1
+                entry[2] = 'availability'
+            else:
+                entry[0] += change['покупка']
+            entry[3] = change.get('срок_годности')
+            return None
+        
+        if entry is None:
+            return "продукт не найден"
+        if 'количество' in change:
+            entry[0] = change['количество']
+        if 'срок_годности' in change:
+            entry[3] = change['срок_годности']
+        return None
+    
     def delete_product_from_warehouse(self, product_name: str) -> bool:
         """Удаляет продукт со склада"""
         try:
@@ -206,7 +876,10 @@ class MultivarkaDatabase:
                 
                 cursor.execute("DELETE FROM warehouse WHERE product_name = ?", (product_name,))
                 
+                shared_revision = self._write_revision(conn, 'warehouse')
                 conn.commit()
+                self._bump_revision('warehouse', shared_revision)
+                self.expiration_cache.invalidate(product_name)
                 success = cursor.rowcount > 0
                 conn.close()
                 return success
@@ -221,72 +894,14 @@ class MultivarkaDatabase:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT id, name, meal_type, is_ready 
-            FROM recipes 
-            ORDER BY created_at DESC
-        """)
-        recipes_data = cursor.fetchall()
-        
         recipes = []
-        for recipe_row in recipes_data:
-            recipe_id = recipe_row['id']
-            
-            # Получаем ингредиенты
-            cursor.execute("""
-                SELECT product_name, quantity, unit, ingredient_type
-                FROM recipe_ingredients 
-                WHERE recipe_id = ?
-                ORDER BY id
-            """, (recipe_id,))
-            ingredients_data = cursor.fetchall()
-            
-            # Получаем инструкции
-            cursor.execute("""
-                SELECT step_number, instruction
-                FROM recipe_instructions 
-                WHERE recipe_id = ?
-                ORDER BY step_number
-            """, (recipe_id,))
-            instructions_data = cursor.fetchall()
-            
-            # Формируем структуру рецепта
-            meal_data = {
-                "блюдо": recipe_row['name']
-            }
-            
-            if recipe_row['is_ready']:
-                meal_data["готово"] = True
-            
-            # Обрабатываем ингредиенты
-            ingredients = []
-            for ing in ingredients_data:
-                ingredient = {
-                    "продукт": ing['product_name'],
-                    "количество": ing['quantity'],
-                    "единица": ing['unit'],
-                    "тип": ing['ingredient_type']
-                }
-                ingredients.append(ingredient)
-            
-            if ingredients:
-                meal_data["ингредиенты"] = ingredients
-            
-            # Обрабатываем инструкции
-            instructions = []
-            for inst in instructions_data:
-                instructions.append(inst['instruction'])
-            
-            if instructions:
-                meal_data["инструкции"] = instructions
-            
+        for recipe_row, meal_data in self._load_recipes(cursor):
             # Создаем рецепт в старом формате
-            recipe = {
+            recipes.append({
                 "меню": {
                     recipe_row['meal_type']: meal_data
                 }
-            }
-            recipes.append(recipe)
+            })
         
         conn.close()
         return recipes
@@ -296,67 +911,78 @@ class MultivarkaDatabase:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT id, name, is_ready 
-            FROM recipes 
-            WHERE meal_type = ?
-            ORDER BY created_at DESC
-        """, (meal_type,))
+        recipes = [meal_data for _, meal_data in self._load_recipes(cursor, meal_type)]
+        
+        conn.close()
+        return recipes
+    
+    def _load_recipes(self, cursor, meal_type: Optional[str] = None) -> List[Tuple[sqlite3.Row, Dict]]:
+        """Загружает рецепты вместе с ингредиентами и инструкциями за три запроса.
+        
+        Вместо двух дополнительных запросов на каждый рецепт ингредиенты и
+        инструкции выбираются одним запросом на таблицу и раскладываются
+        по рецептам за один проход.
+        """
+        where = "WHERE r.meal_type = ?" if meal_type is not None else ""
+        params = (meal_type,) if meal_type is not None else ()
         
+        cursor.execute(f"""
+            SELECT r.id, r.name, r.meal_type, r.is_ready
+            FROM recipes r
+            {where}
+            ORDER BY r.created_at DESC
+        """, params)
         recipes_data = cursor.fetchall()
-        recipes = []
         
+        # Получаем ингредиенты всех выбранных рецептов
+        cursor.execute(f"""
+            SELECT ri.recipe_id, ri.product_name, ri.quantity, ri.unit, ri.ingredient_type
+            FROM recipe_ingredients ri
+            JOIN recipes r ON r.id = ri.recipe_id
+            {where}
+            ORDER BY ri.recipe_id, ri.id
+        """, params)
+        ingredients_by_recipe = {}
+        for ing in cursor.fetchall():
+            ingredients_by_recipe.setdefault(ing['recipe_id'], []).append({
+                "продукт": ing['product_name'],
+                "количество": ing['quantity'],
+                "единица": ing['unit'],
+                "тип": ing['ingredient_type']
+            })
+        
+        # Получаем инструкции всех выбранных рецептов
+        cursor.execute(f"""
+            SELECT ri.recipe_id, ri.instruction
+            FROM recipe_instructions ri
+            JOIN recipes r ON r.id = ri.recipe_id
+            {where}
+            ORDER BY ri.recipe_id, ri.step_number
+        """, params)
+        instructions_by_recipe = {}
+        for inst in cursor.fetchall():
+            instructions_by_recipe.setdefault(inst['recipe_id'], []).append(inst['instruction'])
+        
+        recipes = []
         for recipe_row in recipes_data:
             recipe_id = recipe_row['id']
             
-            # Получаем ингредиенты и инструкции
-            cursor.execute("""
-                SELECT product_name, quantity, unit, ingredient_type
-                FROM recipe_ingredients 
-                WHERE recipe_id = ?
-                ORDER BY id
-            """, (recipe_id,))
-            ingredients_data = cursor.fetchall()
-            
-            cursor.execute("""
-                SELECT step_number, instruction
-                FROM recipe_instructions 
-                WHERE recipe_id = ?
-                ORDER BY step_number
-            """, (recipe_id,))
-            instructions_data = cursor.fetchall()
-            
-            # Формируем meal_data
+            # Формируем структуру рецепта
             meal_data = {"блюдо": recipe_row['name']}
             
             if recipe_row['is_ready']:
                 meal_data["готово"] = True
             
-            # Обрабатываем ингредиенты
-            ingredients = []
-            for ing in ingredients_data:
-                ingredient = {
-                    "продукт": ing['product_name'],
-                    "количество": ing['quantity'],
-                    "единица": ing['unit'],
-                    "тип": ing['ingredient_type']
-                }
-                ingredients.append(ingredient)
-            
+            ingredients = ingredients_by_recipe.get(recipe_id)
             if ingredients:
                 meal_data["ингредиенты"] = ingredients
             
-            # Обрабатываем инструкции  
-            instructions = []
-            for inst in instructions_data:
-                instructions.append(inst['instruction'])
-            
+            instructions = instructions_by_recipe.get(recipe_id)
             if instructions:
                 meal_data["инструкции"] = instructions
             
-            recipes.append(meal_data)
+            recipes.append((recipe_row, meal_data))
         
-        conn.close()
         return recipes
     
     def add_single_recipe(self, meal_type: str, meal_data: Dict) -> bool:
@@ -368,12 +994,14 @@ class MultivarkaDatabase:
                 
                 # Создаем запись рецепта
                 cursor.execute("""
-                    INSERT INTO recipes (name, meal_type, is_ready)
-                    VALUES (?, ?, ?)
+                    INSERT INTO recipes (name, meal_type, is_ready, ingredient_count, instruction_count)
+                    VALUES (?, ?, ?, ?, ?)
                 """, (
                     meal_data.get('блюдо', ''),
                     meal_type,
-                    meal_data.get('готово', False)
+                    meal_data.get('готово', False),
+                    len(meal_data.get('ингредиенты') or []),
+                    len(meal_data.get('инструкции') or [])
                 ))
                 
                 recipe_id = cursor.lastrowid
@@ -386,7 +1014,9 @@ class MultivarkaDatabase:
                 if 'инструкции' in meal_data:
                     self._add_instructions(cursor, recipe_id, meal_data['инструкции'])
                 
+                shared_revision = self._write_revision(conn, 'recipes')
                 conn.commit()
+                self._bump_revision('recipes', shared_revision)
                 conn.close()
                 return True
                 
@@ -394,31 +1024,199 @@ class MultivarkaDatabase:
             print(f"Ошибка добавления рецепта: {e}")
             return False
     
-    def _add_ingredients(self, cursor, recipe_id: int, ingredients: List[Dict]):
-        """Добавляет ингредиенты рецепта"""
-        for ingredient in ingredients:
-            ingredient_type = ingredient.get('тип', 'quantity')
+    def add_recipes_bulk(self, recipes: Iterable[Tuple[str, Dict]], chunk_size: int = 500,
+                         max_errors: Optional[int] = None) -> Dict:
+        """Добавляет поток рецептов (тип приема пищи, данные блюда) пачками.
+        
+        Каждая пачка из chunk_size рецептов записывается одной транзакцией,
+        ингредиенты и инструкции — через executemany. Ошибочные рецепты
+        пропускаются и попадают в errors как (номер в потоке, описание);
+        вместо данных блюда можно передать исключение — оно тоже станет ошибкой.
+        Если задан max_errors, описаний хранится не больше, а error_count
+        считает все ошибки.
+        """
+        result = {"imported": 0, "total": 0, "chunks": 0, "error_count": 0, "errors": []}
+        chunk = []
+        for position, (meal_type, meal_data) in enumerate(recipes):
+            result["total"] += 1
+            chunk.append((position, meal_type, meal_data))
+            if len(chunk) >= chunk_size:
+                self._write_recipes_chunk(chunk, result, max_errors)
+                chunk = []
+        if chunk:
+            self._write_recipes_chunk(chunk, result, max_errors)
+        return result
+    
+    def _record_import_error(self, result: Dict, position: int, message: str, max_errors: Optional[int]):
+        """Учитывает ошибку импорта, храня не больше max_errors описаний"""
+        result["error_count"] += 1
+        if max_errors is None or len(result["errors"]) < max_errors:
+            result["errors"].append((position, message))
+    
+    def _write_recipes_chunk(self, chunk: List[Tuple[int, str, Dict]], result: Dict,
+                             max_errors: Optional[int] = None):
+        """Записывает пачку рецептов одной транзакцией.
+        
+        Если пачка не записывается целиком (например, значение неподдерживаемого
+        типа в ингредиенте), она повторяется по одному рецепту через SAVEPOINT,
+        и откатываются только ошибочные рецепты.
+        """
+        prepared = []
+        for position, meal_type, meal_data in chunk:
+            try:
+                prepared.append((position, meal_type, meal_data) + self._prepare_recipe_rows(meal_type, meal_data))
+            except ValueError as e:
+                self._record_import_error(result, position, str(e), max_errors)
+        
+        saved = set()
+        try:
+            with self.lock:
+                conn = self.get_connection()
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                if self.fulltext_enabled:
+                    # Строки полнотекстового индекса запишем сами одним запросом
+                    cursor.execute("UPDATE recipes_fts_state SET deferred = 1")
+                
+                cursor.execute("SAVEPOINT recipes_chunk")
+                try:
+                    self._insert_recipes(cursor, prepared)
+                    saved.update(item[0] for item in prepared)
+                    cursor.execute("RELEASE recipes_chunk")
+                except (sqlite3.Error, OverflowError):
+                    cursor.execute("ROLLBACK TO recipes_chunk")
+                    cursor.execute("RELEASE recipes_chunk")
+                    for item in prepared:
+                        cursor.execute("SAVEPOINT recipe")
+                        try:
+                            self._insert_recipes(cursor, [item])
+                            saved.add(item[0])
+                            cursor.execute("RELEASE recipe")
+                        except (sqlite3.Error, OverflowError) as e:
+                            cursor.execute("ROLLBACK TO recipe")
+                            cursor.execute("RELEASE recipe")
+                            self._record_import_error(result, item[0], f"ошибка сохранения: {e}", max_errors)
+                
+                if self.fulltext_enabled:
+                    cursor.execute("UPDATE recipes_fts_state SET deferred = 0")
+                shared_revision = self._write_revision(conn, 'recipes') if saved else None
+                conn.commit()
+                if saved:
+                    self._bump_revision('recipes', shared_revision)
+                conn.close()
+                result["imported"] += len(saved)
+                result["chunks"] += 1
+        except Exception as e:
+            print(f"Ошибка пакетного добавления рецептов: {e}")
+            for position, _, _, _, _ in prepared:
+                if position not in saved:
+                    self._record_import_error(result, position, f"ошибка сохранения: {e}", max_errors)
+    
+    def _prepare_recipe_rows(self, meal_type: str, meal_data: Dict) -> Tuple[List[Tuple], List[Tuple]]:
+        """Проверяет рецепт из потока импорта и возвращает строки его ингредиентов и инструкций.
+        
+        При ошибке выбрасывает ValueError с описанием для отчета об импорте.
+        """
+        if isinstance(meal_data, Exception):
+            raise ValueError(str(meal_data))
+        if not isinstance(meal_data, dict):
+            raise ValueError("рецепт должен быть объектом")
+        name = meal_data.get('блюдо')
+        if not name:
+            raise ValueError("отсутствует название")
+        if not isinstance(name, str):
+            raise ValueError("название должно быть строкой")
+        if not meal_type:
+            raise ValueError("отсутствует тип приема пищи")
+        if not isinstance(meal_type, str):
+            raise ValueError("тип приема пищи должен быть строкой")
+        try:
+            ingredients = self._ingredient_rows(None, meal_data.get('ингредиенты') or [])
+            instructions = self._instruction_rows(None, meal_data.get('инструкции') or [])
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"некорректные ингредиенты или инструкции: {e}")
+        return ingredients, instructions
+    
+    def _insert_recipes(self, cursor, prepared: List[Tuple]):
+        """Вставляет проверенные рецепты с ингредиентами, инструкциями и строками полнотекстового индекса"""
+        ingredient_rows = []
+        instruction_rows = []
+        fulltext_rows = []
+        for _, meal_type, meal_data, ingredients, instructions in prepared:
             cursor.execute("""
-                INSERT INTO recipe_ingredients (recipe_id, product_name, quantity, unit, ingredient_type)
+                INSERT INTO recipes (name, meal_type, is_ready, ingredient_count, instruction_count)
                 VALUES (?, ?, ?, ?, ?)
-            """, (
+            """, (meal_data['блюдо'], meal_type, meal_data.get('готово', False),
+                  len(ingredients), len(instructions)))
+            recipe_id = cursor.lastrowid
+            ingredient_rows.extend((recipe_id,) + row[1:] for row in ingredients)
+            instruction_rows.extend((recipe_id,) + row[1:] for row in instructions)
+            fulltext_rows.append(self._fulltext_row(recipe_id, meal_data['блюдо'], ingredients, instructions))
+        
+        cursor.executemany("""
+            INSERT INTO recipe_ingredients (recipe_id, product_name, quantity, unit, ingredient_type)
+            VALUES (?, ?, ?, ?, ?)
+        """, ingredient_rows)
+        cursor.executemany("""
+            INSERT INTO recipe_instructions (recipe_id, step_number, instruction)
+            VALUES (?, ?, ?)
+        """, instruction_rows)
+        if self.fulltext_enabled:
+            cursor.executemany("""
+                INSERT INTO recipes_fts (rowid, name, ingredients, instructions)
+                VALUES (?, ?, ?, ?)
+            """, fulltext_rows)
+    
+    @staticmethod
+    def _fulltext_row(recipe_id: int, name: str, ingredient_rows: List[Tuple],
+                      instruction_rows: List[Tuple]) -> Tuple:
+        """Строка recipes_fts в том же виде, что записывают триггеры database_fulltext.sql"""
+        def normalize(text):
+            return text.replace('ё', 'е').replace('Ё', 'Е')
+        return (
+            recipe_id,
+            normalize(name),
+            normalize(' '.join(str(row[1]) for row in ingredient_rows)),
+            normalize(' '.join(str(row[2]) for row in instruction_rows))
+        )
+    
+    def _ingredient_rows(self, recipe_id: Optional[int], ingredients: List[Dict]) -> List[Tuple]:
+        """Строки таблицы recipe_ingredients для ингредиентов рецепта"""
+        return [
+            (
                 recipe_id,
                 ingredient['продукт'],
                 ingredient['количество'],
                 ingredient['единица'],
-                ingredient_type
-            ))
+                ingredient.get('тип', 'quantity')
+            )
+            for ingredient in ingredients
+        ]
+    
+    def _instruction_rows(self, recipe_id: Optional[int], instructions: List[str]) -> List[Tuple]:
+        """Строки таблицы recipe_instructions для инструкций рецепта"""
+        return [(recipe_id, step_num, instruction) for step_num, instruction in enumerate(instructions, 1)]
+    
+    def _add_ingredients(self, cursor, recipe_id: int, ingredients: List[Dict]):
+        """Добавляет ингредиенты рецепта"""
+        cursor.executemany("""
+            INSERT INTO recipe_ingredients (recipe_id, product_name, quantity, unit, ingredient_type)
+            VALUES (?, ?, ?, ?, ?)
+        """, self._ingredient_rows(recipe_id, ingredients))
     
     def _add_instructions(self, cursor, recipe_id: int, instructions: List[str]):
         """Добавляет инструкции рецепта"""
-        for step_num, instruction in enumerate(instructions, 1):
-            cursor.execute("""
-                INSERT INTO recipe_instructions (recipe_id, step_number, instruction)
-                VALUES (?, ?, ?)
-            """, (recipe_id, step_num, instruction))
+        cursor.executemany("""
+            INSERT INTO recipe_instructions (recipe_id, step_number, instruction)
+            VALUES (?, ?, ?)
+        """, self._instruction_rows(recipe_id, instructions))
     
-    def get_mixed_recipe(self) -> Optional[Dict]:
-        """Создает смешанный рецепт, выбирая случайные блюда для каждого приема пищи"""
+    def get_mixed_recipe(self, weighting: Optional[str] = None) -> Optional[Dict]:
+        """Создает смешанный рецепт, выбирая случайные блюда для каждого приема пищи.
+        
+        weighting: None — равномерно, 'recency' — реже недавно выбранные,
+        'stock' — чаще блюда, под которые есть продукты на складе.
+        """
         # Сначала пытаемся загрузить текущий рецепт
         current_recipe = self.get_current_recipe()
         if current_recipe:
@@ -426,20 +1224,48 @@ class MultivarkaDatabase:
         
         # Если текущего рецепта нет, создаем новый
         meal_types = ["завтрак", "второй_завтрак", "обед", "полдник", "ужин"]
-        mixed_recipe = {"меню": {}}
+        recipe_index = self.get_recipe_index()
+        sampler = self.get_meal_sampler()
+        stock = self._sampling_stock(recipe_index, weighting)
+        rows = []
         
         for meal_type in meal_types:
-            recipes = self.get_recipes_by_meal_type(meal_type)
-            if recipes:
-                mixed_recipe['меню'][meal_type] = random.choice(recipes)
+            position = sampler.sample(meal_type, self._sampling_weights(sampler, meal_type, weighting, stock))
+            if position is not None:
+                sampler.remember(meal_type, position)
+                rows.append((meal_type, recipe_index.ids[meal_type][position], False))
         
-        if mixed_recipe['меню']:
-            # Сохраняем новый рецепт как текущий
-            self.save_current_recipe(mixed_recipe)
-            return mixed_recipe
+        # Сохраняем новый рецепт как текущий
+        if rows and self._save_menu_rows(rows, recipe_index):
+            return self.get_current_recipe()
         
         return None
     
+    def get_meal_sampler(self) -> MealSampler:
+        """Возвращает выбор блюд для текущей ревизии рецептов (история выбора сохраняется)"""
+        recipe_index = self.get_recipe_index()
+        sampler = self._meal_sampler
+        if sampler is None or sampler.revision != recipe_index.revision:
+            sampler = MealSampler(recipe_index, sampler._recent if sampler is not None else None)
+            self._meal_sampler = sampler
+        return sampler
+    
+    def _sampling_stock(self, recipe_index: RecipeIndex, weighting: Optional[str]):
+        """Вектор склада для взвешивания 'stock' (иначе None)"""
+        if weighting != 'stock':
+            return None
+        return recipe_index.stock_vector(self.load_warehouse(), self._get_expiration_priority_bonus)
+    
+    @staticmethod
+    def _sampling_weights(sampler: MealSampler, meal_type: str, weighting: Optional[str],
+                          stock) -> Optional[List[float]]:
+        """Веса рецептов типа приема пищи для выбранного способа взвешивания"""
+        if weighting == 'recency':
+            return sampler.recency_weights(meal_type)
+        if weighting == 'stock':
+            return sampler.stock_weights(meal_type, stock)
+        return None
+    
     def optimize_recipe_for_warehouse(self) -> Optional[Dict]:
         """Создает оптимизированный рецепт для минимизации покупок"""
         # Загружаем текущий рецепт для сохранения статусов skip_cooking
@@ -447,6 +1273,8 @@ class MultivarkaDatabase:
         
         meal_types = ["завтрак", "второй_завтрак", "обед", "полдник", "ужин"]
         warehouse_data = self.load_warehouse()
+        recipe_index = self.get_recipe_index()
+        stock = recipe_index.stock_vector(warehouse_data, self._get_expiration_priority_bonus)
         optimized_recipe = {"меню": {}}
         
         for meal_type in meal_types:
@@ -461,64 +1289,79 @@ class MultivarkaDatabase:
                 continue
             
             # Иначе подбираем оптимальное блюдо
-            recipes = self.get_recipes_by_meal_type(meal_type)
-            if not recipes:
-                continue
-            
-            best_meal = None
-            best_score = float('inf')
-            
-            for recipe_meal in recipes:
-                # Вычисляем "стоимость" блюда
-                total_cost = 0
-                missing_ingredients = 0
-                
-                # Основные ингредиенты
-                if 'ингредиенты' in recipe_meal:
-                    cost, missing = self._calculate_meal_cost(recipe_meal['ингредиенты'], warehouse_data)
-                    total_cost += cost
-                    missing_ingredients += missing
-                
-
-                
-                score = total_cost * 10 + missing_ingredients
-                if score < best_score:
-                    best_score = score
-                    best_meal = recipe_meal
-            
+            best_meal = recipe_index.best_meal(meal_type, stock)
             if best_meal:
                 optimized_recipe['меню'][meal_type] = best_meal
         
         return optimized_recipe if optimized_recipe['меню'] else None
     
-    def _get_expiration_priority_bonus(self, expiration_date_str: str) -> float:
+    def plan_menu(self, days: int, meal_types: Optional[List[str]] = None, beam_width: int = 8,
+                  time_budget: float = 2.0) -> Optional[Dict]:
+        """Планирует меню на несколько дней под общий склад (см. menu_planner.MenuPlanner)"""
+        if meal_types is None:
+            meal_types = ["завтрак", "второй_завтрак", "обед", "полдник", "ужин"]
+        planner = MenuPlanner(self.get_recipe_index(), self.load_warehouse(),
+                              self.expiration_cache.days_until, self._expiration_bonus)
+        plan = planner.plan(days, meal_types, beam_width=beam_width, time_budget=time_budget)
+        return plan if any(day['меню'] for day in plan['days']) else None
+    
+    def get_recipe_index(self) -> RecipeIndex:
+        """Возвращает индекс рецептов, перестраивая его только после изменения рецептов"""
+        recipe_index = self._recipe_index
+        revision = self._revision('recipes')
+        if recipe_index is None or recipe_index.revision != revision:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            loaded = self._load_recipes(cursor)
+            conn.close()
+            recipe_index = RecipeIndex([(row['meal_type'], meal_data) for row, meal_data in loaded],
+                                       revision, [row['id'] for row, _ in loaded])
+            self._recipe_index = recipe_index
+        return recipe_index
+    
+    def get_cookable_recipes(self, max_missing: int = 0, meal_type: Optional[str] = None) -> List[Dict]:
+        """Рецепты, которые можно приготовить со склада (или которым не хватает до max_missing ингредиентов).
+        
+        max_missing больше cookable_index.MAX_MISSING — ValueError.
+        """
+        recipe_index = self.get_recipe_index()
+        cookable_index = self._cookable_index
+        if cookable_index is None or cookable_index.revision != recipe_index.revision:
+            cookable_index = CookableIndex(recipe_index)
+            self._cookable_index = cookable_index
+        # Ревизию читаем до загрузки склада, чтобы не пропустить изменение;
+        # склад копируется, только если он изменился после последней синхронизации
+        warehouse_revision = self._revision('warehouse')
+        if cookable_index.warehouse_revision != warehouse_revision:
+            cookable_index.sync(self.load_warehouse(), warehouse_revision)
+        return cookable_index.cookable(max_missing, meal_type)
+    
+    def _get_expiration_priority_bonus(self, expiration_date_str: str, product_name: Optional[str] = None) -> float:
         """Вычисляет бонус приоритета для продукта на основе срока годности"""
-        if not expiration_date_str:
-            return 0  # Нет срока годности - нет бонуса
+        days_until_expiration = self.expiration_cache.days_until(expiration_date_str, product_name)
+        return self._expiration_bonus(days_until_expiration)
+    
+    @staticmethod
+    def _expiration_bonus(days_until_expiration: Optional[int]) -> float:
+        """Бонус приоритета по числу дней до окончания срока годности"""
+        if days_until_expiration is None:
+            return 0  # Нет срока годности или ошибка парсинга даты - нет бонуса
         
-        try:
-            from datetime import datetime, date
-            expiration_date = datetime.strptime(expiration_date_str, '%Y-%m-%d').date()
-            today = date.today()
-            days_until_expiration = (expiration_date - today).days
-            
-            if days_until_expiration < 0:
-                # Просроченный продукт - штраф
-                return 50
-            elif days_until_expiration == 0:
-                # Истекает сегодня - максимальный приоритет
-                return -100
-            elif days_until_expiration <= 3:
-                # Скоро истекает - высокий приоритет
-                return -50
-            elif days_until_expiration <= 7:
-                # Истекает на неделе - средний приоритет
-                return -20
-            else:
-                # Свежий продукт - небольшой бонус
-                return -5
-        except ValueError:
-            return 0  # Ошибка парсинга даты - нет бонуса
+        if days_until_expiration < 0:
+            # Просроченный продукт - штраф
+            return 50
+        elif days_until_expiration == 0:
+            # Истекает сегодня - максимальный приоритет
+            return -100
+        elif days_until_expiration <= 3:
+            # Скоро истекает - высокий приоритет
+            return -50
+        elif days_until_expiration <= 7:
+            # Истекает на неделе - средний приоритет
+            return -20
+        else:
+            # Свежий продукт - небольшой бонус
+            return -5
 
     def _calculate_meal_cost(self, ingredients: List[Dict], warehouse_data: Dict) -> Tuple[float, int]:
         """Вычисляет стоимость блюда с учётом сроков годности и наличия на складе"""
@@ -536,7 +1379,7 @@ class MultivarkaDatabase:
                 expiration_date = warehouse_data['склад'][product].get('срок_годности')
                 
                 # Получаем бонус за срок годности
-                expiration_bonus = self._get_expiration_priority_bonus(expiration_date)
+                expiration_bonus = self._get_expiration_priority_bonus(expiration_date, product)
                 
                 # Для продуктов с простым наличием
                 if ingredient_type == 'availability' or product_type == 'availability':
@@ -594,50 +1437,75 @@ class MultivarkaDatabase:
     
     def consume_ingredients_for_meal(self, meal_type: str, meal_data: Dict) -> bool:
         """Удаляет ингредиенты со склада после приготовления блюда"""
-        try:
+        return self.consume_meals([(meal_type, meal_data)]) is not None
+    
+    def consume_meals(self, meals: Iterable[Tuple[str, Dict]]) -> Optional[Dict]:
+        """Списывает со склада ингредиенты нескольких блюд одной транзакцией.
+        
+        Количества одного продукта по всем блюдам суммируются, и все изменения
+        применяются двумя executemany внутри BEGIN IMMEDIATE. Возвращает
+        изменения склада {'changed': {продукт: данные}, 'removed': [], 'revision': n}
+        в формате load_warehouse или None при ошибке.
+        """
+        decrements: Dict[str, float] = {}
+        resets = set()
+        for _, meal_data in meals:
             # Пропускаем блюда, которые не нужно готовить
             if meal_data.get('skip_cooking', False):
-                return True
-                
+                continue
+            for ingredient in meal_data.get('ингредиенты', []):
+                product = ingredient['продукт']
+                if ingredient.get('тип', 'quantity') == 'availability':
+                    resets.add(product)
+                else:
+                    decrements[product] = decrements.get(product, 0) + ingredient['количество']
+        # Сброс наличия перекрывает списание количества того же продукта
+        for product in resets:
+            decrements.pop(product, None)
+        
+        try:
             with self.lock:
                 conn = self.get_connection()
                 cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
                 
-                # Основные ингредиенты
-                if 'ингредиенты' in meal_data:
-                    for ingredient in meal_data['ингредиенты']:
-                        self._consume_ingredient(cursor, ingredient)
+                # Для продуктов с простым наличием сбрасываем в 0 и очищаем срок годности
+                cursor.executemany("""
+                    UPDATE warehouse
+                    SET quantity = 0, expiration_date = NULL, updated_at = CURRENT_TIMESTAMP
+                    WHERE product_name = ?
+                """, [(product,) for product in resets])
+                # Для обычных продуктов уменьшаем количество
+                cursor.executemany("""
+                    UPDATE warehouse
+                    SET quantity = MAX(0, quantity - ?),
+                        expiration_date = CASE WHEN MAX(0, quantity - ?) = 0 THEN NULL ELSE expiration_date END,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE product_name = ?
+                """, [(amount, amount, product) for product, amount in decrements.items()])
                 
-
+                # Новое состояние затронутых продуктов читаем в той же транзакции
+                changed = {}
+                products = list(resets) + list(decrements)
+                for start in range(0, len(products), 500):
+                    chunk = products[start:start + 500]
+                    cursor.execute(f"""
+                        SELECT product_name, quantity, unit, product_type, expiration_date
+                        FROM warehouse
+                        WHERE product_name IN ({', '.join('?' * len(chunk))})
+                    """, chunk)
+                    for row in cursor.fetchall():
+                        changed[row['product_name']] = self._warehouse_product(row)
                 
+                shared_revision = self._write_revision(conn, 'warehouse')
                 conn.commit()
+                revision = self._bump_revision('warehouse', shared_revision)
                 conn.close()
-                return True
+                return {"changed": changed, "removed": [], "revision": revision}
                 
         except Exception as e:
             print(f"Ошибка потребления ингредиентов: {e}")
-            return False
-    
-    def _consume_ingredient(self, cursor, ingredient: Dict):
-        """Уменьшает количество ингредиента на складе"""
-        ingredient_type = ingredient.get('тип', 'quantity')
-
-        if ingredient_type == 'availability':
-            # Для продуктов с простым наличием сбрасываем в 0 и очищаем срок годности
-            cursor.execute("""
-                UPDATE warehouse
-                SET quantity = 0, expiration_date = NULL, updated_at = CURRENT_TIMESTAMP
-                WHERE product_name = ?
-            """, (ingredient['продукт'],))
-        else:
-            # Для обычных продуктов уменьшаем количество
-            cursor.execute("""
-                UPDATE warehouse
-                SET quantity = MAX(0, quantity - ?),
-                    expiration_date = CASE WHEN MAX(0, quantity - ?) = 0 THEN NULL ELSE expiration_date END,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE product_name = ?
-            """, (ingredient['количество'], ingredient['количество'], ingredient['продукт']))
+            return None
     
     def get_recipe_by_id(self, recipe_id: int) -> Optional[Dict]:
         """Возвращает рецепт по ID"""
@@ -708,40 +1576,182 @@ class MultivarkaDatabase:
         
         return recipe_info
     
+    def iter_recipes_for_export(self) -> Iterator[Dict]:
+        """Потоково отдает все рецепты в формате get_recipe_by_id.
+        
+        Рецепты, ингредиенты и инструкции читаются тремя курсорами, упорядоченными
+        по id рецепта, и сливаются на лету, поэтому память не зависит от размера
+        каталога.
+        """
+        conn = self.get_connection()
+        try:
+            recipes_cursor = conn.execute("""
+                SELECT id, name, meal_type, is_ready, created_at
+                FROM recipes
+                ORDER BY id
+            """)
+            ingredients_cursor = conn.execute("""
+                SELECT recipe_id, product_name, quantity, unit
+                FROM recipe_ingredients
+                ORDER BY recipe_id, id
+            """)
+            instructions_cursor = conn.execute("""
+                SELECT recipe_id, instruction
+                FROM recipe_instructions
+                ORDER BY recipe_id, step_number
+            """)
+            ingredient = next(ingredients_cursor, None)
+            instruction = next(instructions_cursor, None)
+            
+            for recipe_row in recipes_cursor:
+                recipe_id = recipe_row['id']
+                recipe_info = {
+                    "id": recipe_id,
+                    "название": recipe_row['name'],
+                    "тип_приема": recipe_row['meal_type'],
+                    "готово": bool(recipe_row['is_ready']),
+                    "создан": recipe_row['created_at']
+                }
+                
+                # Пропускаем строки рецептов-сирот, удаленных без каскада
+                while ingredient is not None and ingredient['recipe_id'] < recipe_id:
+                    ingredient = next(ingredients_cursor, None)
+                ingredients = []
+                while ingredient is not None and ingredient['recipe_id'] == recipe_id:
+                    ingredients.append({
+                        "продукт": ingredient['product_name'],
+                        "количество": ingredient['quantity'],
+                        "единица": ingredient['unit']
+                    })
+                    ingredient = next(ingredients_cursor, None)
+                if ingredients:
+                    recipe_info["ингредиенты"] = ingredients
+                
+                while instruction is not None and instruction['recipe_id'] < recipe_id:
+                    instruction = next(instructions_cursor, None)
+                instructions = []
+                while instruction is not None and instruction['recipe_id'] == recipe_id:
+                    instructions.append(instruction['instruction'])
+                    instruction = next(instructions_cursor, None)
+                if instructions:
+                    recipe_info["инструкции"] = instructions
+                
+                yield recipe_info
+        finally:
+            conn.close()
+    
+    def count_recipes(self, meal_type: Optional[str] = None) -> int:
+        """Возвращает общее число рецептов (или рецептов одного типа приема пищи)"""
+        counts = self.count_recipes_by_meal_type()
+        if meal_type is not None:
+            return counts.get(meal_type, 0)
+        return sum(counts.values())
+    
+    def count_recipes_by_meal_type(self) -> Dict[str, int]:
+        """Число рецептов по типам приема пищи; пересчитывается только после изменения рецептов"""
+        cached = self._recipe_counts
+        revision = self._revision('recipes')
+        if cached is None or cached[0] != revision:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT meal_type, COUNT(*) FROM recipes GROUP BY meal_type")
+            cached = (revision, {row[0]: row[1] for row in cursor.fetchall()})
+            conn.close()
+            self._recipe_counts = cached
+        return dict(cached[1])
+    
+    def get_recipes_page(self, limit: int, cursor: Optional[str] = None,
+                         meal_type: Optional[str] = None) -> Dict:
+        """Страница списка рецептов (новые первыми) с пагинацией по ключу (created_at, id).
+        
+        cursor — значение next_cursor предыдущей страницы. Возвращает
+        {'recipes': [...], 'next_cursor': str или None}.
+        """
+        conditions = []
+        params = []
+        if cursor:
+            created_at, recipe_id = self._decode_page_cursor(cursor)
+            conditions.append("(r.created_at, r.id) < (?, ?)")
+            params.extend([created_at, recipe_id])
+        if meal_type:
+            conditions.append("r.meal_type = ?")
+            params.append(meal_type)
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        
+        conn = self.get_connection()
+        db_cursor = conn.cursor()
+        # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+        db_cursor.execute(f"""
+            SELECT {self._RECIPE_INFO_COLUMNS}
+            FROM recipes r
+            {where}
+            ORDER BY r.created_at DESC, r.id DESC
+            LIMIT ?
+        """, params + [limit + 1])
+        rows = db_cursor.fetchall()
+        conn.close()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_page_cursor(rows[-1]['created_at'], rows[-1]['id'])
+        
+        recipes = [self._recipe_info(row) for row in rows]
+        return {"recipes": recipes, "next_cursor": next_cursor}
+    
+    @staticmethod
+    def _encode_page_cursor(created_at: str, recipe_id: int) -> str:
+        """Непрозрачный курсор страницы из ключа последней строки"""
+        raw = json.dumps([created_at, recipe_id]).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+    
+    @staticmethod
+    def _decode_page_cursor(cursor: str) -> Tuple[str, int]:
+        """Разбирает курсор страницы; ValueError для некорректного значения"""
+        try:
+            created_at, recipe_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except Exception:
+            raise ValueError(f"Некорректный курсор страницы: {cursor}")
+        if not isinstance(created_at, str) or not isinstance(recipe_id, int):
+            raise ValueError(f"Некорректный курсор страницы: {cursor}")
+        return created_at, recipe_id
+    
     def get_all_recipes_with_info(self) -> List[Dict]:
         """Возвращает список всех рецептов с краткой информацией для управления"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT r.id, r.name, r.meal_type, r.is_ready, r.created_at,
-                   COUNT(DISTINCT ri.id) as ingredient_count
+        cursor.execute(f"""
+            SELECT {self._RECIPE_INFO_COLUMNS}
             FROM recipes r
-            LEFT JOIN recipe_ingredients ri ON r.id = ri.recipe_id
-            GROUP BY r.id, r.name, r.meal_type, r.is_ready, r.created_at
-            ORDER BY r.created_at DESC
+            ORDER BY r.created_at DESC, r.id DESC
         """)
         
-        recipes = []
-        for row in cursor.fetchall():
-            recipes.append({
-                "id": row['id'],
-                "название": row['name'],
-                "тип_приема": row['meal_type'],
-                "готово": bool(row['is_ready']),
-                "создан": row['created_at'],
-                "количество_ингредиентов": row['ingredient_count']
-            })
+        recipes = [self._recipe_info(row) for row in cursor.fetchall()]
         
         conn.close()
         return recipes
     
+    @staticmethod
+    def _recipe_info(row: sqlite3.Row) -> Dict:
+        """Краткая информация о рецепте для списков управления"""
+        return {
+            "id": row['id'],
+            "название": row['name'],
+            "тип_приема": row['meal_type'],
+            "готово": bool(row['is_ready']),
+            "создан": row['created_at'],
+            "количество_ингредиентов": row['ingredient_count'],
+            "количество_инструкций": row['instruction_count']
+        }
+    
     def update_recipe(self, recipe_id: int, meal_data: Dict) -> bool:
         """Обновляет существующий рецепт"""
         try:
             with self.lock:
                 conn = self.get_connection()
                 cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
                 
                 # Проверяем, что рецепт существует
                 cursor.execute("SELECT id FROM recipes WHERE id = ?", (recipe_id,))
@@ -752,11 +1762,14 @@ class MultivarkaDatabase:
                 # Обновляем основную информацию рецепта
                 cursor.execute("""
                     UPDATE recipes 
-                    SET name = ?, is_ready = ?, updated_at = CURRENT_TIMESTAMP
+                    SET name = ?, is_ready = ?, ingredient_count = ?, instruction_count = ?,
+                        updated_at = CURRENT_TIMESTAMP
                     WHERE id = ?
                 """, (
                     meal_data.get('блюдо', ''),
                     meal_data.get('готово', False),
+                    len(meal_data.get('ингредиенты') or []),
+                    len(meal_data.get('инструкции') or []),
                     recipe_id
                 ))
                 
@@ -771,7 +1784,9 @@ class MultivarkaDatabase:
                 if 'инструкции' in meal_data:
                     self._add_instructions(cursor, recipe_id, meal_data['инструкции'])
                 
+                shared_revision = self._write_revision(conn, 'recipes')
                 conn.commit()
+                self._bump_revision('recipes', shared_revision)
                 conn.close()
                 return True
                 
@@ -790,7 +1805,9 @@ class MultivarkaDatabase:
                 cursor.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
                 
                 success = cursor.rowcount > 0
+                shared_revision = self._write_revision(conn, 'recipes')
                 conn.commit()
+                self._bump_revision('recipes', shared_revision)
                 conn.close()
                 return success
                 
@@ -798,133 +1815,231 @@ class MultivarkaDatabase:
             print(f"Ошибка удаления рецепта: {e}")
             return False
     
-    def search_recipes(self, query: str = None, meal_type: str = None) -> List[Dict]:
-        """Поиск рецептов по названию или типу приема пищи"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        sql = """
-            SELECT r.id, r.name, r.meal_type, r.is_ready, r.created_at,
-                   COUNT(DISTINCT ri.id) as ingredient_count
-            FROM recipes r
-            LEFT JOIN recipe_ingredients ri ON r.id = ri.recipe_id
-            WHERE 1=1
-        """
+    def _search_filter(self, query: Optional[str], meal_type: Optional[str]) -> Tuple[str, List, bool]:
+        """Условия поиска рецептов: (FROM ... WHERE ..., параметры, используется ли FTS)"""
+        sql = " FROM recipes r"
+        conditions = []
         params = []
+        fulltext = False
         
         if query:
-            sql += " AND (r.name LIKE ? OR r.name LIKE ?)"
-            params.extend([f"%{query}%", f"%{query.lower()}%"])
+            # Каждое слово ищется по префиксу: «карт суп» -> "карт"* AND "суп"*
+            words = re.findall(r'\w+', query.lower().replace('ё', 'е'))
+            if self.fulltext_enabled and words:
+                sql += " JOIN recipes_fts ON recipes_fts.rowid = r.id"
+                conditions.append("recipes_fts MATCH ?")
+                params.append(" AND ".join(f'"{word}"*' for word in words))
+                fulltext = True
+            else:
+                conditions.append("(r.name LIKE ? OR r.name LIKE ?)")
+                params.extend([f"%{query}%", f"%{query.lower()}%"])
         
         if meal_type:
-            sql += " AND r.meal_type = ?"
+            conditions.append("r.meal_type = ?")
             params.append(meal_type)
         
-        sql += " GROUP BY r.id ORDER BY r.created_at DESC"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return sql, params, fulltext
+    
+    def search_recipes(self, query: str = None, meal_type: str = None,
+                       limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """Поиск рецептов по названию, ингредиентам и инструкциям или по типу приема пищи.
+        
+        С запросом результаты упорядочены по релевантности (bm25, совпадение
+        в названии весит больше, чем в ингредиентах и инструкциях).
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        filter_sql, params, fulltext = self._search_filter(query, meal_type)
+        order = "bm25(recipes_fts, 10.0, 3.0, 1.0), r.created_at DESC" if fulltext else "r.created_at DESC"
+        sql = f"""
+            SELECT {self._RECIPE_INFO_COLUMNS}
+            {filter_sql}
+            ORDER BY {order}
+        """
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
         
         cursor.execute(sql, params)
         
-        recipes = []
-        for row in cursor.fetchall():
-            recipes.append({
-                "id": row['id'],
-                "название": row['name'],
-                "тип_приема": row['meal_type'],
-                "готово": bool(row['is_ready']),
-                "создан": row['created_at'],
-                "количество_ингредиентов": row['ingredient_count']
-            })
+        recipes = [self._recipe_info(row) for row in cursor.fetchall()]
         
         conn.close()
         return recipes
     
+    def count_search_results(self, query: str = None, meal_type: str = None) -> int:
+        """Число рецептов, найденных search_recipes (для пагинации)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        filter_sql, params, _ = self._search_filter(query, meal_type)
+        cursor.execute(f"SELECT COUNT(*) {filter_sql}", params)
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+    
     # === РАБОТА С ТЕКУЩИМ РЕЦЕПТОМ ===
     
     def get_current_recipe(self) -> Optional[Dict]:
-        """Загружает текущий сохраненный рецепт"""
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT recipe_data FROM current_recipe LIMIT 1")
-            row = cursor.fetchone()
-            conn.close()
+        """Загружает текущее меню; содержимое блюд берется из индекса рецептов.
+        
+        Разобранное меню хранится в памяти, пока не изменились ревизии меню
+        и рецептов; вызывающий код получает собственную копию.
+        """
+        cached = self._current_menu
+        # Ревизии читаем до загрузки меню, чтобы не пропустить изменение
+        revisions = self.get_revisions()
+        if (cached is None or cached[0] != revisions['current_recipe']
+                or cached[1] != revisions['recipes']):
+            try:
+                conn = self.get_connection()
+                cursor = conn.cursor()
+                cursor.execute("SELECT meal_type, recipe_id, skip_cooking FROM current_menu ORDER BY rowid")
+                rows = [(row['meal_type'], row['recipe_id'], bool(row['skip_cooking'])) for row in cursor.fetchall()]
+                conn.close()
+            except Exception as e:
+                print(f"Ошибка загрузки текущего рецепта: {e}")
+                return None
             
-            if row:
-                import json
-                return json.loads(row['recipe_data'])
+            menu = self._hydrate_menu(rows, self.get_recipe_index()) if rows else None
+            cached = (revisions['current_recipe'], revisions['recipes'], menu)
+            self._current_menu = cached
+        
+        return self._copy_menu(cached[2]) if cached[2] is not None else None
+    
+    @staticmethod
+    def _copy_menu(recipe: Dict) -> Dict:
+        """Копия меню до уровня ингредиентов (заметно быстрее copy.deepcopy)"""
+        return {"меню": {
+            meal_type: {
+                key: [dict(item) if isinstance(item, dict) else item for item in value]
+                if isinstance(value, list) else value
+                for key, value in meal_data.items()
+            }
+            for meal_type, meal_data in recipe['меню'].items()
+        }}
+    
+    @staticmethod
+    def _hydrate_menu(rows: List[Tuple[str, int, bool]], recipe_index: RecipeIndex) -> Dict:
+        """Собирает меню из строк (прием пищи, id рецепта, skip_cooking)"""
+        recipe = {"меню": {}}
+        for meal_type, recipe_id, skip_cooking in rows:
+            location = recipe_index.positions.get(recipe_id)
+            if location is None:
+                continue
+            meal_data = recipe_index.meal_copy(*location)
+            # Как в прежнем JSON-меню: ключ есть только у остановленных блюд
+            if skip_cooking:
+                meal_data['skip_cooking'] = True
+            recipe['меню'][meal_type] = meal_data
+        return recipe
+    
+    @staticmethod
+    def _menu_recipe_id(recipe_index: RecipeIndex, meal_type: str, meal_data: Dict) -> Optional[int]:
+        """id рецепта для блюда меню: по полю 'id'.
+        
+        По названию и типу приема пищи сопоставляются только блюда без 'id'
+        (меню старого формата): среди рецептов с одинаковым названием
+        иначе можно было бы сослаться не на тот.
+        """
+        if 'id' in meal_data:
+            recipe_id = meal_data['id']
+            if recipe_index.positions.get(recipe_id, (None,))[0] == meal_type:
+                return recipe_id
             return None
-        except Exception as e:
-            print(f"Ошибка загрузки текущего рецепта: {e}")
+        position = recipe_index.names.get(meal_type, {}).get(meal_data.get('блюдо'))
+        if position is None:
             return None
+        return recipe_index.ids[meal_type][position]
     
     def save_current_recipe(self, recipe: Dict) -> bool:
-        """Сохраняет текущий рецепт"""
+        """Сохраняет текущее меню как ссылки на рецепты"""
+        try:
+            recipe_index = self.get_recipe_index()
+            rows = []
+            for meal_type, meal_data in recipe['меню'].items():
+                recipe_id = self._menu_recipe_id(recipe_index, meal_type, meal_data)
+                if recipe_id is None:
+                    print(f"Блюдо '{meal_data.get('блюдо')}' ({meal_type}) не найдено среди рецептов и не сохранено")
+                    continue
+                rows.append((meal_type, recipe_id, bool(meal_data.get('skip_cooking', False))))
+        except Exception as e:
+            print(f"Ошибка сохранения текущего рецепта: {e}")
+            return False
+        return self._save_menu_rows(rows, recipe_index)
+    
+    def _save_menu_rows(self, rows: List[Tuple[str, int, bool]], recipe_index: RecipeIndex) -> bool:
+        """Заменяет текущее меню строками (прием пищи, id рецепта, skip_cooking)"""
         try:
-            import json
             with self.lock:
                 conn = self.get_connection()
                 cursor = conn.cursor()
                 
-                # Удаляем старый текущий рецепт
-                cursor.execute("DELETE FROM current_recipe")
-                
-                # Сохраняем новый
-                cursor.execute("""
-                    INSERT INTO current_recipe (recipe_data)
-                    VALUES (?)
-                """, (json.dumps(recipe, ensure_ascii=False),))
+                # Заменяем меню целиком
+                cursor.execute("DELETE FROM current_menu")
+                cursor.executemany("""
+                    INSERT INTO current_menu (meal_type, recipe_id, skip_cooking)
+                    VALUES (?, ?, ?)
+                """, rows)
                 
+                shared_revision = self._write_revision(conn, 'current_recipe')
                 conn.commit()
+                revision = self._bump_revision('current_recipe', shared_revision)
                 conn.close()
+                # Кэш меню обновляем сразу, без повторного чтения из базы
+                self._current_menu = (revision, recipe_index.revision,
+                                      self._hydrate_menu(rows, recipe_index) if rows else None)
                 return True
         except Exception as e:
             print(f"Ошибка сохранения текущего рецепта: {e}")
             return False
     
-    def replace_meal_in_current_recipe(self, meal_type: str) -> Optional[Dict]:
-        """Заменяет конкретное блюдо в текущем рецепте"""
+    def replace_meal_in_current_recipe(self, meal_type: str, weighting: Optional[str] = None) -> Optional[Dict]:
+        """Заменяет конкретное блюдо в текущем рецепте (weighting — как в get_mixed_recipe)"""
         try:
-            # Загружаем текущий рецепт
-            current_recipe = self.get_current_recipe()
-            if not current_recipe:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT meal_type, recipe_id FROM current_menu")
+            current_ids = {row['meal_type']: row['recipe_id'] for row in cursor.fetchall()}
+            conn.close()
+            if not current_ids:
                 return None
             
-            # Сохраняем текущий статус skip_cooking
-            current_skip_status = False
-            if meal_type in current_recipe['меню']:
-                current_skip_status = current_recipe['меню'][meal_type].get('skip_cooking', False)
-            
-            # Получаем новое блюдо для замены
-            new_meals = self.get_recipes_by_meal_type(meal_type)
-            if not new_meals:
-                return None
+            recipe_index = self.get_recipe_index()
+            sampler = self.get_meal_sampler()
             
             # Исключаем текущее блюдо из выбора
             current_dish = None
-            if meal_type in current_recipe['меню'] and 'блюдо' in current_recipe['меню'][meal_type]:
-                current_dish = current_recipe['меню'][meal_type]['блюдо']
-            
-            # Фильтруем блюда, исключая текущее
-            available_meals = [meal for meal in new_meals if meal.get('блюдо') != current_dish]
-            if not available_meals:
-                # Если все блюда одинаковые, берем любое
-                available_meals = new_meals
+            location = recipe_index.positions.get(current_ids.get(meal_type))
+            if location is not None:
+                current_dish = recipe_index.meals[meal_type][location[1]].get('блюдо')
             
             # Выбираем случайное новое блюдо
-            new_meal = random.choice(available_meals)
-            
-            # Сохраняем статус skip_cooking в новом блюде
-            new_meal['skip_cooking'] = current_skip_status
-            
-            # Обновляем рецепт
-            current_recipe['меню'][meal_type] = new_meal
+            stock = self._sampling_stock(recipe_index, weighting)
+            position = sampler.sample(meal_type, self._sampling_weights(sampler, meal_type, weighting, stock),
+                                      exclude_name=current_dish)
+            if position is None:
+                return None
+            sampler.remember(meal_type, position)
+            recipe_id = recipe_index.ids[meal_type][position]
             
-            # Сохраняем обновленный рецепт
-            if self.save_current_recipe(current_recipe):
-                return current_recipe
+            # Меняется одна строка; статус skip_cooking сохраняется
+            with self.lock:
+                conn = self.get_connection()
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO current_menu (meal_type, recipe_id) VALUES (?, ?)
+                    ON CONFLICT(meal_type) DO UPDATE
+                    SET recipe_id = excluded.recipe_id, updated_at = CURRENT_TIMESTAMP
+                """, (meal_type, recipe_id))
+                shared_revision = self._write_revision(conn, 'current_recipe')
+                conn.commit()
+                self._bump_revision('current_recipe', shared_revision)
+                conn.close()
             
-            return None
+            return self.get_current_recipe()
         except Exception as e:
             print(f"Ошибка замены блюда в текущем рецепте: {e}")
             return None
@@ -935,9 +2050,12 @@ class MultivarkaDatabase:
             with self.lock:
                 conn = self.get_connection()
                 cursor = conn.cursor()
-                cursor.execute("DELETE FROM current_recipe")
+                cursor.execute("DELETE FROM current_menu")
+                shared_revision = self._write_revision(conn, 'current_recipe')
                 conn.commit()
+                revision = self._bump_revision('current_recipe', shared_revision)
                 conn.close()
+                self._current_menu = (revision, self._revision('recipes'), None)
                 return True
         except Exception as e:
             print(f"Ошибка очистки текущего рецепта: {e}")
@@ -946,21 +2064,23 @@ class MultivarkaDatabase:
     def toggle_skip_cooking(self, meal_type: str) -> Optional[Dict]:
         """Переключает статус skip_cooking для конкретного блюда в текущем рецепте"""
         try:
-            # Загружаем текущий рецепт
-            current_recipe = self.get_current_recipe()
-            if not current_recipe or meal_type not in current_recipe['меню']:
-                return None
-            
-            # Переключаем статус
-            meal_data = current_recipe['меню'][meal_type]
-            current_status = meal_data.get('skip_cooking', False)
-            meal_data['skip_cooking'] = not current_status
-            
-            # Сохраняем обновленный рецепт
-            if self.save_current_recipe(current_recipe):
-                return current_recipe
+            with self.lock:
+                conn = self.get_connection()
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE current_menu
+                    SET skip_cooking = NOT skip_cooking, updated_at = CURRENT_TIMESTAMP
+                    WHERE meal_type = ?
+                """, (meal_type,))
+                if cursor.rowcount == 0:
+                    conn.close()
+                    return None
+                shared_revision = self._write_revision(conn, 'current_recipe')
+                conn.commit()
+                self._bump_revision('current_recipe', shared_revision)
+                conn.close()
             
-            return None
+            return self.get_current_recipe()
         except Exception as e:
             print(f"Ошибка переключения статуса skip_cooking: {e}")
             return None
@@ -0,0 +1,101 @@
+-- Полнотекстовый индекс рецептов (SQLite FTS5)
+-- Одна строка индекса на рецепт (rowid = recipes.id): название, продукты
+-- ингредиентов и текст инструкций. unicode61 приводит кириллицу к нижнему
+-- регистру (remove_diacritics действует только на латиницу, поэтому «ё»
+-- заменяется на «е» при записи в индекс и в запросе); префиксные индексы
+-- ускоряют поиск по началу слова («карт*»).
+
+CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+    name,
+    ingredients,
+    instructions,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3 4'
+);
+
+-- Флаг отложенной синхронизации: пакетный импорт выставляет его внутри своей
+-- транзакции и сам записывает строки индекса для новых рецептов одним
+-- executemany, вместо перезаписи документа на каждый ингредиент и шаг
+CREATE TABLE IF NOT EXISTS recipes_fts_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    deferred INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO recipes_fts_state (id, deferred) VALUES (1, 0);
+
+-- Синхронизация с таблицей рецептов
+CREATE TRIGGER IF NOT EXISTS recipes_fts_insert
+    AFTER INSERT ON recipes
+    WHEN (SELECT deferred FROM recipes_fts_state) = 0
+BEGIN
+    INSERT INTO recipes_fts (rowid, name, ingredients, instructions) VALUES (NEW.id, replace(replace(NEW.name, 'ё', 'е'), 'Ё', 'Е'), '', '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipes_fts_update_name
+    AFTER UPDATE OF name ON recipes
+BEGIN
+    UPDATE recipes_fts SET name = replace(replace(NEW.name, 'ё', 'е'), 'Ё', 'Е') WHERE rowid = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipes_fts_delete
+    AFTER DELETE ON recipes
+BEGIN
+    DELETE FROM recipes_fts WHERE rowid = OLD.id;
+END;
+
+-- Синхронизация с ингредиентами: колонка собирается заново для рецепта
+CREATE TRIGGER IF NOT EXISTS recipes_fts_ingredient_insert
+    AFTER INSERT ON recipe_ingredients
+    WHEN (SELECT deferred FROM recipes_fts_state) = 0
+BEGIN
+    UPDATE recipes_fts
+    SET ingredients = (SELECT replace(replace(group_concat(product_name, ' '), 'ё', 'е'), 'Ё', 'Е') FROM recipe_ingredients WHERE recipe_id = NEW.recipe_id)
+    WHERE rowid = NEW.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipes_fts_ingredient_update
+    AFTER UPDATE OF product_name, recipe_id ON recipe_ingredients
+BEGIN
+    UPDATE recipes_fts
+    SET ingredients = COALESCE((SELECT replace(replace(group_concat(product_name, ' '), 'ё', 'е'), 'Ё', 'Е') FROM recipe_ingredients WHERE recipe_id = OLD.recipe_id), '')
+    WHERE rowid = OLD.recipe_id;
+    UPDATE recipes_fts
+    SET ingredients = COALESCE((SELECT replace(replace(group_concat(product_name, ' '), 'ё', 'е'), 'Ё', 'Е') FROM recipe_ingredients WHERE recipe_id = NEW.recipe_id), '')
+    WHERE rowid = NEW.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipes_fts_ingredient_delete
+    AFTER DELETE ON recipe_ingredients
+BEGIN
+    UPDATE recipes_fts
+    SET ingredients = COALESCE((SELECT replace(replace(group_concat(product_name, ' '), 'ё', 'е'), 'Ё', 'Е') FROM recipe_ingredients WHERE recipe_id = OLD.recipe_id), '')
+    WHERE rowid = OLD.recipe_id;
+END;
+
+-- Синхронизация с инструкциями
+CREATE TRIGGER IF NOT EXISTS recipes_fts_instruction_insert
+    AFTER INSERT ON recipe_instructions
+    WHEN (SELECT deferred FROM recipes_fts_state) = 0
+BEGIN
+    UPDATE recipes_fts
+    SET instructions = (SELECT replace(replace(group_concat(instruction, ' '), 'ё', 'е'), 'Ё', 'Е') FROM recipe_instructions WHERE recipe_id = NEW.recipe_id)
+    WHERE rowid = NEW.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipes_fts_instruction_update
+    AFTER UPDATE OF instruction, recipe_id ON recipe_instructions
+BEGIN
+    UPDATE recipes_fts
+    SET instructions = COALESCE((SELECT replace(replace(group_concat(instruction, ' '), 'ё', 'е'), 'Ё', 'Е') FROM recipe_instructions WHERE recipe_id = OLD.recipe_id), '')
+    WHERE rowid = OLD.recipe_id;
+    UPDATE recipes_fts
+    SET instructions = COALESCE((SELECT replace(replace(group_concat(instruction, ' '), 'ё', 'е'), 'Ё', 'Е') FROM recipe_instructions WHERE recipe_id = NEW.recipe_id), '')
+    WHERE rowid = NEW.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipes_fts_instruction_delete
+    AFTER DELETE ON recipe_instructions
+BEGIN
+    UPDATE recipes_fts
+    SET instructions = COALESCE((SELECT replace(replace(group_concat(instruction, ' '), 'ё', 'е'), 'Ё', 'Е') FROM recipe_instructions WHERE recipe_id = OLD.recipe_id), '')
+    WHERE rowid = OLD.recipe_id;
+END;
@@ -18,6 +18,8 @@ CREATE TABLE IF NOT EXISTS recipes (
     name TEXT NOT NULL,  -- название блюда
     meal_type TEXT NOT NULL,  -- завтрак, второй_завтрак, обед, полдник, ужин
     is_ready BOOLEAN DEFAULT FALSE,  -- готово ли блюдо
+    ingredient_count INTEGER NOT NULL DEFAULT 0,  -- число ингредиентов (обновляется вместе с ними)
+    instruction_count INTEGER NOT NULL DEFAULT 0,  -- число шагов инструкции
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -42,20 +44,34 @@ CREATE TABLE IF NOT EXISTS recipe_instructions (
     FOREIGN KEY (recipe_id) REFERENCES recipes(id) ON DELETE CASCADE
 );
 
--- Таблица для хранения текущего рецепта (только один активный рецепт)
-CREATE TABLE IF NOT EXISTS current_recipe (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    recipe_data TEXT NOT NULL,  -- JSON данные текущего рецепта
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+-- Текущее меню: по одной строке на прием пищи со ссылкой на рецепт
+-- (содержимое блюд берется из рецептов, порядок приемов пищи — по rowid)
+CREATE TABLE IF NOT EXISTS current_menu (
+    meal_type TEXT PRIMARY KEY,
+    recipe_id INTEGER NOT NULL,
+    skip_cooking BOOLEAN NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (recipe_id) REFERENCES recipes(id) ON DELETE CASCADE
+);
+
+-- Счетчики изменений склада, рецептов и меню, общие для всех процессов с этой базой
+-- (по ним процессы сбрасывают свои кэши и строят ETag)
+CREATE TABLE IF NOT EXISTS revisions (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
 );
 
+INSERT OR IGNORE INTO revisions (name) VALUES ('warehouse'), ('recipes'), ('current_recipe');
+
 -- Добавляем поле expiration_date к существующей таблице warehouse (если его еще нет)
 -- Используем PRAGMA для проверки существования колонки
 -- Если колонка не существует, добавляем её
 
 -- Индексы для оптимизации запросов
 CREATE INDEX IF NOT EXISTS idx_recipes_meal_type ON recipes(meal_type);
+-- Постраничный вывод рецептов (ключ пагинации: created_at, id)
+CREATE INDEX IF NOT EXISTS idx_recipes_created ON recipes(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_recipes_meal_type_created ON recipes(meal_type, created_at, id);
 CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_recipe_id ON recipe_ingredients(recipe_id);
 CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_product ON recipe_ingredients(product_name);
 CREATE INDEX IF NOT EXISTS idx_recipe_instructions_recipe_id ON recipe_instructions(recipe_id);
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Случайный выбор блюд для меню без загрузки всего каталога.
+
+Выбирается позиция в массиве рецептов одного типа приема пищи из индекса
+рецептов (RecipeIndex.meals / RecipeIndex.ids), и копируется только
+выбранный рецепт. Равномерный выбор стоит O(1). Взвешенный выбор делает
+один проход по массиву весов, посчитанному по данным индекса, и бинарный
+поиск по накопленным суммам. Веса бывают двух видов: штраф за недавний
+выбор ('recency') и соответствие складу ('stock', по оценкам RecipeIndex.scores).
+"""
+
+import math
+import random
+import threading
+from bisect import bisect_right
+from collections import deque
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence
+
+from recipe_index import RecipeIndex, StockVector
+
+# Допустимые способы взвешивания
+WEIGHTINGS = ('recency', 'stock')
+# Во сколько раз уменьшается вес недавно выбранного рецепта
+RECENT_PENALTY = 0.1
+# Сколько последних выборов запоминается для каждого типа приема пищи
+RECENT_SIZE = 5
+# Масштаб оценки блюда: рецепт, который хуже лучшего на столько, выбирается в e раз реже
+STOCK_TEMPERATURE = 50.0
+# Попыток равномерного выбора, прежде чем исключить текущее блюдо перебором
+UNIFORM_ATTEMPTS = 8
+
+
+class MealSampler:
+    """Случайный выбор рецептов одной ревизии каталога"""
+
+    def __init__(self, recipe_index: RecipeIndex, recent: Optional[Dict[str, deque]] = None,
+                 rng: Optional[random.Random] = None):
+        self.recipe_index = recipe_index
+        self.revision = recipe_index.revision
+        self._rng = rng or random
+        self._lock = threading.Lock()
+        # тип приема пищи -> id последних выбранных рецептов (переживают пересборку индекса)
+        self._recent: Dict[str, deque] = recent if recent is not None else {}
+
+    def sample(self, meal_type: str, weights: Optional[Sequence[float]] = None,
+               exclude_name: Optional[str] = None) -> Optional[int]:
+        """Позиция случайного рецепта; блюдо exclude_name выбирается, только если других нет"""
+        meals = self.recipe_index.meals.get(meal_type)
+        if not meals:
+            return None
+
+        if weights is not None:
+            if exclude_name is not None:
+                weights = [0.0 if meal.get('блюдо') == exclude_name else weight
+                           for meal, weight in zip(meals, weights)]
+            cumulative = list(accumulate(weights))
+            if cumulative[-1] > 0:
+                position = bisect_right(cumulative, self._rng.random() * cumulative[-1])
+                return min(position, len(meals) - 1)
+            # Все веса нулевые — выбираем равномерно
+
+        for _ in range(UNIFORM_ATTEMPTS):
+            position = self._rng.randrange(len(meals))
+            if exclude_name is None or meals[position].get('блюдо') != exclude_name:
+                return position
+        # Почти все рецепты с тем же названием — перебираем остальные явно
+        available = [position for position, meal in enumerate(meals) if meal.get('блюдо') != exclude_name]
+        return self._rng.choice(available) if available else self._rng.randrange(len(meals))
+
+    def remember(self, meal_type: str, position: int):
+        """Запоминает выбранный рецепт для штрафа 'recency'"""
+        recipe_id = self.recipe_index.ids[meal_type][position]
+        with self._lock:
+            self._recent.setdefault(meal_type, deque(maxlen=RECENT_SIZE)).append(recipe_id)
+
+    def recency_weights(self, meal_type: str) -> List[float]:
+        """Веса с пониженной вероятностью для недавно выбранных рецептов"""
+        weights = [1.0] * len(self.recipe_index.meals.get(meal_type, []))
+        with self._lock:
+            recent = list(self._recent.get(meal_type, ()))
+        for recipe_id in recent:
+            location = self.recipe_index.positions.get(recipe_id)
+            if location is not None:
+                weights[location[1]] = RECENT_PENALTY
+        return weights
+
+    def stock_weights(self, meal_type: str, stock: StockVector) -> List[float]:
+        """Веса по оценке блюда на складе: чем меньше оценка, тем чаще выбор"""
+        scores = self.recipe_index.scores(meal_type, stock)
+        if not scores:
+            return []
+        best = min(scores)
+        return [math.exp(-(score - best) / STOCK_TEMPERATURE) for score in scores]
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Планировщик меню на несколько дней под общий склад.
+
+В отличие от optimize_recipe_for_warehouse, где блюдо для каждого приема
+пищи выбирается независимо, здесь все блюда плана расходуют один и тот же
+запас. Ищется план на N дней × приемы пищи с минимальной суммой:
+
+    Σ оценок блюд (правила _calculate_meal_cost: стоимость * 10 + недостающие)
+    + WASTE_WEIGHT * количество продуктов, испорченных до использования
+
+Оценка блюда считается по остатку склада после предыдущих блюд плана,
+а бонус срока годности — относительно дня, в который блюдо готовится.
+Продукт, срок которого истек до этого дня, считается отсутствующим, а его
+неиспользованный остаток — потерей.
+
+Продукт «на наличие» расходуется целиком первым же блюдом плана, как при
+списании consume_meals, и следующим блюдам его нужно купить. Купленный
+продукт учитывается один раз за план, как в списке покупок build_shopping_list.
+
+Поиск — лучевой (beam search) по слотам «день × прием пищи» среди
+кандидатов, заранее отобранных по оценке на исходном складе. Если бюджет
+времени исчерпан, оставшиеся слоты заполняются жадно (ширина луча 1).
+"""
+
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from recipe_index import RecipeIndex
+
+# Вес единицы испорченного продукта (как недостающая единица в оценке блюда)
+WASTE_WEIGHT = 10
+
+
+class _PlanState:
+    """Частичный план: выбранные блюда и расход склада"""
+
+    __slots__ = ('score', 'used', 'bought', 'chosen', 'waste', 'parent', 'choice')
+
+    def __init__(self, score: float, used: Dict[int, float], bought: set, chosen: set,
+                 waste: Dict[int, float], parent: Optional['_PlanState'], choice: Optional[Tuple[str, int]]):
+        self.score = score
+        self.used = used          # колонка -> израсходованное количество со склада
+        self.bought = bought      # колонки 'availability', купленные по ходу плана
+        self.chosen = chosen      # (тип приема пищи, позиция) уже вошедших в план блюд
+        self.waste = waste        # колонка -> испорченный остаток
+        self.parent = parent
+        self.choice = choice
+
+    def choices(self) -> List[Tuple[str, int]]:
+        result = []
+        state = self
+        while state.choice is not None:
+            result.append(state.choice)
+            state = state.parent
+        result.reverse()
+        return result
+
+
+class MenuPlanner:
+    """Подбор меню на несколько дней по индексу рецептов и снимку склада"""
+
+    def __init__(self, recipe_index: RecipeIndex, warehouse_data: Dict,
+                 days_until: Callable[[Optional[str], str], Optional[int]],
+                 bonus_for_days: Callable[[Optional[int]], float]):
+        self.recipe_index = recipe_index
+        self.warehouse_data = warehouse_data
+        self._bonus_for_days = bonus_for_days
+
+        size = len(recipe_index.columns)
+        self._present = bytearray(size)
+        self._available = [0.0] * size
+        self._availability = bytearray(size)
+        # Последний день, когда продукт еще можно использовать (None — без ограничения)
+        self._last_day: List[Optional[int]] = [None] * size
+        self._expired_penalty = bytearray(size)
+        self._products = [None] * size
+        for product, column in recipe_index.columns.items():
+            self._products[column] = product
+
+        for product, product_data in warehouse_data['склад'].items():
+            column = recipe_index.columns.get(product)
+            if column is None:
+                continue
+            self._present[column] = 1
+            self._available[column] = product_data['количество']
+            self._availability[column] = product_data.get('тип', 'quantity') == 'availability'
+            days = days_until(product_data.get('срок_годности'), product)
+            if days is not None and days < 0:
+                # Уже просроченный продукт оценивается как в _calculate_meal_cost
+                self._expired_penalty[column] = 1
+            else:
+                self._last_day[column] = days
+
+        self._stock = recipe_index.stock_vector(
+            warehouse_data, lambda date_str, product: bonus_for_days(days_until(date_str, product))
+        )
+
+    def _bonus(self, column: int, day: int) -> Optional[float]:
+        """Бонус срока годности на день плана; None — продукт к этому дню испорчен"""
+        if self._expired_penalty[column]:
+            return self._bonus_for_days(-1)
+        last_day = self._last_day[column]
+        if last_day is None:
+            return self._bonus_for_days(None)
+        if day > last_day:
+            return None
+        return self._bonus_for_days(last_day - day)
+
+    def candidates(self, meal_type: str, limit: int) -> List[int]:
+        """Позиции рецептов с лучшими оценками на исходном складе"""
+        scores = self.recipe_index.scores(meal_type, self._stock)
+        order = sorted(range(len(scores)), key=scores.__getitem__)
+        return order[:limit]
+
+    def _expand(self, state: _PlanState, meal_type: str, position: int, day: int) -> _PlanState:
+        """Добавляет блюдо к плану, расходуя остаток склада"""
+        used = dict(state.used)
+        bought = state.bought
+        total_cost = 0.0
+        missing = 0
+
+        for column, amount, only_availability in self.recipe_index.ingredients(meal_type, position):
+            bonus = self._bonus(column, day) if self._present[column] else None
+            if bonus is None:
+                # Продукта нет на складе (или он уже испорчен)
+                if only_availability or self._availability[column]:
+                    if column not in bought:
+                        total_cost += 1
+                        missing += 1
+                        bought = bought | {column}
+                else:
+                    total_cost += amount
+                    missing += 1
+                continue
+
+            have = self._available[column] - used.get(column, 0)
+            if only_availability or self._availability[column]:
+                if have <= 0 and column not in bought:
+                    total_cost += 1
+                    missing += 1
+                    bought = bought | {column}
+                else:
+                    total_cost += bonus
+                # Приготовление сбрасывает наличие продукта в 0
+                used[column] = self._available[column]
+            elif have < amount:
+                total_cost += amount - have
+                missing += 1
+                if have > 0:
+                    total_cost += bonus * 0.3
+                    used[column] = self._available[column]
+            else:
+                total_cost += bonus
+                used[column] = used.get(column, 0) + amount
+
+        return _PlanState(state.score + total_cost * 10 + missing, used, bought,
+                          state.chosen | {(meal_type, position)}, state.waste, state, (meal_type, position))
+
+    def _close_day(self, state: _PlanState, day: int, expiring: List[int]) -> _PlanState:
+        """Учитывает остатки продуктов, срок которых заканчивается в этот день"""
+        waste = state.waste
+        penalty = 0.0
+        for column in expiring:
+            left = self._available[column] - state.used.get(column, 0)
+            if left > 0:
+                if waste is state.waste:
+                    waste = dict(waste)
+                waste[column] = left
+                penalty += left * WASTE_WEIGHT
+        if not penalty:
+            return state
+        closed = _PlanState(state.score + penalty, state.used, state.bought, state.chosen,
+                            waste, state.parent, state.choice)
+        return closed
+
+    def plan(self, days: int, meal_types: List[str], beam_width: int = 8,
+             candidates_per_meal: Optional[int] = None, time_budget: float = 2.0) -> Dict:
+        """Строит план на days дней.
+
+        Возвращает {'days': [{'меню': {...}}, ...], 'score', 'waste', 'complete',
+        'expanded', 'elapsed_ms'}; complete=False, если бюджет времени
+        закончился и часть слотов заполнена жадно.
+        """
+        started = time.perf_counter()
+        deadline = started + time_budget
+        limit = candidates_per_meal or max(4 * beam_width, days + beam_width)
+        pools = {meal_type: self.candidates(meal_type, limit) for meal_type in meal_types}
+
+        expiring_by_day: Dict[int, List[int]] = {}
+        for column, last_day in enumerate(self._last_day):
+            if (self._present[column] and last_day is not None and last_day < days
+                    and not self._availability[column]):
+                expiring_by_day.setdefault(last_day, []).append(column)
+
+        beam = [_PlanState(0.0, {}, frozenset(), frozenset(), {}, None, None)]
+        complete = True
+        expanded = 0
+
+        for day in range(days):
+            for meal_type in meal_types:
+                pool = pools[meal_type]
+                if not pool:
+                    continue
+                width = beam_width
+                if time.perf_counter() > deadline:
+                    width = 1
+                    complete = False
+
+                children = []
+                for state in beam:
+                    # Повторяем блюдо только если неиспользованных кандидатов не осталось
+                    fresh = [position for position in pool if (meal_type, position) not in state.chosen]
+                    for position in fresh or pool:
+                        children.append(self._expand(state, meal_type, position, day))
+                expanded += len(children)
+                children.sort(key=lambda child: child.score)
+                beam = children[:width]
+
+            beam = [self._close_day(state, day, expiring_by_day.get(day, [])) for state in beam]
+            beam.sort(key=lambda state: state.score)
+
+        best = beam[0]
+        plan_days = [{'меню': {}} for _ in range(days)]
+        slots = [(day, meal_type) for day in range(days) for meal_type in meal_types if pools[meal_type]]
+        for (day, _), (meal_type, position) in zip(slots, best.choices()):
+            plan_days[day]['меню'][meal_type] = self.recipe_index.meal_copy(meal_type, position)
+
+        return {
+            'days': plan_days,
+            'score': best.score,
+            'waste': {self._products[column]: amount for column, amount in best.waste.items()},
+            'complete': complete,
+            'expanded': expanded,
+            'elapsed_ms': (time.perf_counter() - started) * 1000,
+        }
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Скомпилированный индекс рецептов для подбора меню под склад.
+
+Продукты отображаются в плотные номера колонок, а требования рецептов
+хранятся в виде разреженной матрицы рецепт×продукт (CSR): плоские массивы
+колонок, количеств и флагов плюс смещения строк. Подбор блюда — один
+проход по этим массивам против вектора склада без словарных поисков
+и разбора дат.
+"""
+
+import copy
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class StockVector:
+    """Вектор склада в колонках индекса"""
+
+    def __init__(self, size: int):
+        self.present = bytearray(size)          # продукт есть в таблице склада
+        self.available = array('d', bytes(8 * size))
+        self.availability = bytearray(size)     # тип продукта на складе 'availability'
+        self.bonus = array('d', bytes(8 * size))
+
+
+class RecipeIndex:
+    """Индекс рецептов одного состояния каталога (одной ревизии рецептов)"""
+
+    def __init__(self, recipes: List[Tuple[str, Dict]], revision: int = 0,
+                 recipe_ids: Optional[List[int]] = None):
+        self.revision = revision
+        self.columns: Dict[str, int] = {}
+        self.products: List[str] = []  # название продукта по номеру колонки
+        self.meals: Dict[str, List[Dict]] = {}
+        # id рецептов в базе в том же порядке, что и meals (если переданы)
+        self.ids: Dict[str, List[Optional[int]]] = {}
+        # id рецепта -> (тип приема пищи, позиция)
+        self.positions: Dict[int, Tuple[str, int]] = {}
+        # тип приема пищи -> название блюда -> позиция первого рецепта с таким названием
+        self.names: Dict[str, Dict[str, int]] = {}
+        # CSR-матрица требований по каждому типу приема пищи
+        self._offsets: Dict[str, array] = {}
+        self._cols: Dict[str, array] = {}
+        self._amounts: Dict[str, array] = {}
+        self._availability: Dict[str, bytearray] = {}
+
+        for number, (meal_type, meal_data) in enumerate(recipes):
+            if meal_type not in self.meals:
+                self.meals[meal_type] = []
+                self.ids[meal_type] = []
+                self._offsets[meal_type] = array('l', [0])
+                self._cols[meal_type] = array('l')
+                self._amounts[meal_type] = array('d')
+                self._availability[meal_type] = bytearray()
+
+            cols = self._cols[meal_type]
+            amounts = self._amounts[meal_type]
+            availability = self._availability[meal_type]
+            for ingredient in meal_data.get('ингредиенты', []):
+                product = ingredient['продукт']
+                column = self.columns.get(product)
+                if column is None:
+                    column = self.columns[product] = len(self.columns)
+                    self.products.append(product)
+                cols.append(column)
+                amounts.append(ingredient['количество'])
+                availability.append(ingredient.get('тип', 'quantity') == 'availability')
+
+            position = len(self.meals[meal_type])
+            recipe_id = recipe_ids[number] if recipe_ids is not None else None
+            self.meals[meal_type].append(meal_data)
+            self.ids[meal_type].append(recipe_id)
+            if recipe_id is not None:
+                self.positions[recipe_id] = (meal_type, position)
+            self.names.setdefault(meal_type, {}).setdefault(meal_data.get('блюдо'), position)
+            self._offsets[meal_type].append(len(cols))
+
+    def stock_vector(self, warehouse_data: Dict,
+                     bonus_for: Callable[[Optional[str], str], float]) -> StockVector:
+        """Переводит склад в колонки индекса; бонус срока годности считается один раз на продукт"""
+        stock = StockVector(len(self.columns))
+        for product, product_data in warehouse_data['склад'].items():
+            column = self.columns.get(product)
+            if column is None:
+                continue
+            stock.present[column] = 1
+            stock.available[column] = product_data['количество']
+            stock.availability[column] = product_data.get('тип', 'quantity') == 'availability'
+            stock.bonus[column] = bonus_for(product_data.get('срок_годности'), product)
+        return stock
+
+    def scores(self, meal_type: str, stock: StockVector) -> List[float]:
+        """Оценки всех рецептов типа приема пищи (меньше — лучше).
+
+        Повторяет правила MultivarkaDatabase._calculate_meal_cost:
+        score = стоимость * 10 + число недостающих ингредиентов.
+        """
+        offsets = self._offsets.get(meal_type)
+        if offsets is None:
+            return []
+
+        cols = self._cols[meal_type]
+        amounts = self._amounts[meal_type]
+        ingredient_availability = self._availability[meal_type]
+        present = stock.present
+        available = stock.available
+        product_availability = stock.availability
+        bonus = stock.bonus
+
+        result = []
+        start = offsets[0]
+        for end in offsets[1:]:
+            total_cost = 0.0
+            missing = 0
+            for i in range(start, end):
+                column = cols[i]
+                amount = amounts[i]
+                if present[column]:
+                    have = available[column]
+                    if ingredient_availability[i] or product_availability[column]:
+                        if have == 0:
+                            total_cost += 1
+                            missing += 1
+                        else:
+                            total_cost += bonus[column]
+                    elif have < amount:
+                        total_cost += amount - have
+                        missing += 1
+                        if have > 0:
+                            total_cost += bonus[column] * 0.3
+                    else:
+                        total_cost += bonus[column]
+                else:
+                    total_cost += 1 if ingredient_availability[i] else amount
+                    missing += 1
+            result.append(total_cost * 10 + missing)
+            start = end
+        return result
+
+    def ingredients(self, meal_type: str, position: int) -> List[Tuple[int, float, bool]]:
+        """Требования рецепта в колонках индекса: (колонка, количество, только наличие)"""
+        offsets = self._offsets[meal_type]
+        cols = self._cols[meal_type]
+        amounts = self._amounts[meal_type]
+        availability = self._availability[meal_type]
+        return [(cols[i], amounts[i], bool(availability[i]))
+                for i in range(offsets[position], offsets[position + 1])]
+
+    def best_meal(self, meal_type: str, stock: StockVector) -> Optional[Dict]:
+        """Возвращает копию рецепта с наименьшей оценкой (при равенстве — первый по порядку)"""
+        scores = self.scores(meal_type, stock)
+        if not scores:
+            return None
+        best_position = min(range(len(scores)), key=scores.__getitem__)
+        return self.meal_copy(meal_type, best_position)
+
+    def meal_copy(self, meal_type: str, position: int) -> Dict:
+        """Копия рецепта с его id в поле 'id' (по нему меню ссылается на рецепт)"""
+        meal_data = copy.deepcopy(self.meals[meal_type][position])
+        recipe_id = self.ids[meal_type][position]
+        if recipe_id is not None:
+            meal_data['id'] = recipe_id
+        return meal_data
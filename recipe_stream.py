@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Потоковый экспорт и импорт рецептов.
+
+NDJSON (JSON по одной записи в строке): первая строка — заголовок
+{"export_info": {...}}, далее по одному рецепту в формате экспорта на строку.
+Импорт также принимает прежний формат {"export_info": ..., "recipes": [...]},
+разбирая массив по одному элементу. В обоих направлениях данные идут
+блоками, поэтому память не зависит от размера каталога.
+"""
+
+import codecs
+import json
+import re
+import zlib
+from typing import Dict, Iterable, Iterator, Optional
+
+# Размер блока, которым данные отдаются и читаются
+CHUNK_SIZE = 64 * 1024
+# Ограничение на размер одного рецепта при разборе импорта
+MAX_RECORD_SIZE = 16 * 1024 * 1024
+
+
+def iter_ndjson(header: Dict, records: Iterable[Dict]) -> Iterator[bytes]:
+    """Кодирует заголовок и записи в NDJSON, объединяя строки в блоки"""
+    buffer = [json.dumps({"export_info": header}, ensure_ascii=False)]
+    buffered = len(buffer[0])
+    for record in records:
+        line = json.dumps(record, ensure_ascii=False)
+        buffer.append(line)
+        buffered += len(line) + 1
+        if buffered >= CHUNK_SIZE:
+            yield ("\n".join(buffer) + "\n").encode('utf-8')
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield ("\n".join(buffer) + "\n").encode('utf-8')
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Сжимает поток блоков в gzip на лету"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class ImportFormatError(ValueError):
+    """Ошибка структуры импортируемого потока"""
+
+
+def iter_ndjson_records(stream, chunk_size: int = CHUNK_SIZE,
+                        max_line_size: int = MAX_RECORD_SIZE) -> Iterator:
+    """Читает NDJSON из бинарного потока построчно.
+
+    Пустые строки и строка-заголовок с export_info пропускаются. Вместо
+    строки с некорректным JSON или длиннее max_line_size байт отдается
+    ImportFormatError, чтобы импорт мог учесть ошибку и продолжить
+    со следующей строки.
+    """
+    line_number = 0
+    for raw_line in _iter_lines(stream, chunk_size, max_line_size):
+        line_number += 1
+        if raw_line is None:
+            yield ImportFormatError(f"строка {line_number}: слишком большая запись")
+            continue
+        line = raw_line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except (ValueError, UnicodeDecodeError) as e:
+            yield ImportFormatError(f"строка {line_number}: некорректный JSON ({e})")
+            continue
+        if isinstance(record, dict) and 'export_info' in record and len(record) == 1:
+            continue
+        yield record
+
+
+def _iter_lines(stream, chunk_size: int, max_line_size: int) -> Iterator[Optional[bytes]]:
+    """Делит бинарный поток на строки, не читая его целиком.
+
+    Вместо строки длиннее max_line_size отдается None; её остаток
+    пропускается без накопления в памяти.
+    """
+    pending = b""
+    skipping = False
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if skipping:
+            newline = chunk.find(b"\n")
+            if newline < 0:
+                continue
+            chunk = chunk[newline + 1:]
+            skipping = False
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line if len(line) <= max_line_size else None
+        if len(pending) > max_line_size:
+            yield None
+            pending = b""
+            skipping = True
+    if pending:
+        yield pending
+
+
+class ExportArrayReader:
+    """Инкрементальный разбор экспорта {"export_info": ..., "recipes": [...]}.
+
+    open() читает поток до начала массива recipes, после чего элементы
+    массива разбираются по одному по мере поступления данных.
+    """
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, stream, chunk_size: int = CHUNK_SIZE):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _read_more(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            self._buffer = self._buffer[self._pos:] + self._utf8.decode(b"", final=True)
+        else:
+            self._buffer = self._buffer[self._pos:] + self._utf8.decode(chunk)
+        self._pos = 0
+        return True
+
+    def _skip_whitespace(self) -> Optional[str]:
+        """Пропускает пробелы и возвращает следующий символ (None в конце потока)"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read_more():
+                return None
+
+    def open(self) -> 'ExportArrayReader':
+        """Находит начало массива recipes; ImportFormatError, если его нет"""
+        if self._skip_whitespace() is None:
+            raise ImportFormatError('Не переданы данные для импорта')
+        if self._buffer[self._pos] != '{':
+            raise ImportFormatError('Неверный формат данных: ожидается JSON-объект')
+
+        marker = re.compile(r'"recipes"\s*:\s*')
+        while True:
+            match = marker.search(self._buffer, self._pos)
+            if match and match.end() < len(self._buffer):
+                self._pos = match.end()
+                break
+            # Оставляем хвост, в котором может начинаться маркер
+            self._pos = max(self._pos, len(self._buffer) - 32)
+            if not self._read_more():
+                raise ImportFormatError('Неверный формат данных: отсутствует секция "recipes"')
+
+        if self._skip_whitespace() != '[':
+            raise ImportFormatError('Неверный формат данных: "recipes" должен быть массивом')
+        self._pos += 1
+        return self
+
+    def __iter__(self) -> Iterator:
+        first = True
+        while True:
+            char = self._skip_whitespace()
+            if char is None:
+                raise ImportFormatError('Неожиданный конец данных в массиве "recipes"')
+            if char == ']':
+                return
+            if not first:
+                if char != ',':
+                    raise ImportFormatError('Неверный формат данных в массиве "recipes"')
+                self._pos += 1
+                self._skip_whitespace()
+            first = False
+
+            while True:
+                try:
+                    record, end = self._decoder.raw_decode(self._buffer, self._pos)
+                except ValueError:
+                    # Элемент пришел не целиком — дочитываем поток
+                    if len(self._buffer) - self._pos > MAX_RECORD_SIZE:
+                        raise ImportFormatError('Неверный формат данных: слишком большой или поврежденный рецепт')
+                    if not self._read_more():
+                        raise ImportFormatError('Неожиданный конец данных в массиве "recipes"')
+                    continue
+                if end == len(self._buffer) and not self._eof and not isinstance(record, (dict, list, str)):
+                    # Число на границе блока могло оборваться
+                    self._read_more()
+                    continue
+                self._pos = end
+                break
+            yield record
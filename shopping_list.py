@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Расчет списка покупок для одного или нескольких меню.
+
+Спрос на каждый продукт суммируется по всем блюдам, которые нужно готовить
+(по всем дням плана), и только затем сравнивается с запасом на складе,
+поэтому два блюда с одним продуктом не «делят» между собой весь запас дважды.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+
+def build_shopping_list(menus: Iterable[Dict], warehouse: Dict) -> Dict[str, Dict]:
+    """Возвращает недостающие продукты для набора меню {"меню": {прием пищи: блюдо}}.
+
+    Формат результата совпадает с прежним analyze_ingredients:
+    для продуктов 'availability' — нужно 1 штуку, если её нет на складе;
+    для остальных — разница между суммарной потребностью и остатком.
+    """
+    stock = warehouse['склад']
+
+    # Вычитаем запас один раз на продукт
+    needed_products = {}
+    for product, (total, unit, availability_only) in _menu_demand(menus).items():
+        entry = _needed_entry(total, unit, availability_only, stock.get(product))
+        if entry is not None:
+            needed_products[product] = entry
+
+    return needed_products
+
+
+def update_shopping_list(menus: Iterable[Dict], needed_products: Dict[str, Dict],
+                         changed: Dict[str, Dict], removed: Iterable[str]) -> Dict[str, Dict]:
+    """Пересчитывает список покупок после изменения склада только по затронутым продуктам.
+
+    needed_products — список до изменения, changed и removed — изменения склада
+    в формате дельты load_warehouse. Склад целиком не нужен: остальные продукты
+    не менялись, и их строки списка остаются прежними.
+    """
+    demand = _menu_demand(menus)
+    updated = {product: dict(info) for product, info in needed_products.items()}
+    touched = [(product, product_data) for product, product_data in changed.items()]
+    touched.extend((product, None) for product in removed)
+    for product, product_data in touched:
+        if product not in demand:
+            continue
+        entry = _needed_entry(*demand[product], product_data)
+        if entry is None:
+            updated.pop(product, None)
+        else:
+            updated[product] = entry
+    return updated
+
+
+def _menu_demand(menus: Iterable[Dict]) -> Dict[str, List]:
+    """Суммарная потребность по продуктам: продукт -> [количество, единица, нужно ли только наличие]"""
+    demand = {}
+
+    # Один проход по всем блюдам: суммируем потребность по продуктам
+    for menu in menus:
+        for meal_data in menu['меню'].values():
+            # Пропускаем блюда, которые не нужно готовить
+            if meal_data.get('skip_cooking', False):
+                continue
+            for ingredient in meal_data.get('ингредиенты', []):
+                product = ingredient['продукт']
+                entry = demand.get(product)
+                if entry is None:
+                    entry = demand[product] = [0, ingredient['единица'], False]
+                entry[0] += ingredient['количество']
+                if ingredient.get('тип', 'quantity') == 'availability':
+                    entry[2] = True
+    return demand
+
+
+def _needed_entry(total: float, unit: str, availability_only: bool,
+                  product_data: Optional[Dict]) -> Optional[Dict]:
+    """Строка списка покупок для одного продукта или None, если запаса хватает"""
+    available = product_data['количество'] if product_data else 0
+    if product_data and product_data.get('тип', 'quantity') == 'availability':
+        availability_only = True
+
+    if availability_only:
+        if available == 0:
+            return {
+                'нужно': 1,
+                'единица': unit,
+                'есть': 0,
+                'тип': 'availability'
+            }
+    elif total > available:
+        return {
+            'нужно': total - available,
+            'единица': unit,
+            'есть': available,
+            'всего_требуется': total,  # Общее количество для всех блюд
+            'тип': 'quantity'
+        }
+    return None
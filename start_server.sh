@@ -2,6 +2,11 @@
 
 # Скрипт для запуска веб-сервера управления складом
 # Автоматически создает виртуальное окружение, устанавливает зависимости и запускает сервер
+#
+# Использование: ./start_server.sh [dev|prod|asgi]
+#   dev  — сервер разработки Flask (по умолчанию)
+#   prod — несколько рабочих процессов, WORKERS=N (по умолчанию — число ядер)
+#   asgi — ASGI-сервер uvicorn
 
 set -e  # Остановить выполнение при ошибке
 
@@ -30,6 +35,17 @@ print_error() {
 }
 
 # Получаем директорию скрипта
+MODE="${1:-dev}"
+case "$MODE" in
+    dev)  RUN_ARGS="" ;;
+    prod) RUN_ARGS="--prefork --workers ${WORKERS:-$(nproc 2>/dev/null || echo 2)}" ;;
+    asgi) RUN_ARGS="--asgi" ;;
+    *)
+        print_error "Неизвестный режим: $MODE (допустимо: dev, prod, asgi)"
+        exit 1
+        ;;
+esac
+
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 cd "$SCRIPT_DIR"
 
@@ -100,6 +116,11 @@ fi
 # Устанавливаем зависимости
 print_message "Устанавливаем зависимости из requirements.txt..."
 pip install -r requirements.txt
+if [ "$MODE" = "asgi" ]; then
+    # ASGI-сервер нужен только для режима asgi
+    print_message "Устанавливаем зависимости режима asgi из requirements-asgi.txt..."
+    pip install -r requirements-asgi.txt
+fi
 
 print_success "Все зависимости установлены"
 
@@ -117,8 +138,8 @@ if pgrep -f "warehouse_web/run.py" > /dev/null; then
 fi
 
 # Запускаем сервер в фоновом режиме
-print_message "Запускаем веб-сервер..."
-nohup python warehouse_web/run.py > server.log 2>&1 &
+print_message "Запускаем веб-сервер (режим: $MODE)..."
+nohup python warehouse_web/run.py $RUN_ARGS > server.log 2>&1 &
 SERVER_PID=$!
 
 # Сохраняем PID сервера
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Тесты API веб-приложения на временной базе данных
+"""
+
+import itertools
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+sys.path.append(os.path.join(os.path.dirname(__file__), 'warehouse_web'))
+import app as app_module
+from database import MultivarkaDatabase
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Приложение работает с пустой базой во временной папке"""
+    database = MultivarkaDatabase(str(tmp_path / 'test.db'))
+    monkeypatch.setattr(app_module, 'db', database)
+    return database
+
+
+@pytest.fixture
+def client(database):
+    return app_module.app.test_client()
+
+
+def read_event(chunks):
+    """Читает из SSE-потока следующее событие (пропуская служебные строки)"""
+    for chunk in chunks:
+        text = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+        if text.startswith('event: '):
+            event_line, data_line = text.strip().split('\n')
+            return event_line[len('event: '):], json.loads(data_line[len('data: '):])
+    return None
+
+
+def test_events_push_warehouse_delta(client, database, monkeypatch):
+    """Лента событий присылает только изменившиеся продукты"""
+    monkeypatch.setattr(app_module, 'EVENTS_KEEPALIVE_SECONDS', 0.05)
+    database.add_product_to_warehouse('яйца', 10, 'шт')
+    database.add_product_to_warehouse('рис', 500, 'г')
+
+    response = client.get('/api/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    event, revisions = read_event(chunks)
+    assert event == 'revisions'
+
+    database.update_product_quantity('яйца', 4)
+    event, delta = read_event(chunks)
+    assert event == 'warehouse'
+    assert delta['changed'] == {'яйца': {'количество': 4, 'единица': 'шт', 'тип': 'quantity'}}
+    assert delta['removed'] == []
+    assert delta['revision'] == revisions['warehouse'] + 1
+    response.close()
+
+
+def test_events_report_removals_and_menu_in_one_wakeup(client, database, monkeypatch):
+    """Изменения склада и меню за одно пробуждение приходят двумя событиями"""
+    monkeypatch.setattr(app_module, 'EVENTS_KEEPALIVE_SECONDS', 0.05)
+    database.add_product_to_warehouse('рис', 500, 'г')
+    database.add_single_recipe('обед', {'блюдо': 'плов', 'ингредиенты': [
+        {'продукт': 'рис', 'количество': 200, 'единица': 'г'}]})
+
+    response = client.get('/api/events', buffered=False)
+    chunks = iter(response.response)
+    assert read_event(chunks)[0] == 'revisions'
+
+    # Обе записи происходят, пока лента ждет следующего чтения
+    database.delete_product_from_warehouse('рис')
+    database.save_current_recipe({'меню': {'обед': database.get_recipes_by_meal_type('обед')[0]}})
+    event, delta = read_event(chunks)
+    assert event == 'warehouse' and delta['removed'] == ['рис']
+    # Не дольше нескольких служебных комментариев: событие меню должно прийти сразу
+    event, menu = read_event(itertools.islice(chunks, 5)) or (None, None)
+    assert event == 'menu'
+    assert menu['needed_products']['рис']['нужно'] == 200
+
+def test_read_apis_answer_304_while_revisions_are_unchanged(client, database):
+    """ETag меняется только после записи в соответствующие таблицы"""
+    database.add_product_to_warehouse('яйца', 10, 'шт')
+
+    first = client.get('/api/sklad')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.json['склад']['яйца']['количество'] == 10
+
+    cached = client.get('/api/sklad', headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b''
+
+    # Изменение рецептов не затрагивает склад
+    database.add_single_recipe('обед', {'блюдо': 'суп'})
+    assert client.get('/api/sklad', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/recipes').json['total'] == 1
+
+    database.update_product_quantity('яйца', 3)
+    fresh = client.get('/api/sklad', headers={'If-None-Match': etag})
+    assert fresh.status_code == 200 and fresh.headers['ETag'] != etag
+
+
+def test_needed_products_are_memoized_by_revisions(client, database, monkeypatch):
+    """Список покупок пересчитывается только после изменения меню или склада"""
+    monkeypatch.setattr(app_module, 'needed_products_cache', app_module.LRUCache(maxsize=4))
+    database.add_single_recipe('обед', {
+        'блюдо': 'суп',
+        'ингредиенты': [{'продукт': 'картофель', 'количество': 300, 'единица': 'г'}]
+    })
+    database.add_product_to_warehouse('картофель', 100, 'г')
+
+    first = client.get('/api/needed_products').json['needed_products']
+    assert first['картофель']['нужно'] == 200
+    client.get('/api/needed_products')
+    client.get('/api/needed_products', headers={'If-None-Match': 'другой'})
+    info = app_module.needed_products_cache.cache_info()
+    assert info['hits'] >= 1 and info['size'] == 1
+
+    database.update_product_quantity('картофель', 300)
+    assert client.get('/api/needed_products').json['needed_products'] == {}
+    assert app_module.needed_products_cache.cache_info()['size'] == 2
+
+
+def test_cookable_api_rejects_max_missing_above_limit(client):
+    """Значение max_missing больше числа корзин индекса не усекается молча"""
+    assert client.get('/api/cookable?max_missing=5').status_code == 400
+    assert client.get('/api/cookable?max_missing=2').status_code == 200
+
+
+def test_recipes_api_pages_by_cursor(client, database):
+    """Список рецептов отдается страницами, счетчики — для всего каталога"""
+    for i in range(5):
+        database.add_single_recipe('обед' if i < 3 else 'ужин', {'блюдо': f'блюдо {i}'})
+
+    first = client.get('/api/recipes?limit=2').json
+    assert [recipe['название'] for recipe in first['recipes']] == ['блюдо 4', 'блюдо 3']
+    assert first['total'] == 5 and first['counts'] == {'обед': 3, 'ужин': 2}
+
+    second = client.get(f"/api/recipes?limit=2&cursor={first['next_cursor']}").json
+    assert [recipe['название'] for recipe in second['recipes']] == ['блюдо 2', 'блюдо 1']
+
+    lunches = client.get('/api/recipes?limit=10&meal_type=обед').json
+    assert lunches['total'] == 3 and lunches['next_cursor'] is None
+    assert client.get('/api/recipes?cursor=мусор').status_code == 400
+    assert client.get('/api/recipes').json['total'] == 5
+
+
+def test_cook_meal_consumes_several_meals_at_once(client, database):
+    """Несколько блюд списываются одной транзакцией, ответ содержит изменения склада"""
+    database.add_product_to_warehouse('яйца', 10, 'шт', expiration_date='2999-01-01')
+    database.add_product_to_warehouse('соль', 1, 'г', 'availability')
+    database.add_product_to_warehouse('рис', 100, 'г')
+    menu = {'меню': {
+        'завтрак': {'блюдо': 'омлет', 'ингредиенты': [
+            {'продукт': 'яйца', 'количество': 3, 'единица': 'шт'},
+            {'продукт': 'соль', 'количество': 1, 'единица': 'г', 'тип': 'availability'}]},
+        'обед': {'блюдо': 'яйца с рисом', 'ингредиенты': [
+            {'продукт': 'яйца', 'количество': 7, 'единица': 'шт'},
+            {'продукт': 'рис', 'количество': 40, 'единица': 'г'}]},
+        'ужин': {'блюдо': 'рис', 'skip_cooking': True, 'ингредиенты': [
+            {'продукт': 'рис', 'количество': 60, 'единица': 'г'}]},
+    }}
+    # Меню ссылается на рецепты из базы
+    for meal_type, meal_data in menu['меню'].items():
+        database.add_single_recipe(meal_type, meal_data)
+    database.save_current_recipe(menu)
+    revision = database.get_revisions()['warehouse']
+
+    response = client.post('/api/cook_meal', json={'whole_day': True}).json
+    assert response['cooked'] == ['завтрак', 'обед']
+    assert response['warehouse'] == {
+        'changed': {
+            'яйца': {'количество': 0, 'единица': 'шт', 'тип': 'quantity'},
+            'соль': {'количество': 0, 'единица': 'г', 'тип': 'availability'},
+            'рис': {'количество': 60, 'единица': 'г', 'тип': 'quantity'},
+        },
+        'removed': [],
+        'revision': revision + 1
+    }
+    assert database.load_warehouse()['склад']['рис']['количество'] == 60
+    assert client.post('/api/cook_meal', json={'meal_names': ['обед', 'полдник']}).status_code == 404
+
+
+def test_cook_meal_validates_names_and_updates_needed_products_from_delta(client, database, monkeypatch):
+    """Названия проверяются и не повторяются, список покупок строится по изменениям склада"""
+    database.add_product_to_warehouse('рис', 100, 'г')
+    database.add_product_to_warehouse('соль', 1, 'г', 'availability')
+    menu = {'меню': {
+        'обед': {'блюдо': 'рис', 'ингредиенты': [
+            {'продукт': 'рис', 'количество': 80, 'единица': 'г'},
+            {'продукт': 'соль', 'количество': 1, 'единица': 'г', 'тип': 'availability'}]},
+        'ужин': {'блюдо': 'рис на ужин', 'ингредиенты': [
+            {'продукт': 'рис', 'количество': 50, 'единица': 'г'}]},
+    }}
+    for meal_type, meal_data in menu['меню'].items():
+        database.add_single_recipe(meal_type, meal_data)
+    database.save_current_recipe(menu)
+
+    assert client.post('/api/cook_meal', json={'meal_names': 'обед'}).status_code == 400
+    assert client.post('/api/cook_meal', json={'meal_names': ['обед', 1]}).status_code == 400
+    assert client.post('/api/cook_meal', json={'meal_name': ['обед']}).status_code == 400
+    assert database.load_warehouse()['склад']['рис']['количество'] == 100
+
+    client.get('/api/needed_products')
+    monkeypatch.setattr(database, 'load_warehouse', lambda: pytest.fail("склад перечитан после списания"))
+    response = client.post('/api/cook_meal', json={'meal_names': ['обед', 'обед']}).json
+    monkeypatch.undo()
+
+    assert response['cooked'] == ['обед']
+    assert response['warehouse']['changed']['рис']['количество'] == 20
+    expected = app_module.analyze_ingredients(database.get_current_recipe(), database.load_warehouse())
+    assert response['needed_products'] == expected
+    assert set(expected) == {'рис', 'соль'}
+
+
+def test_update_bulk_applies_valid_changes_in_one_revision(client, database):
+    """Пакетное обновление: одна ревизия склада, ошибки — по позициям"""
+    database.add_product_to_warehouse('яйца', 10, 'шт', expiration_date='2030-01-01')
+    database.add_product_to_warehouse('рис', 500, 'г')
+    revision = database._revisions['warehouse']
+
+    response = client.post('/api/update_bulk', json={'изменения': [
+        {'продукт': 'яйца', 'количество': 0},
+        {'продукт': 'рис', 'покупка': 250, 'срок_годности': '2031-05-01'},
+        {'продукт': 'молоко', 'покупка': 1, 'единица': 'л'},
+        {'продукт': 'сахар', 'количество': 5},
+        {'продукт': 'рис', 'количество': -1},
+    ]})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['applied'] == 3
+    assert data['revision'] == revision + 1
+    assert [result['success'] for result in data['results']] == [True, True, True, False, False]
+    assert data['results'][3]['error'] == 'продукт не найден'
+
+    stock = database.load_warehouse()['склад']
+    assert stock['яйца']['количество'] == 0
+    assert stock['яйца'].get('срок_годности') is None
+    assert stock['рис']['количество'] == 750
+    assert stock['рис']['срок_годности'] == '2031-05-01'
+    assert stock['молоко']['количество'] == 1
+    assert 'сахар' not in stock
+
+    assert client.post('/api/update_bulk', json={'изменения': []}).status_code == 400
+
+
+def test_asgi_adapter_serves_flask_app(database):
+    """ASGI-точка входа передает запрос и тело во Flask и возвращает ответ целиком"""
+    import asyncio
+    from asgi import WsgiToAsgi
+
+    application = WsgiToAsgi(app_module.app, request_threads=2, stream_threads=2)
+    database.add_product_to_warehouse('рис', 500, 'г')
+
+    async def call(method, path, body=b''):
+        messages = [{'type': 'http.request', 'body': body[:5], 'more_body': True},
+                    {'type': 'http.request', 'body': body[5:], 'more_body': False}]
+        finished = asyncio.Event()
+        sent = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                finished.set()
+
+        scope = {'type': 'http', 'method': method, 'path': path, 'root_path': '', 'query_string': b'',
+                 'headers': [(b'content-type', b'application/json'),
+                             (b'content-length', str(len(body)).encode())],
+                 'server': ('localhost', 80), 'client': ('127.0.0.1', 1234)}
+        await application(scope, receive, send)
+        payload = b''.join(message.get('body', b'') for message in sent[1:])
+        return sent[0]['status'], json.loads(payload)
+
+    async def scenario():
+        body = json.dumps({'изменения': [{'продукт': 'рис', 'количество': 300}]}).encode('utf-8')
+        status, data = await call('POST', '/api/update_bulk', body)
+        assert status == 200 and data['applied'] == 1
+        # Несколько запросов одновременно обслуживаются пулом потоков
+        results = await asyncio.gather(*(call('GET', '/api/sklad') for _ in range(5)))
+        assert all(status == 200 and data['склад']['рис']['количество'] == 300 for status, data in results)
+
+    asyncio.run(scenario())
+    application.executor.shutdown()
+    application.stream_executor.shutdown()
+
+
+def test_asgi_event_stream_does_not_block_ordinary_responses(database, monkeypatch):
+    """Открытая лента событий занимает поток потоковых ответов, но не задерживает обычные"""
+    import asyncio
+    import time
+    from asgi import WsgiToAsgi
+
+    monkeypatch.setattr(app_module, 'EVENTS_KEEPALIVE_SECONDS', 1.0)
+    application = WsgiToAsgi(app_module.app, request_threads=2, stream_threads=1)
+
+    async def call(path, closed):
+        requested = False
+        sent = []
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await closed.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if message['type'] == 'http.response.body' and len(sent) > 2:
+                closed.set()
+
+        scope = {'type': 'http', 'method': 'GET', 'path': path, 'root_path': '', 'query_string': b'',
+                 'headers': [], 'server': ('localhost', 80), 'client': ('127.0.0.1', 1234)}
+        await application(scope, receive, send)
+        return sent
+
+    async def scenario():
+        stream_closed = asyncio.Event()
+        stream = asyncio.ensure_future(call('/api/events', stream_closed))
+        await asyncio.sleep(0.2)
+        started = time.perf_counter()
+        sent = await call('/api/sklad', asyncio.Event())
+        elapsed = time.perf_counter() - started
+        stream_closed.set()
+        await stream
+        return sent, elapsed
+
+    sent, elapsed = asyncio.run(scenario())
+    application.executor.shutdown()
+    application.stream_executor.shutdown()
+    assert sent[0]['status'] == 200 and 'склад' in json.loads(sent[1]['body'])
+    assert elapsed < 0.5
+
+@pytest.mark.parametrize('ndjson', [True, False])
+def test_import_keeps_good_recipes_next_to_malformed_ones(client, database, ndjson):
+    """Ошибочная запись импорта не отменяет соседние рецепты из той же пачки"""
+    records = [
+        {'название': 'суп', 'тип_приема': 'обед',
+         'ингредиенты': [{'продукт': 'вода', 'количество': 1, 'единица': 'л'}]},
+        {'название': ['не', 'строка'], 'тип_приема': 'обед'},
+        {'название': 'каша', 'тип_приема': 'завтрак', 'инструкции': ['сварить']},
+        {'название': 'рагу', 'тип_приема': 'ужин',
+         'ингредиенты': [{'продукт': 'морковь', 'количество': {'г': 1}, 'единица': 'г'}]},
+        {'название': 'плов', 'тип_приема': 'ужин'},
+    ]
+    if ndjson:
+        body = '\n'.join(json.dumps(record, ensure_ascii=False) for record in records)
+        response = client.post('/api/recipes/import', data=body.encode('utf-8'),
+                               content_type='application/x-ndjson')
+    else:
+        response = client.post('/api/recipes/import', json={'export_info': {}, 'recipes': records})
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['imported_count'] == 3
+    assert data['error_count'] == 2
+    assert [error.split(':')[0] for error in data['errors']] == ['Рецепт #2', 'Рецепт #4']
+    assert database.count_recipes() == 3
@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Тесты модуля database.py на временной базе данных
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import date
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+from database import MultivarkaDatabase
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Пустая база данных во временной папке"""
+    return MultivarkaDatabase(str(tmp_path / 'test.db'))
+
+
+def add_recipe(database, meal_type, name, products, instructions=None):
+    """Добавляет рецепт с ингредиентами вида {продукт: количество}"""
+    meal_data = {
+        'блюдо': name,
+        'ингредиенты': [
+            {'продукт': product, 'количество': amount, 'единица': 'г'}
+            for product, amount in products.items()
+        ]
+    }
+    if instructions:
+        meal_data['инструкции'] = instructions
+    assert database.add_single_recipe(meal_type, meal_data)
+
+
+def test_recipes_are_hydrated_with_ingredients_and_instructions(database):
+    """Пакетная загрузка собирает рецепты в прежнем формате"""
+    add_recipe(database, 'обед', 'суп', {'картофель': 300, 'морковь': 100}, ['почистить', 'сварить'])
+    add_recipe(database, 'обед', 'каша', {'рис': 200})
+    add_recipe(database, 'ужин', 'рыба', {'рыба': 1})
+
+    lunch = sorted(database.get_recipes_by_meal_type('обед'), key=lambda meal: meal['блюдо'])
+    assert lunch == [
+        {
+            'блюдо': 'каша',
+            'ингредиенты': [{'продукт': 'рис', 'количество': 200, 'единица': 'г', 'тип': 'quantity'}]
+        },
+        {
+            'блюдо': 'суп',
+            'ингредиенты': [
+                {'продукт': 'картофель', 'количество': 300, 'единица': 'г', 'тип': 'quantity'},
+                {'продукт': 'морковь', 'количество': 100, 'единица': 'г', 'тип': 'quantity'}
+            ],
+            'инструкции': ['почистить', 'сварить']
+        }
+    ]
+
+    all_recipes = database.get_all_recipes()
+    assert len(all_recipes) == 3
+    dinner = [recipe['меню']['ужин'] for recipe in all_recipes if 'ужин' in recipe['меню']]
+    assert dinner == [{
+        'блюдо': 'рыба',
+        'ингредиенты': [{'продукт': 'рыба', 'количество': 1, 'единица': 'г', 'тип': 'quantity'}]
+    }]
+
+
+def test_connection_pool_reuses_connections_in_wal_mode(tmp_path):
+    """Соединения переиспользуются, а выдачи и ожидание попадают в метрики"""
+    waits = []
+    database = MultivarkaDatabase(str(tmp_path / 'test.db'), pool_size=2, metrics_hook=waits.append)
+
+    conn = database.get_connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    conn.close()
+
+    for _ in range(5):
+        database.get_all_recipes()
+
+    stats = database.pool.stats()
+    assert stats['checkouts'] == 6
+    assert stats['open'] == 1
+    assert len(waits) == 6
+
+
+def test_warehouse_snapshot_stays_correct_after_writes(database):
+    """Снимок склада обслуживает чтения из памяти и обновляется после каждой записи"""
+    database.add_product_to_warehouse('молоко', 500, 'мл', expiration_date='2030-01-01')
+    first = database.load_warehouse()
+    revision = database.get_revisions()['warehouse']
+
+    # Изменения копии не портят снимок
+    first['склад']['молоко']['количество'] = 0
+    assert database.load_warehouse()['склад']['молоко']['количество'] == 500
+    assert database.get_revisions()['warehouse'] == revision
+
+    database.update_product_quantity('молоко', 200)
+    assert database.load_warehouse()['склад']['молоко']['количество'] == 200
+
+    database.consume_ingredients_for_meal('завтрак', {
+        'ингредиенты': [{'продукт': 'молоко', 'количество': 200, 'единица': 'мл'}]
+    })
+    assert database.load_warehouse()['склад']['молоко'] == {'количество': 0, 'единица': 'мл', 'тип': 'quantity'}
+
+    database.save_warehouse({'склад': {'сахар': {'количество': 1, 'единица': 'ч.л.', 'тип': 'availability'}}})
+    assert list(database.load_warehouse()['склад']) == ['сахар']
+
+    database.delete_product_from_warehouse('сахар')
+    assert database.load_warehouse() == {'склад': {}}
+    assert database.get_revisions()['warehouse'] > revision
+
+
+def test_recipe_index_scores_match_calculate_meal_cost(database):
+    """Скомпилированный индекс дает те же оценки, что и _calculate_meal_cost"""
+    add_recipe(database, 'обед', 'суп', {'картофель': 300, 'морковь': 100})
+    add_recipe(database, 'обед', 'плов', {'рис': 200, 'морковь': 50})
+    add_recipe(database, 'обед', 'чай', {'чай': 1})
+    database.add_product_to_warehouse('картофель', 500, 'г', expiration_date='2000-01-01')
+    database.add_product_to_warehouse('морковь', 60, 'г')
+    database.add_product_to_warehouse('чай', 1, 'пакетик', 'availability')
+
+    warehouse = database.load_warehouse()
+    recipe_index = database.get_recipe_index()
+    stock = recipe_index.stock_vector(warehouse, database._get_expiration_priority_bonus)
+
+    expected = []
+    for meal in recipe_index.meals['обед']:
+        cost, missing = database._calculate_meal_cost(meal['ингредиенты'], warehouse)
+        expected.append(cost * 10 + missing)
+    assert recipe_index.scores('обед', stock) == pytest.approx(expected)
+
+    optimized = database.optimize_recipe_for_warehouse()
+    assert optimized['меню']['обед']['блюдо'] == 'чай'
+
+    # Индекс перестраивается только после изменения рецептов
+    assert database.get_recipe_index() is recipe_index
+    add_recipe(database, 'ужин', 'рыба', {'рыба': 1})
+    assert database.get_recipe_index() is not recipe_index
+
+
+def test_plan_menu_shares_stock_between_days(database):
+    """План на несколько дней расходует общий склад и учитывает порчу продуктов"""
+    add_recipe(database, 'обед', 'суп', {'картофель': 300})
+    add_recipe(database, 'обед', 'пюре', {'картофель': 300})
+    add_recipe(database, 'обед', 'каша', {'рис': 200})
+    database.add_product_to_warehouse('картофель', 300, 'г', expiration_date=date.today().isoformat())
+    database.add_product_to_warehouse('рис', 200, 'г')
+
+    # По отдельности «суп» и «пюре» бесплатны, но картофеля хватает только на одно блюдо
+    plan = database.plan_menu(2, meal_types=['обед'], beam_width=4)
+    lunches = [day['меню']['обед']['блюдо'] for day in plan['days']]
+    assert lunches[0] in ('суп', 'пюре') and lunches[1] == 'каша'
+    assert plan['waste'] == {} and plan['complete']
+
+    # Картофель истекает сегодня: то, что не съедено в первый день, пропадает
+    database.update_product_quantity('картофель', 1000)
+    plan = database.plan_menu(2, meal_types=['обед'], beam_width=4)
+    assert plan['waste'] == {'картофель': 700}
+
+
+def test_plan_menu_uses_up_availability_products(database):
+    """Продукт «на наличие» расходуется первым блюдом, на следующие дни его нужно купить"""
+    for name in ('чай с сахаром', 'кофе с сахаром'):
+        database.add_single_recipe('полдник', {'блюдо': name, 'ингредиенты': [
+            {'продукт': 'сахар', 'количество': 1, 'единица': 'ч.л.', 'тип': 'availability'}]})
+    database.add_product_to_warehouse('сахар', 1, 'ч.л.', 'availability')
+
+    one_day = database.plan_menu(1, meal_types=['полдник'])['score']
+    # Второй день: сахар закончился и покупается (одна недостающая единица)
+    assert database.plan_menu(2, meal_types=['полдник'])['score'] == one_day + 11
+    # Купленного сахара хватает до конца плана
+    assert database.plan_menu(3, meal_types=['полдник'])['score'] == 2 * one_day + 11
+
+
+def test_cookable_recipes_follow_warehouse_changes(database):
+    """Счетчики недостающих ингредиентов обновляются при изменении склада"""
+    add_recipe(database, 'обед', 'суп', {'картофель': 300, 'морковь': 100})
+    add_recipe(database, 'обед', 'пюре', {'картофель': 500})
+    add_recipe(database, 'ужин', 'рыба', {'рыба': 1})
+    database.add_product_to_warehouse('картофель', 400, 'г')
+
+    def names(max_missing=0, meal_type=None):
+        return {recipe['название']: recipe['не_хватает']
+                for recipe in database.get_cookable_recipes(max_missing, meal_type)}
+
+    assert names() == {}
+    assert names(1) == {'суп': ['морковь'], 'пюре': ['картофель'], 'рыба': ['рыба']}
+    assert names(1, 'обед') == {'суп': ['морковь'], 'пюре': ['картофель']}
+
+    database.add_product_to_warehouse('морковь', 100, 'г')
+    database.update_product_quantity('картофель', 500)
+    assert names() == {'суп': [], 'пюре': []}
+
+    # Ниже требуемого количества рецепт снова перестает быть готовым
+    database.update_product_quantity('картофель', 300)
+    assert names() == {'суп': []}
+    database.delete_product_from_warehouse('картофель')
+    assert names(1) == {'суп': ['картофель'], 'пюре': ['картофель'], 'рыба': ['рыба']}
+
+    # Индекс пересобирается после изменения рецептов
+    add_recipe(database, 'ужин', 'салат', {'морковь': 50})
+    assert names(0, 'ужин') == {'салат': []}
+    assert database.get_cookable_recipes()[0]['id'] is not None
+
+
+def test_cookable_recipes_reject_limit_and_skip_unchanged_warehouse(database, monkeypatch):
+    """max_missing сверх числа корзин — ошибка; без изменений склад не копируется"""
+    add_recipe(database, 'обед', 'суп', {'картофель': 300})
+    with pytest.raises(ValueError):
+        database.get_cookable_recipes(5)
+
+    assert database.get_cookable_recipes(1)[0]['название'] == 'суп'
+    monkeypatch.setattr(database, 'load_warehouse', lambda: pytest.fail("склад не менялся"))
+    assert database.get_cookable_recipes(1)[0]['не_хватает'] == ['картофель']
+
+
+def test_search_recipes_uses_fulltext_index(database):
+    """Поиск находит рецепты по названию, ингредиентам и инструкциям и следует за изменениями"""
+    add_recipe(database, 'обед', 'Картофельный суп', {'картофель': 300}, ['Сварить бульон'])
+    add_recipe(database, 'ужин', 'Пюре', {'Картофель': 500, 'молоко': 100}, ['Растолочь'])
+    add_recipe(database, 'завтрак', 'Ёжики', {'фарш': 300}, ['Обжарить лук'])
+    assert database.fulltext_enabled
+
+    def names(query, **kwargs):
+        return [recipe['название'] for recipe in database.search_recipes(query, **kwargs)]
+
+    # Совпадение в названии ранжируется выше совпадения в ингредиентах
+    assert names('карт') == ['Картофельный суп', 'Пюре']
+    assert names('картофель', meal_type='ужин') == ['Пюре']
+    assert names('бульон') == ['Картофельный суп']
+    assert names('ежики') == ['Ёжики']
+    assert names('карт', limit=1, offset=1) == ['Пюре']
+    assert database.count_search_results('карт') == 2
+    assert database.search_recipes('пюре')[0]['количество_ингредиентов'] == 2
+
+    # Пакетный импорт пишет строки индекса сам, минуя триггеры
+    database.add_recipes_bulk([('обед', {'блюдо': 'Щи', 'ингредиенты': [
+        {'продукт': 'капуста', 'количество': 1, 'единица': 'шт'}
+    ], 'инструкции': ['Тушить ёмкость']})])
+    assert names('капуста') == ['Щи'] and names('емкость') == ['Щи']
+    add_recipe(database, 'обед', 'Борщ', {'свекла': 1})
+    assert names('свекла') == ['Борщ']
+
+    recipe_id = database.search_recipes('пюре')[0]['id']
+    database.update_recipe(recipe_id, {'блюдо': 'Пюре', 'ингредиенты': [
+        {'продукт': 'горох', 'количество': 200, 'единица': 'г'}
+    ]})
+    assert names('картофель') == ['Картофельный суп']
+    assert names('горох') == ['Пюре'] and names('растолочь') == []
+
+    database.delete_recipe(recipe_id)
+    assert names('горох') == []
+
+
+def test_recipes_page_walks_catalogue_by_keyset(database):
+    """Страницы по ключу (created_at, id) покрывают каталог без пропусков и повторов"""
+    for i in range(7):
+        add_recipe(database, 'обед' if i % 2 else 'ужин', f'блюдо {i}', {'рис': 10 + i})
+
+    seen = []
+    cursor = None
+    while True:
+        page = database.get_recipes_page(3, cursor)
+        seen.extend(recipe['название'] for recipe in page['recipes'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    # Рецепты созданы в одну секунду, порядок задает id
+    assert seen == [f'блюдо {i}' for i in reversed(range(7))]
+
+    dinners = database.get_recipes_page(10, meal_type='ужин')
+    assert [recipe['название'] for recipe in dinners['recipes']] == ['блюдо 6', 'блюдо 4', 'блюдо 2', 'блюдо 0']
+    assert dinners['next_cursor'] is None
+    assert dinners['recipes'][0]['количество_ингредиентов'] == 1
+
+    assert database.count_recipes_by_meal_type() == {'обед': 3, 'ужин': 4}
+    assert database.count_recipes('ужин') == 4
+    database.delete_recipe(dinners['recipes'][0]['id'])
+    assert database.count_recipes() == 6
+
+    with pytest.raises(ValueError):
+        database.get_recipes_page(3, 'не курсор')
+
+
+def test_ingredient_counts_are_stored_and_backfilled(tmp_path):
+    """Счетчики ингредиентов и инструкций хранятся в recipes и заполняются при миграции"""
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE recipes (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL,
+            meal_type TEXT NOT NULL, is_ready BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE recipe_ingredients (id INTEGER PRIMARY KEY AUTOINCREMENT, recipe_id INTEGER NOT NULL,
+            product_name TEXT NOT NULL, quantity REAL NOT NULL, unit TEXT NOT NULL,
+            ingredient_type TEXT NOT NULL DEFAULT 'quantity');
+        CREATE TABLE recipe_instructions (id INTEGER PRIMARY KEY AUTOINCREMENT, recipe_id INTEGER NOT NULL,
+            step_number INTEGER NOT NULL, instruction TEXT NOT NULL);
+        INSERT INTO recipes (name, meal_type) VALUES ('суп', 'обед');
+        INSERT INTO recipe_ingredients (recipe_id, product_name, quantity, unit) VALUES (1, 'вода', 1, 'л'), (1, 'соль', 1, 'г');
+        INSERT INTO recipe_instructions (recipe_id, step_number, instruction) VALUES (1, 1, 'сварить');
+    """)
+    conn.close()
+
+    database = MultivarkaDatabase(path)
+    [soup] = database.get_all_recipes_with_info()
+    assert soup['количество_ингредиентов'] == 2 and soup['количество_инструкций'] == 1
+
+    database.update_recipe(soup['id'], {'блюдо': 'суп', 'инструкции': ['сварить', 'посолить', 'подать']})
+    database.add_recipes_bulk([('ужин', {'блюдо': 'рыба', 'ингредиенты': [
+        {'продукт': 'рыба', 'количество': 1, 'единица': 'шт'}
+    ]})])
+    counts = {recipe['название']: (recipe['количество_ингредиентов'], recipe['количество_инструкций'])
+              for recipe in database.get_all_recipes_with_info()}
+    assert counts == {'суп': (0, 3), 'рыба': (1, 0)}
+    assert database.search_recipes('рыба')[0]['количество_ингредиентов'] == 1
+
+
+def test_current_menu_references_recipes(database):
+    """Меню хранит ссылки на рецепты: переключение и замена меняют одну строку, правка рецепта видна в меню"""
+    add_recipe(database, 'обед', 'суп', {'картофель': 300})
+    add_recipe(database, 'обед', 'плов', {'рис': 200})
+    add_recipe(database, 'ужин', 'рыба', {'рыба': 1})
+    menu = {'меню': {'обед': database.get_recipes_by_meal_type('обед')[0],
+                     'ужин': database.get_recipes_by_meal_type('ужин')[0]}}
+    assert database.save_current_recipe(menu)
+    lunch = database.get_current_recipe()['меню']['обед']['блюдо']
+
+    # Ключ skip_cooking есть только у остановленных блюд, как в прежнем JSON-меню
+    assert 'skip_cooking' not in database.get_current_recipe()['меню']['ужин']
+    recipe = database.toggle_skip_cooking('ужин')
+    assert list(recipe['меню']) == ['обед', 'ужин']
+    assert recipe['меню']['ужин']['skip_cooking'] is True
+    assert database.toggle_skip_cooking('завтрак') is None
+
+    recipe = database.replace_meal_in_current_recipe('обед')
+    assert recipe['меню']['обед']['блюдо'] != lunch
+    assert recipe['меню']['ужин']['skip_cooking'] is True
+
+    [fish] = database.search_recipes(meal_type='ужин')
+    database.update_recipe(fish['id'], {'блюдо': 'рыба', 'ингредиенты': [
+        {'продукт': 'рыба', 'количество': 2, 'единица': 'шт'}]})
+    dinner = database.get_current_recipe()['меню']['ужин']
+    assert dinner['ингредиенты'][0]['количество'] == 2
+    assert dinner['skip_cooking'] is True
+
+    database.delete_recipe(fish['id'])
+    assert list(database.get_current_recipe()['меню']) == ['обед']
+
+
+def test_current_menu_keeps_recipe_among_same_named_ones(database):
+    """Меню ссылается на рецепт по id, даже если другой рецепт называется так же"""
+    add_recipe(database, 'обед', 'суп', {'картофель': 300})
+    add_recipe(database, 'обед', 'суп', {'фасоль': 200})
+    database.add_product_to_warehouse('фасоль', 200, 'г')
+
+    optimized = database.optimize_recipe_for_warehouse()
+    assert optimized['меню']['обед']['ингредиенты'][0]['продукт'] == 'фасоль'
+    assert database.save_current_recipe(optimized)
+    menu = database.get_current_recipe()
+    assert menu['меню']['обед']['id'] == optimized['меню']['обед']['id']
+
+    # Повторное сохранение гидратированного меню не меняет ссылку
+    assert database.save_current_recipe(menu)
+    assert database.get_current_recipe()['меню']['обед']['ингредиенты'][0]['продукт'] == 'фасоль'
+
+def test_current_menu_is_cached_and_copied(database, monkeypatch):
+    """Повторное чтение меню не ходит в базу, а изменение полученной копии не портит кэш"""
+    add_recipe(database, 'обед', 'суп', {'картофель': 300})
+    assert database.save_current_recipe({'меню': {'обед': {'блюдо': 'суп'}}})
+
+    monkeypatch.setattr(database, 'get_connection', lambda: pytest.fail('меню читается из базы'))
+    recipe = database.get_current_recipe()
+    recipe['меню']['обед']['ингредиенты'].clear()
+    recipe['меню'].clear()
+    assert database.get_current_recipe()['меню']['обед']['ингредиенты'][0]['продукт'] == 'картофель'
+    monkeypatch.undo()
+
+    database.toggle_skip_cooking('обед')
+    assert database.get_current_recipe()['меню']['обед']['skip_cooking'] is True
+    assert database.clear_current_recipe()
+    assert database.get_current_recipe() is None
+
+
+def test_mixed_recipe_samples_ids_without_loading_catalogue(database, monkeypatch):
+    """Случайное меню выбирается по массивам id индекса, веса учитывают склад и недавний выбор"""
+    add_recipe(database, 'обед', 'суп', {'картофель': 300})
+    add_recipe(database, 'обед', 'плов', {'рис': 200})
+    add_recipe(database, 'ужин', 'рыба', {'рыба': 1})
+    database.get_recipe_index()
+    monkeypatch.setattr(database, 'get_recipes_by_meal_type', lambda meal_type: pytest.fail('загружен весь тип'))
+
+    recipe = database.get_mixed_recipe()
+    assert list(recipe['меню']) == ['обед', 'ужин']
+    assert recipe['меню']['ужин']['блюдо'] == 'рыба'
+
+    # Под склад подходит только плов: с весами 'stock' он выбирается почти всегда
+    database.add_product_to_warehouse('рис', 1000, 'г')
+    picks = []
+    for _ in range(20):
+        database.clear_current_recipe()
+        picks.append(database.get_mixed_recipe('stock')['меню']['обед']['блюдо'])
+    assert picks.count('плов') >= 18
+
+    sampler = database.get_meal_sampler()
+    sampler.remember('обед', 0)
+    weights = sampler.recency_weights('обед')
+    assert weights[0] < weights[1] == 1.0
+
+    for _ in range(5):
+        before = database.get_current_recipe()['меню']['обед']['блюдо']
+        after = database.replace_meal_in_current_recipe('обед', 'recency')['меню']['обед']['блюдо']
+        assert after != before
+
+
+def test_current_recipe_json_is_migrated_to_current_menu(tmp_path):
+    """Меню из старой JSON-таблицы переносится по названию и типу приема пищи"""
+    path = str(tmp_path / 'old.db')
+    database = MultivarkaDatabase(path)
+    add_recipe(database, 'обед', 'суп', {'картофель': 300})
+    database.pool.close_all()
+
+    conn = sqlite3.connect(path)
+    conn.execute("DROP TABLE current_menu")
+    conn.execute("CREATE TABLE current_recipe (id INTEGER PRIMARY KEY AUTOINCREMENT, recipe_data TEXT NOT NULL)")
+    conn.execute("INSERT INTO current_recipe (recipe_data) VALUES (?)", (json.dumps({'меню': {
+        'обед': {'блюдо': 'суп', 'skip_cooking': True},
+        'ужин': {'блюдо': 'удаленное блюдо'},
+    }}, ensure_ascii=False),))
+    conn.commit()
+    conn.close()
+
+    database = MultivarkaDatabase(path)
+    recipe = database.get_current_recipe()
+    assert list(recipe['меню']) == ['обед']
+    assert recipe['меню']['обед']['skip_cooking'] is True
+    assert recipe['меню']['обед']['ингредиенты'][0]['продукт'] == 'картофель'
+
+    # Несопоставленное блюдо не теряется: прежняя таблица сохранена под другим именем
+    conn = sqlite3.connect(path)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    saved = json.loads(conn.execute("SELECT recipe_data FROM current_recipe_unmigrated").fetchone()[0])
+    conn.close()
+    assert 'current_recipe' not in tables
+    assert saved['меню']['ужин']['блюдо'] == 'удаленное блюдо'
+
+
+def test_expiration_cache_follows_product_date_changes(database):
+    """Кэш сроков годности обновляется при смене даты продукта и наступлении нового дня"""
+    cache = database.expiration_cache
+    database.add_product_to_warehouse('творог', 1, 'г', expiration_date='2000-01-01')
+    assert database._get_expiration_priority_bonus('2000-01-01', 'творог') == 50
+
+    database.update_product_expiration('творог', '2999-01-01')
+    assert 'творог' not in cache._entries
+    assert database._get_expiration_priority_bonus('2999-01-01', 'творог') == -5
+    assert cache.days_until('не дата', 'творог') is None
+
+    cache._day = None
+    assert cache.days_until('2999-01-01', 'творог') > 0
+    assert list(cache._entries) == ['творог']
+
+
+def test_sync_warehouse_writes_only_changed_rows(database):
+    """Сохранение склада применяет только разницу с сохраненным состоянием"""
+    database.add_product_to_warehouse('яйца', 10, 'шт')
+    database.add_product_to_warehouse('рис', 500, 'г')
+    database.add_product_to_warehouse('соль', 1, 'г', 'availability')
+
+    warehouse = database.load_warehouse()
+    warehouse['склад']['яйца']['количество'] = 4
+    del warehouse['склад']['соль']
+    warehouse['склад']['чай'] = {'количество': 1, 'единица': 'пакетик', 'тип': 'availability'}
+
+    assert database.sync_warehouse(warehouse) == {'inserted': 1, 'updated': 1, 'deleted': 1}
+    assert database.load_warehouse() == warehouse
+
+    revision = database.get_revisions()['warehouse']
+    assert database.sync_warehouse(warehouse) == {'inserted': 0, 'updated': 0, 'deleted': 0}
+    assert database.get_revisions()['warehouse'] == revision
+
+
+def test_add_recipes_bulk_reports_errors_per_recipe(database):
+    """Пакетный импорт сохраняет корректные рецепты и сообщает об ошибках по номеру"""
+    recipes = [
+        ('обед', {'блюдо': 'суп', 'ингредиенты': [{'продукт': 'вода', 'количество': 1, 'единица': 'л'}]}),
+        ('', {'блюдо': 'без типа'}),
+        ('ужин', {'блюдо': 'рыба', 'ингредиенты': [{'продукт': 'рыба'}]}),
+        ('ужин', {'блюдо': 'каша', 'инструкции': ['сварить']}),
+    ]
+    result = database.add_recipes_bulk(iter(recipes), chunk_size=2)
+
+    assert result['imported'] == 2
+    assert result['total'] == 4
+    assert [position for position, _ in result['errors']] == [1, 2]
+    assert sorted(meal['блюдо'] for meal in database.get_recipes_by_meal_type('ужин')) == ['каша']
+    assert database.get_recipes_by_meal_type('обед')[0]['ингредиенты'][0]['продукт'] == 'вода'
+
+
+def test_iter_recipes_for_export_matches_get_recipe_by_id(database):
+    """Потоковый экспорт отдает рецепты в том же виде, что и get_recipe_by_id"""
+    add_recipe(database, 'обед', 'суп', {'картофель': 300, 'морковь': 100}, ['почистить', 'сварить'])
+    database.add_single_recipe('ужин', {'блюдо': 'пустой'})
+    add_recipe(database, 'ужин', 'рыба', {'рыба': 1}, ['запечь'])
+    database.delete_recipe(1)
+
+    exported = list(database.iter_recipes_for_export())
+    assert [recipe['id'] for recipe in exported] == [2, 3]
+    assert exported == [database.get_recipe_by_id(recipe['id']) for recipe in exported]
+    assert database.count_recipes() == 2
+
+
+def test_revisions_are_shared_between_processes(tmp_path, monkeypatch):
+    """Запись через другой экземпляр базы видна по общим счетчикам изменений"""
+    monkeypatch.setattr(MultivarkaDatabase, 'REVISION_SYNC_SECONDS', 0)
+    path = str(tmp_path / 'shared.db')
+    writer = MultivarkaDatabase(path)
+    reader = MultivarkaDatabase(path)
+
+    assert writer.add_product_to_warehouse('рис', 100, 'г')
+    assert reader.load_warehouse()['склад']['рис']['количество'] == 100
+    revision = reader.get_revisions()['warehouse']
+
+    # Другой экземпляр пишет в базу — кэш склада читателя устаревает по общему счетчику
+    assert writer.update_product_quantity('рис', 50)
+    assert reader.get_revisions()['warehouse'] > revision
+    assert reader.load_warehouse()['склад']['рис']['количество'] == 50
+
+
+def test_concurrent_purchases_from_two_instances_are_not_lost(tmp_path, monkeypatch):
+    """Покупки одного продукта из двух экземпляров базы (как из двух процессов) складываются"""
+    monkeypatch.setattr(MultivarkaDatabase, 'REVISION_SYNC_SECONDS', 0)
+    path = str(tmp_path / 'shared.db')
+    databases = [MultivarkaDatabase(path), MultivarkaDatabase(path)]
+    databases[0].add_product_to_warehouse('рис', 0, 'г')
+    results = []
+
+    def buy(database):
+        results.extend(database.add_product_to_warehouse('рис', 1, 'г') for _ in range(100))
+
+    threads = [threading.Thread(target=buy, args=(database,)) for database in databases]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(results) and len(results) == 200
+    assert databases[1].load_warehouse()['склад']['рис']['количество'] == 200
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="нужен os.fork")
+def test_forked_process_opens_own_connections(database, monkeypatch):
+    """После fork дочерний процесс пишет через свои соединения, родитель видит изменения"""
+    monkeypatch.setattr(MultivarkaDatabase, 'REVISION_SYNC_SECONDS', 0)
+    assert database.add_product_to_warehouse('рис', 100, 'г')
+    assert database.load_warehouse()['склад']['рис']['количество'] == 100
+
+    pid = os.fork()
+    if pid == 0:
+        # Дочерний процесс: соединения родителя не используются
+        try:
+            os._exit(0 if database.update_product_quantity('рис', 7) else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+    assert database.load_warehouse()['склад']['рис']['количество'] == 7
+
+
+def test_add_recipes_bulk_keeps_good_recipes_next_to_malformed_ones(database):
+    """Рецепт, который не записывается в базу, не откатывает соседей по пачке"""
+    recipes = [
+        ('обед', {'блюдо': 'суп', 'ингредиенты': [{'продукт': 'вода', 'количество': 1, 'единица': 'л'}]}),
+        ('обед', {'блюдо': ['список']}),
+        ('обед', {'блюдо': 'борщ', 'инструкции': ['сварить']}),
+        ('ужин', ['не объект']),
+        ('ужин', {'блюдо': 'рагу', 'ингредиенты': [{'продукт': 'морковь', 'количество': {'г': 1},
+                                                      'единица': 'г'}]}),
+        ('ужин', {'блюдо': 'плов', 'ингредиенты': [{'продукт': 'рис', 'количество': 200, 'единица': 'г'}]}),
+        ('ужин', {'блюдо': 'каша', 'готово': ['да']}),
+    ]
+    result = database.add_recipes_bulk(iter(recipes), chunk_size=500)
+
+    assert result['imported'] == 3
+    assert result['error_count'] == 4
+    assert [position for position, _ in result['errors']] == [1, 3, 4, 6]
+    assert database.count_recipes() == 3
+    assert sorted(meal['блюдо'] for meal in database.get_recipes_by_meal_type('обед')) == ['борщ', 'суп']
+    assert database.get_recipes_by_meal_type('ужин')[0]['ингредиенты'][0]['продукт'] == 'рис'
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Тесты потокового экспорта и импорта рецептов
+"""
+
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+from recipe_stream import ExportArrayReader, ImportFormatError, iter_ndjson, iter_ndjson_records
+
+RECIPES = [
+    {"название": "суп", "тип_приема": "обед", "ингредиенты": [{"продукт": "вода", "количество": 1.5, "единица": "л"}]},
+    {"название": "каша", "тип_приема": "завтрак", "инструкции": ["сварить", "подать"]},
+]
+
+
+def test_ndjson_roundtrip():
+    """Экспорт в NDJSON читается обратно без заголовка"""
+    data = b"".join(iter_ndjson({"version": "1.0"}, RECIPES))
+    assert data.decode('utf-8').count("\n") == 3
+    assert list(iter_ndjson_records(io.BytesIO(data), chunk_size=7)) == RECIPES
+
+
+def test_ndjson_reports_broken_lines_and_continues():
+    """Некорректная строка становится ошибкой, следующие строки читаются"""
+    data = "{\"название\": \"суп\"}\n{сломано\n\n{\"название\": \"каша\"}".encode('utf-8')
+    records = list(iter_ndjson_records(io.BytesIO(data)))
+    assert records[0] == {"название": "суп"}
+    assert isinstance(records[1], ImportFormatError)
+    assert records[2] == {"название": "каша"}
+
+
+@pytest.mark.parametrize('chunk_size', [3, 64 * 1024])
+def test_ndjson_skips_lines_over_size_limit(chunk_size):
+    """Слишком длинная строка становится ошибкой и не накапливается в памяти"""
+    data = ('{"название": "суп"}\n{"название": "' + 'х' * 100 + '"}\n{"название": "каша"}').encode('utf-8')
+    records = list(iter_ndjson_records(io.BytesIO(data), chunk_size=chunk_size, max_line_size=64))
+    assert records[0] == {"название": "суп"}
+    assert isinstance(records[1], ImportFormatError)
+    assert records[2] == {"название": "каша"}
+    assert len(records) == 3
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 64 * 1024])
+def test_export_array_reader_parses_elements_incrementally(chunk_size):
+    """Массив recipes разбирается по элементам при любом размере блока"""
+    document = {"export_info": {"total_recipes": 2, "version": "1.0"}, "recipes": RECIPES + [12345]}
+    stream = io.BytesIO(json.dumps(document, ensure_ascii=False, indent=2).encode('utf-8'))
+    assert list(ExportArrayReader(stream, chunk_size=chunk_size).open()) == RECIPES + [12345]
+
+
+def test_export_array_reader_rejects_bad_documents():
+    """Ошибки структуры сообщаются как ImportFormatError"""
+    with pytest.raises(ImportFormatError):
+        ExportArrayReader(io.BytesIO(b'{"export_info": {}}')).open()
+    with pytest.raises(ImportFormatError):
+        ExportArrayReader(io.BytesIO(b'{"recipes": {}}')).open()
+    with pytest.raises(ImportFormatError):
+        list(ExportArrayReader(io.BytesIO(b'{"recipes": [{"a": 1}, {"b"')).open())
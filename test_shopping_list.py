@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Тесты расчета списка покупок
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+from shopping_list import build_shopping_list
+
+
+def meal(name, *ingredients, skip=False):
+    """Блюдо с ингредиентами вида (продукт, количество, единица[, тип])"""
+    meal_data = {'блюдо': name, 'ингредиенты': []}
+    for product, amount, unit, *ingredient_type in ingredients:
+        ingredient = {'продукт': product, 'количество': amount, 'единица': unit}
+        if ingredient_type:
+            ingredient['тип'] = ingredient_type[0]
+        meal_data['ингредиенты'].append(ingredient)
+    if skip:
+        meal_data['skip_cooking'] = True
+    return meal_data
+
+
+def test_demand_is_summed_across_meals_before_subtracting_stock():
+    """Два блюда с одним продуктом сравниваются с запасом вместе"""
+    menu = {'меню': {
+        'завтрак': meal('омлет', ('яйца', 3, 'шт'), ('соль', 1, 'г', 'availability')),
+        'обед': meal('салат', ('яйца', 2, 'шт')),
+        'ужин': meal('рыба', ('рыба', 1, 'шт'), skip=True),
+    }}
+    warehouse = {'склад': {
+        'яйца': {'количество': 4, 'единица': 'шт', 'тип': 'quantity'},
+        'соль': {'количество': 0, 'единица': 'г', 'тип': 'availability'},
+    }}
+
+    assert build_shopping_list([menu], warehouse) == {
+        'яйца': {'нужно': 1, 'единица': 'шт', 'есть': 4, 'всего_требуется': 5, 'тип': 'quantity'},
+        'соль': {'нужно': 1, 'единица': 'г', 'есть': 0, 'тип': 'availability'},
+    }
+
+    # На три дня спрос утраивается, а наличие-продукты нужны один раз
+    three_days = build_shopping_list([menu] * 3, warehouse)
+    assert three_days['яйца']['всего_требуется'] == 15
+    assert three_days['яйца']['нужно'] == 11
+    assert three_days['соль']['нужно'] == 1
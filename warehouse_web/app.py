@@ -1,16 +1,25 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import json
 import os
 import random
 import re
 import time
 import sys
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import threading
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
 
 # Добавляем родительскую папку в путь для импорта database
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from cookable_index import MAX_MISSING
 from database import db
+from meal_sampler import WEIGHTINGS
+from shopping_list import build_shopping_list, update_shopping_list
+from recipe_stream import ExportArrayReader, ImportFormatError, iter_gzip, iter_ndjson, iter_ndjson_records
 
 app = Flask(__name__)
 # Загружаем SECRET_KEY из переменных окружения; для разработки используем безопасный дефолт
@@ -37,29 +46,50 @@ def format_number(value):
 
 # Добавляем функцию для работы с датами в шаблонах
 @app.template_global()
-def get_product_expiration_status(expiration_date_str):
+def get_product_expiration_status(expiration_date_str, product_name=None):
     """Определяет статус продукта на основе срока годности"""
-    if not expiration_date_str:
+    days_until_expiration = db.expiration_cache.days_until(expiration_date_str, product_name)
+    if days_until_expiration is None:
         return None, None
     
-    try:
-        from datetime import datetime, date
-        expiration_date = datetime.strptime(expiration_date_str, '%Y-%m-%d').date()
-        today = date.today()
-        days_until_expiration = (expiration_date - today).days
-        
-        if days_until_expiration < 0:
-            return 'expired', 'Просрочен'
-        elif days_until_expiration == 0:
-            return 'expires_today', 'Сегодня истекает'
-        elif days_until_expiration <= 2:
-            return 'expiring_soon', 'Скоро истекает'
-        elif days_until_expiration <= 7:
-            return 'expiring_week', 'Истекает на неделе'
-        else:
-            return 'fresh', 'Свежий'
-    except ValueError:
-        return None, None
+    if days_until_expiration < 0:
+        return 'expired', 'Просрочен'
+    elif days_until_expiration == 0:
+        return 'expires_today', 'Сегодня истекает'
+    elif days_until_expiration <= 2:
+        return 'expiring_soon', 'Скоро истекает'
+    elif days_until_expiration <= 7:
+        return 'expiring_week', 'Истекает на неделе'
+    else:
+        return 'fresh', 'Свежий'
+
+# Метка запуска процесса: счетчики изменений начинаются заново после перезапуска
+_BOOT_ID = uuid.uuid4().hex[:8]
+
+def conditional_on(*revision_names):
+    """Добавляет к GET-ответу ETag из счетчиков изменений базы.
+    
+    Если клиент прислал совпадающий If-None-Match, отвечает 304 без вызова
+    функции представления, то есть без сборки и сериализации данных.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            revisions = db.get_revisions()
+            etag = _BOOT_ID + '-' + '-'.join(f"{name}.{revisions[name]}" for name in revision_names)
+            
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
 
 def load_sklad():
     """Загружает данные склада из базы данных"""
@@ -95,13 +125,13 @@ def save_sklad(sklad_data):
 
 
 
-def get_mixed_recipe():
+def get_mixed_recipe(weighting=None):
     """Создает смешанный рецепт, выбирая случайные блюда для каждого приема пищи из базы данных"""
-    return db.get_mixed_recipe()
+    return db.get_mixed_recipe(weighting)
 
-def replace_meal_in_recipe(meal_type):
+def replace_meal_in_recipe(meal_type, weighting=None):
     """Заменяет конкретное блюдо в текущем рецепте на случайное из того же типа"""
-    return db.replace_meal_in_current_recipe(meal_type)
+    return db.replace_meal_in_current_recipe(meal_type, weighting)
 
 def optimize_recipe_for_warehouse():
     """Создает оптимизированный рецепт, сохраняя все приемы пищи, но минимизируя покупки на основе текущего склада"""
@@ -109,68 +139,60 @@ def optimize_recipe_for_warehouse():
 
 def analyze_ingredients(recipe, sklad):
     """Анализирует ингредиенты рецепта и сравнивает со складом"""
-    needed_products = {}
+    return build_shopping_list([recipe], sklad)
+
+class LRUCache:
+    """Небольшой потокобезопасный LRU-кэш со счетчиками попаданий и промахов"""
     
-    def process_ingredients(ingredients_list):
-        for ingredient in ingredients_list:
-            product = ingredient['продукт']
-            amount = ingredient['количество']
-            unit = ingredient['единица']
-            ingredient_type = ingredient.get('тип', 'quantity')
-            
-            if product in sklad['склад']:
-                available = sklad['склад'][product]['количество']
-                product_type = sklad['склад'][product].get('тип', 'quantity')
-                
-                # Для продуктов с простым наличием
-                if ingredient_type == 'availability' or product_type == 'availability':
-                    if available == 0:
-                        needed_products[product] = {
-                            'нужно': 1,
-                            'единица': unit,
-                            'есть': 0,
-                            'тип': 'availability'
-                        }
-                else:
-                    # Для обычных продуктов с количеством
-                    needed = amount - available
-                    if needed > 0:
-                        needed_products[product] = {
-                            'нужно': needed,
-                            'единица': unit,
-                            'есть': available,
-                            'всего_требуется': amount,  # Общее количество для рецепта
-                            'тип': 'quantity'
-                        }
-                    # Если продукта достаточно (available >= amount), он не попадает в needed_products
-            else:
-                # Продукта нет на складе
-                if ingredient_type == 'availability':
-                    needed_products[product] = {
-                        'нужно': 1,
-                        'единица': unit,
-                        'есть': 0,
-                        'тип': 'availability'
-                    }
-                else:
-                    needed_products[product] = {
-                        'нужно': amount,
-                        'единица': unit,
-                        'есть': 0,
-                        'всего_требуется': amount,  # Общее количество для рецепта
-                        'тип': 'quantity'
-                    }
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
     
-    # Обрабатываем все приемы пищи
-    for meal_name, meal_data in recipe['меню'].items():
-        # Пропускаем блюда, которые не нужно готовить
-        if meal_data.get('skip_cooking', False):
-            continue
-        if 'ингредиенты' in meal_data:
-            process_ingredients(meal_data['ингредиенты'])
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
     
-    return needed_products
+    def cache_info(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
 
+# Списки покупок по ключу (ревизия текущего меню, ревизия склада, ревизия рецептов):
+# блюда меню хранятся ссылками на рецепты, поэтому правка рецепта меняет меню
+needed_products_cache = LRUCache(maxsize=32)
+
+def current_needed_products():
+    """Список покупок для сохраненного текущего меню с мемоизацией.
+    
+    Ревизии читаются до загрузки меню и склада, поэтому под ключом никогда
+    не оказываются данные старше него. Возвращает None, если меню нет.
+    """
+    revisions = db.get_revisions()
+    key = (revisions['current_recipe'], revisions['warehouse'], revisions['recipes'])
+    needed_products = needed_products_cache.get(key)
+    if needed_products is None:
+        recipe = db.get_current_recipe()
+        if not recipe:
+            return None
+        needed_products = analyze_ingredients(recipe, load_sklad())
+        needed_products_cache.put(key, needed_products)
+    
+    # Отдаем копию, чтобы вызывающий код не испортил кэш
+    return {product: dict(info) for product, info in needed_products.items()}
 
 
 @app.route('/')
@@ -189,7 +211,7 @@ def index():
         return render_template('index.html', sklad=sklad['склад'], recipe=None, needed_products={})
     
     # Анализируем ингредиенты
-    needed_products = analyze_ingredients(recipe, sklad)
+    needed_products = current_needed_products() or {}
     
     # Сортируем продукты холодильника в алфавитном порядке
     sorted_sklad = dict(sorted(sklad['склад'].items(), key=lambda x: x[0].lower()))
@@ -285,12 +307,77 @@ def delete_product(product):
     return redirect(url_for('index'))
 
 @app.route('/api/sklad')
+@conditional_on('warehouse')
 def api_sklad():
     """API endpoint для получения данных склада"""
     sklad = load_sklad()
     return jsonify(sklad)
 
+@app.route('/api/metrics')
+def api_metrics():
+    """API endpoint для получения метрик пула соединений"""
+    return jsonify({
+        'pool': db.pool.stats(),
+        'needed_products_cache': needed_products_cache.cache_info()
+    })
+
+# Интервал служебных сообщений, удерживающих SSE-соединение открытым
+EVENTS_KEEPALIVE_SECONDS = 15
+
+def _sse(event, data):
+    """Форматирует одно сообщение server-sent events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _warehouse_delta(old_sklad, new_sklad):
+    """Разница между двумя состояниями склада: измененные и удаленные продукты"""
+    changed = {name: data for name, data in new_sklad.items() if old_sklad.get(name) != data}
+    removed = [name for name in old_sklad if name not in new_sklad]
+    return {'changed': changed, 'removed': removed}
+
+@app.route('/api/events')
+def api_events():
+    """Лента изменений склада и текущего меню (server-sent events).
+    
+    Клиент получает событие только после записи в базу: для склада — разницу
+    с прошлым состоянием, для меню — новый список покупок. Пока изменений нет,
+    раз в EVENTS_KEEPALIVE_SECONDS отправляется служебный комментарий.
+    """
+    def stream():
+        revisions = db.get_revisions()
+        sklad = load_sklad()['склад']
+        yield "retry: 3000\n\n"
+        yield _sse('revisions', revisions)
+        
+        while True:
+            current = db.wait_for_change(revisions, timeout=EVENTS_KEEPALIVE_SECONDS)
+            if current == revisions:
+                yield ": keepalive\n\n"
+                continue
+            
+            if current['warehouse'] != revisions['warehouse']:
+                new_sklad = load_sklad()['склад']
+                delta = _warehouse_delta(sklad, new_sklad)
+                sklad = new_sklad
+                delta['revision'] = current['warehouse']
+                delta['needed_products'] = current_needed_products()
+                yield _sse('warehouse', delta)
+            # Меню проверяется независимо: одно пробуждение может принести оба изменения
+            if (current['current_recipe'] != revisions['current_recipe']
+                    or current['recipes'] != revisions['recipes']):
+                yield _sse('menu', {
+                    'revision': current['current_recipe'],
+                    'needed_products': current_needed_products()
+                })
+            revisions = current
+    
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/current_recipe')
+@conditional_on('warehouse', 'current_recipe', 'recipes')
 def api_current_recipe():
     """API endpoint для получения текущего рецепта и анализа ингредиентов"""
     try:
@@ -302,7 +389,7 @@ def api_current_recipe():
             return jsonify({'error': 'Не удалось загрузить данные'}), 500
         
         # Анализируем ингредиенты
-        needed_products = analyze_ingredients(recipe, sklad)
+        needed_products = current_needed_products() or {}
         
         # Сортируем продукты холодильника в алфавитном порядке
         sorted_sklad = dict(sorted(sklad['склад'].items(), key=lambda x: x[0].lower()))
@@ -317,6 +404,7 @@ def api_current_recipe():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/needed_products')
+@conditional_on('warehouse', 'current_recipe', 'recipes')
 def api_needed_products():
     """API endpoint для получения обновленного списка необходимых продуктов"""
     try:
@@ -328,16 +416,48 @@ def api_needed_products():
             return jsonify({'error': 'Не удалось загрузить данные'}), 500
         
         # Анализируем ингредиенты
-        needed_products = analyze_ingredients(recipe, sklad)
+        needed_products = current_needed_products() or {}
+        
+        return jsonify({
+            'success': True,
+            'needed_products': needed_products
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Наибольший горизонт планирования для списка покупок
+MAX_SHOPPING_DAYS = 31
+
+@app.route('/api/shopping_list')
+@conditional_on('warehouse', 'current_recipe', 'recipes')
+def api_shopping_list():
+    """API endpoint для списка покупок на текущее меню, повторенное на days дней"""
+    try:
+        days = int(request.args.get('days', 1))
+        if not 1 <= days <= MAX_SHOPPING_DAYS:
+            return jsonify({'error': f'Количество дней должно быть от 1 до {MAX_SHOPPING_DAYS}'}), 400
+        
+        recipe = db.get_current_recipe()
+        if not recipe:
+            return jsonify({'error': 'Текущее меню не выбрано'}), 404
+        
+        if days == 1:
+            needed_products = current_needed_products() or {}
+        else:
+            needed_products = build_shopping_list([recipe] * days, load_sklad())
         
         return jsonify({
             'success': True,
+            'days': days,
             'needed_products': needed_products
         })
+    except ValueError:
+        return jsonify({'error': 'Некорректное количество дней'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/products')
+@conditional_on('warehouse')
 def api_products():
     """API endpoint для получения списка продуктов со склада для автодополнения"""
     sklad = load_sklad()
@@ -362,18 +482,22 @@ def api_update_product(product):
         if quantity < 0:
             return jsonify({'error': 'Количество не может быть отрицательным'}), 400
 
-        # Если количество устанавливается в 0, всегда очищаем срок годности
-        if quantity == 0:
-            final_expiration_date = None
-        else:
-            final_expiration_date = expiration_date
-
-        if db.update_product_quantity(product, quantity):
-            # Обновляем срок годности (включая null для очистки)
-            db.update_product_expiration(product, final_expiration_date)
+        # Количество и срок годности (включая null для очистки) пишутся одной
+        # транзакцией; при нулевом количестве срок очищается в базе
+        result = db.update_products_bulk([{
+            'продукт': product,
+            'количество': quantity,
+            'срок_годности': expiration_date or None
+        }])
+        if result is None:
+            return jsonify({'error': 'Ошибка обновления склада'}), 500
+        item = result['results'][0]
+        if item['success']:
             return jsonify({'success': True, 'message': f'Количество {product} обновлено'})
-        else:
+        elif item['error'] == 'продукт не найден':
             return jsonify({'error': 'Продукт не найден'}), 404
+        else:
+            return jsonify({'error': 'Некорректные данные'}), 400
 
     except (ValueError, KeyError):
         return jsonify({'error': 'Некорректные данные'}), 400
@@ -381,6 +505,38 @@ def api_update_product(product):
         return jsonify({'error': str(e)}), 500
 
 
+# Максимальное число изменений в одном пакетном запросе
+MAX_BULK_CHANGES = 1000
+
+
+@app.route('/api/update_bulk', methods=['POST'])
+def api_update_bulk():
+    """Пакетное обновление склада одной транзакцией.
+
+    Тело: {"изменения": [{"продукт", "количество" | "покупка", "срок_годности",
+    "единица", "тип"}, ...]}. Ошибочные позиции не мешают остальным и
+    возвращаются в results со своим текстом ошибки.
+    """
+    try:
+        data = request.get_json() or {}
+        changes = data.get('изменения')
+        if not isinstance(changes, list) or not changes:
+            return jsonify({'error': 'Нужен непустой список изменений'}), 400
+        if len(changes) > MAX_BULK_CHANGES:
+            return jsonify({'error': f'Не больше {MAX_BULK_CHANGES} изменений за запрос'}), 400
+
+        result = db.update_products_bulk(changes)
+        if result is None:
+            return jsonify({'error': 'Ошибка обновления склада'}), 500
+        return jsonify({
+            'success': result['applied'] > 0,
+            'applied': result['applied'],
+            'results': result['results'],
+            'revision': result['revision']
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 
 @app.route('/api/add_single_meal', methods=['POST'])
 def api_add_single_meal():
@@ -544,8 +700,7 @@ def api_toggle_skip_cooking():
         new_status = updated_recipe['меню'][meal_type].get('skip_cooking', False)
         
         # Пересчитываем список покупок для обновленного рецепта
-        sklad = load_sklad()
-        needed_products = analyze_ingredients(updated_recipe, sklad)
+        needed_products = current_needed_products() or {}
         
         # Формируем сообщение
         status_text = "не готовить" if new_status else "готовить"
@@ -564,13 +719,21 @@ def api_toggle_skip_cooking():
 
 @app.route('/api/refresh_recipe', methods=['POST'])
 def api_refresh_recipe():
-    """API endpoint для обновления рецепта на случайный новый"""
+    """API endpoint для обновления рецепта на случайный новый.
+    
+    Необязательный weighting ('recency' или 'stock') меняет вероятности выбора блюд.
+    """
     try:
+        data = request.get_json(silent=True) or {}
+        weighting = data.get('weighting')
+        if weighting is not None and weighting not in WEIGHTINGS:
+            return jsonify({'error': 'Некорректный способ выбора блюд'}), 400
+        
         # Очищаем текущий рецепт для создания нового
         db.clear_current_recipe()
         
         # Создаем новый смешанный рецепт
-        new_recipe = get_mixed_recipe()
+        new_recipe = get_mixed_recipe(weighting)
         if not new_recipe:
             return jsonify({'error': 'Не удалось загрузить новый рецепт'}), 500
         
@@ -603,8 +766,7 @@ def api_optimize_recipe():
         db.save_current_recipe(optimized_recipe)
         
         # Анализируем ингредиенты для подсчета экономии
-        sklad = load_sklad()
-        needed_products = analyze_ingredients(optimized_recipe, sklad)
+        needed_products = current_needed_products() or {}
         
         # Подсчитываем общую стоимость покупок
         total_cost = sum(info['нужно'] for info in needed_products.values())
@@ -633,18 +795,57 @@ def api_optimize_recipe():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Ограничения планировщика меню на несколько дней
+MAX_PLAN_DAYS = 14
+MAX_PLAN_BEAM_WIDTH = 32
+MAX_PLAN_TIME_BUDGET_MS = 10000
+
+@app.route('/api/plan_menu', methods=['POST'])
+def api_plan_menu():
+    """API endpoint для плана меню на несколько дней с общим складом"""
+    try:
+        data = request.get_json(silent=True) or {}
+        days = int(data.get('days', 7))
+        beam_width = int(data.get('beam_width', 8))
+        time_budget_ms = int(data.get('time_budget_ms', 2000))
+        if not 1 <= days <= MAX_PLAN_DAYS:
+            return jsonify({'error': f'Количество дней должно быть от 1 до {MAX_PLAN_DAYS}'}), 400
+        if not 1 <= beam_width <= MAX_PLAN_BEAM_WIDTH:
+            return jsonify({'error': f'Ширина поиска должна быть от 1 до {MAX_PLAN_BEAM_WIDTH}'}), 400
+        time_budget_ms = max(0, min(time_budget_ms, MAX_PLAN_TIME_BUDGET_MS))
+
+        plan = db.plan_menu(days, beam_width=beam_width, time_budget=time_budget_ms / 1000)
+        if not plan:
+            return jsonify({'error': 'Не удалось составить план меню'}), 500
+
+        return jsonify({
+            'success': True,
+            'days': plan['days'],
+            'score': plan['score'],
+            'waste': plan['waste'],
+            'complete': plan['complete'],
+            'needed_products': build_shopping_list(plan['days'], load_sklad())
+        })
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Некорректные параметры плана'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/replace_meal', methods=['POST'])
 def api_replace_meal():
     """API endpoint для замены конкретного блюда на случайное из того же типа"""
     try:
         data = request.get_json()
         meal_type = data.get('meal_type')
+        weighting = data.get('weighting')
         
         if not meal_type:
             return jsonify({'error': 'Не указан тип приема пищи'}), 400
+        if weighting is not None and weighting not in WEIGHTINGS:
+            return jsonify({'error': 'Некорректный способ выбора блюд'}), 400
         
         # Заменяем блюдо в текущем рецепте
-        updated_recipe = replace_meal_in_recipe(meal_type)
+        updated_recipe = replace_meal_in_recipe(meal_type, weighting)
         if not updated_recipe:
             return jsonify({'error': f'Не удалось заменить блюдо для {meal_type}'}), 500
         
@@ -657,8 +858,7 @@ def api_replace_meal():
             new_meal_data = {}
         
         # Пересчитываем список покупок для обновленного рецепта
-        sklad = load_sklad()
-        needed_products = analyze_ingredients(updated_recipe, sklad)
+        needed_products = current_needed_products() or {}
         
         return jsonify({
             'success': True, 
@@ -672,49 +872,145 @@ def api_replace_meal():
 
 @app.route('/api/cook_meal', methods=['POST'])
 def api_cook_meal():
-    """API endpoint для удаления продуктов после приготовления"""
+    """API endpoint для удаления продуктов после приготовления.
+    
+    Принимает meal_name (одно блюдо), meal_names (список) или whole_day=true
+    (все блюда меню, кроме остановленных); все продукты списываются одной
+    транзакцией, в ответе — изменившиеся продукты склада.
+    """
     try:
         data = request.get_json()
-        meal_name = data.get('meal_name')
+        
+        # Ревизии до чтения меню и списка покупок: по ним проверим, что до списания
+        # никто не менял склад и меню, и список можно обновить по изменениям склада
+        revisions = db.get_revisions()
         
         # Загружаем текущий смешанный рецепт
         recipe = get_mixed_recipe()
         if not recipe:
             return jsonify({'error': 'Не удалось загрузить рецепт'}), 500
         
-        # Находим ингредиенты для указанного приема пищи
-        if meal_name in recipe['меню']:
-            meal_data = recipe['меню'][meal_name]
-            
-            if db.consume_ingredients_for_meal(meal_name, meal_data):
-                return jsonify({'success': True, 'message': f'Блюдо "{meal_name}" приготовлено! Продукты удалены со склада'})
-            else:
-                return jsonify({'error': 'Ошибка при обновлении склада'}), 500
+        if data.get('whole_day'):
+            meal_names = [meal_name for meal_name, meal_data in recipe['меню'].items()
+                          if not meal_data.get('skip_cooking', False)]
+        elif 'meal_names' in data:
+            meal_names = data.get('meal_names')
+            if not isinstance(meal_names, list) or not all(isinstance(name, str) for name in meal_names):
+                return jsonify({'error': 'meal_names должен быть списком названий приемов пищи'}), 400
+            # Повтор приема пищи не должен списывать продукты дважды
+            meal_names = list(dict.fromkeys(meal_names))
         else:
+            meal_names = [data.get('meal_name')]
+            if not isinstance(meal_names[0], str):
+                return jsonify({'error': 'meal_name должен быть строкой'}), 400
+        
+        # Находим ингредиенты для указанных приемов пищи
+        missing = [meal_name for meal_name in meal_names if meal_name not in recipe['меню']]
+        if missing or not meal_names:
             return jsonify({'error': 'Блюдо не найдено в рецепте'}), 404
+        
+        needed_before = current_needed_products() or {}
+        delta = db.consume_meals([(meal_name, recipe['меню'][meal_name]) for meal_name in meal_names])
+        if delta is None:
+            return jsonify({'error': 'Ошибка при обновлении склада'}), 500
+        
+        current = db.get_revisions()
+        if (delta['revision'] == revisions['warehouse'] + 1
+                and current['current_recipe'] == revisions['current_recipe']
+                and current['recipes'] == revisions['recipes']):
+            # Между чтением и списанием ничего не менялось — пересчитываем только затронутые продукты
+            needed_products = update_shopping_list([recipe], needed_before, delta['changed'], delta['removed'])
+            needed_products_cache.put((revisions['current_recipe'], delta['revision'], revisions['recipes']),
+                                      needed_products)
+            needed_products = {product: dict(info) for product, info in needed_products.items()}
+        else:
+            needed_products = current_needed_products() or {}
+        
+        if len(meal_names) == 1:
+            message = f'Блюдо "{meal_names[0]}" приготовлено! Продукты удалены со склада'
+        else:
+            message = f'Приготовлено блюд: {len(meal_names)}. Продукты удалены со склада'
+        return jsonify({
+            'success': True,
+            'message': message,
+            'cooked': meal_names,
+            'warehouse': delta,
+            'needed_products': needed_products
+        })
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # === API ENDPOINTS ДЛЯ УПРАВЛЕНИЯ РЕЦЕПТАМИ ===
 
+@app.route('/api/cookable')
+@conditional_on('warehouse', 'recipes')
+def api_cookable_recipes():
+    """API endpoint для рецептов, которые можно приготовить из имеющихся продуктов"""
+    try:
+        max_missing = int(request.args.get('max_missing', 1))
+        meal_type = request.args.get('meal_type', '').strip()
+        if not 0 <= max_missing <= MAX_MISSING:
+            return jsonify({'error': f'max_missing должен быть от 0 до {MAX_MISSING}'}), 400
+
+        recipes = db.get_cookable_recipes(max_missing, meal_type if meal_type else None)
+        return jsonify({
+            'success': True,
+            'cookable': [recipe for recipe in recipes if not recipe['не_хватает']],
+            'nearly_cookable': [recipe for recipe in recipes if recipe['не_хватает']]
+        })
+    except ValueError:
+        return jsonify({'error': 'Некорректное значение max_missing'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Наибольший размер страницы результатов поиска
+MAX_SEARCH_LIMIT = 100
+# Размер страницы списка рецептов по умолчанию и наибольший
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 @app.route('/api/recipes')
+@conditional_on('recipes')
 def api_get_all_recipes():
     """API endpoint для получения списка всех рецептов"""
     try:
         query = request.args.get('query', '').strip()
         meal_type = request.args.get('meal_type', '').strip()
+        limit = request.args.get('limit')
+        page_cursor = request.args.get('cursor')
         
-        if query or meal_type:
+        if not query and (limit is not None or page_cursor):
+            # Постраничный список по ключу (created_at, id)
+            limit = min(max(int(limit or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+            page = db.get_recipes_page(limit, page_cursor, meal_type or None)
+            return jsonify({
+                'success': True,
+                'recipes': page['recipes'],
+                'next_cursor': page['next_cursor'],
+                'total': db.count_recipes(meal_type or None),
+                'counts': db.count_recipes_by_meal_type()
+            })
+        elif query and limit is not None:
+            # Постраничный поиск: total — общее число найденных рецептов
+            limit = min(max(int(limit), 1), MAX_SEARCH_LIMIT)
+            offset = max(int(request.args.get('offset', 0)), 0)
+            recipes = db.search_recipes(query, meal_type or None, limit, offset)
+            total = db.count_search_results(query, meal_type or None)
+        elif query or meal_type:
             recipes = db.search_recipes(query if query else None, meal_type if meal_type else None)
+            total = len(recipes)
         else:
             recipes = db.get_all_recipes_with_info()
+            total = len(recipes)
         
         return jsonify({
             'success': True,
             'recipes': recipes,
-            'total': len(recipes)
+            'total': total
         })
+    except ValueError:
+        return jsonify({'error': 'Некорректные параметры пагинации'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -782,26 +1078,40 @@ def api_delete_recipe(recipe_id):
 
 @app.route('/api/recipes/export')
 def api_export_recipes():
-    """API endpoint для экспорта всех рецептов в JSON"""
+    """API endpoint для экспорта всех рецептов в JSON.
+    
+    С параметром format=ndjson рецепты отдаются потоком по одному на строку
+    (gzip=1 дополнительно сжимает поток), без сборки всего экспорта в памяти.
+    """
     try:
-        recipes = db.get_all_recipes_with_info()
+        export_info = {
+            "export_date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "total_recipes": db.count_recipes(),
+            "version": "1.0"
+        }
+        
+        if request.args.get('format') == 'ndjson':
+            chunks = iter_ndjson(dict(export_info, format="ndjson"), db.iter_recipes_for_export())
+            filename = 'recipes.ndjson'
+            mimetype = 'application/x-ndjson'
+            if request.args.get('gzip') in ('1', 'true'):
+                chunks = iter_gzip(chunks)
+                filename += '.gz'
+                mimetype = 'application/gzip'
+            return Response(
+                stream_with_context(chunks),
+                mimetype=mimetype,
+                headers={'Content-Disposition': f'attachment; filename={filename}'}
+            )
         
         # Формируем данные для экспорта
+        recipes = list(db.iter_recipes_for_export())
+        export_info["total_recipes"] = len(recipes)
         export_data = {
-            "export_info": {
-                "export_date": time.strftime("%Y-%m-%d %H:%M:%S"),
-                "total_recipes": len(recipes),
-                "version": "1.0"
-            },
-            "recipes": []
+            "export_info": export_info,
+            "recipes": recipes
         }
         
-        # Добавляем полную информацию о каждом рецепте
-        for recipe_info in recipes:
-            full_recipe = db.get_recipe_by_id(recipe_info['id'])
-            if full_recipe:
-                export_data["recipes"].append(full_recipe)
-        
         return jsonify({
             'success': True,
             'data': export_data
@@ -810,71 +1120,81 @@ def api_export_recipes():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _export_recipe_to_meal(recipe_data):
+    """Переводит рецепт из формата экспорта в пару (тип приема пищи, данные блюда)"""
+    if isinstance(recipe_data, Exception):
+        return None, recipe_data
+    if not isinstance(recipe_data, dict):
+        return None, {}
+    
+    meal_data = {
+        'блюдо': recipe_data.get('название'),
+        'готово': recipe_data.get('готово', False)
+    }
+    
+    # Добавляем ингредиенты и инструкции если есть
+    if recipe_data.get('ингредиенты'):
+        meal_data['ингредиенты'] = recipe_data['ингредиенты']
+    if recipe_data.get('инструкции'):
+        meal_data['инструкции'] = recipe_data['инструкции']
+    
+    return recipe_data.get('тип_приема'), meal_data
+
+def _stop_on_format_error(records, format_errors):
+    """Завершает поток рецептов при ошибке структуры, запоминая её"""
+    try:
+        yield from records
+    except ImportFormatError as e:
+        format_errors.append(str(e))
+
+# Сколько описаний ошибок импорта возвращать клиенту
+MAX_IMPORT_ERRORS = 100
+
 @app.route('/api/recipes/import', methods=['POST'])
 def api_import_recipes():
-    """API endpoint для импорта рецептов из JSON"""
+    """API endpoint для импорта рецептов.
+    
+    Принимает формат экспорта {"export_info": ..., "recipes": [...]} или NDJSON
+    (Content-Type application/x-ndjson либо ?format=ndjson). Тело запроса
+    читается потоком и сохраняется пачками, не собираясь целиком в памяти.
+    """
     try:
-        # Проверяем, что данные переданы
-        if not request.json:
-            return jsonify({'error': 'Не переданы данные для импорта'}), 400
-        
-        import_data = request.json
-        
-        # Валидация структуры данных
-        if 'recipes' not in import_data:
-            return jsonify({'error': 'Неверный формат данных: отсутствует секция "recipes"'}), 400
-        
-        recipes_to_import = import_data['recipes']
-        if not isinstance(recipes_to_import, list):
-            return jsonify({'error': 'Неверный формат данных: "recipes" должен быть массивом'}), 400
+        is_ndjson = (request.mimetype == 'application/x-ndjson'
+                     or request.args.get('format') == 'ndjson')
         
-        imported_count = 0
-        errors = []
-        
-        for i, recipe_data in enumerate(recipes_to_import):
+        if is_ndjson:
+            records = iter_ndjson_records(request.stream)
+        else:
             try:
-                # Валидация обязательных полей
-                if not recipe_data.get('название'):
-                    errors.append(f"Рецепт #{i+1}: отсутствует название")
-                    continue
-                
-                if not recipe_data.get('тип_приема'):
-                    errors.append(f"Рецепт #{i+1}: отсутствует тип приема пищи")
-                    continue
-                
-                # Формируем данные для добавления
-                meal_data = {
-                    'блюдо': recipe_data['название'],
-                    'готово': recipe_data.get('готово', False)
-                }
-                
-                # Добавляем ингредиенты если есть
-                if 'ингредиенты' in recipe_data and recipe_data['ингредиенты']:
-                    meal_data['ингредиенты'] = recipe_data['ингредиенты']
-                
-                # Добавляем инструкции если есть
-                if 'инструкции' in recipe_data and recipe_data['инструкции']:
-                    meal_data['инструкции'] = recipe_data['инструкции']
-                
-                # Сохраняем рецепт
-                if db.add_single_recipe(recipe_data['тип_приема'], meal_data):
-                    imported_count += 1
-                else:
-                    errors.append(f"Рецепт #{i+1} '{recipe_data['название']}': ошибка сохранения")
-                    
-            except Exception as e:
-                errors.append(f"Рецепт #{i+1}: {str(e)}")
+                records = ExportArrayReader(request.stream).open()
+            except ImportFormatError as e:
+                return jsonify({'error': str(e)}), 400
+        
+        format_errors = []
+        result = db.add_recipes_bulk(
+            (_export_recipe_to_meal(recipe_data)
+             for recipe_data in _stop_on_format_error(records, format_errors)),
+            max_errors=MAX_IMPORT_ERRORS
+        )
+        imported_count = result['imported']
+        errors = [f"Рецепт #{position + 1}: {error}" for position, error in sorted(result['errors'])]
+        errors.extend(format_errors)
+        error_count = result['error_count'] + len(format_errors)
         
         # Формируем ответ
         message = f"Импорт завершен. Добавлено рецептов: {imported_count}"
-        if errors:
-            message += f". Ошибок: {len(errors)}"
+        if format_errors:
+            message = f"Импорт прерван: {format_errors[0]}. Добавлено рецептов: {imported_count}"
+        if error_count:
+            message += f". Ошибок: {error_count}"
         
         response_data = {
             'success': True,
             'message': message,
             'imported_count': imported_count,
-            'total_count': len(recipes_to_import),
+            'total_count': result['total'],
+            'error_count': error_count,
+            'batches': result['chunks'],
             'errors': errors
         }
         
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ASGI-точка входа веб-сервера управления складом.
+
+Flask-приложение остается WSGI-приложением. Вызов приложения выполняется
+в ограниченном пуле потоков, поэтому блокирующие обращения к SQLite
+из database.py не останавливают цикл событий, а одновременно с базой
+работает не больше REQUEST_THREADS запросов (по числу соединений в пуле
+базы). Обычные ответы с Content-Length дочитываются в том же потоке,
+а тела потоковых ответов (лента /api/events в открытых вкладках, экспорт)
+читаются по частям в отдельном пуле и не занимают потоки обычных запросов.
+
+Запуск (нужен uvicorn: pip install -r requirements-asgi.txt):
+    python run.py --asgi
+или
+    uvicorn asgi:application --host 0.0.0.0 --port 8080
+"""
+
+import asyncio
+import contextvars
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+
+# Потоков для обработки запросов (по умолчанию — размер пула соединений базы)
+REQUEST_THREADS = int(os.environ.get('WAREHOUSE_REQUEST_THREADS', 8))
+# Потоков для чтения тел ответов; столько лент событий обслуживаются без очереди
+STREAM_THREADS = int(os.environ.get('WAREHOUSE_STREAM_THREADS', 32))
+# Тело запроса больше этого размера сохраняется во временный файл, а не в память
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+class WsgiToAsgi:
+    """Адаптер WSGI-приложения к ASGI с ограниченными пулами потоков"""
+
+    def __init__(self, wsgi_app, request_threads: int = REQUEST_THREADS,
+                 stream_threads: int = STREAM_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=request_threads, thread_name_prefix='request')
+        self.stream_executor = ThreadPoolExecutor(max_workers=stream_threads, thread_name_prefix='stream')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        else:
+            raise RuntimeError(f"Неподдерживаемый тип соединения: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                self.stream_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        try:
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                more_body = message.get('more_body', False)
+            body.seek(0)
+            await self._respond(scope, body, receive, send)
+        finally:
+            body.close()
+
+    async def _respond(self, scope, body, receive, send):
+        loop = asyncio.get_running_loop()
+        environ = self._environ(scope, body)
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+            return response.setdefault('written', []).append
+
+        def start():
+            iterable = self.wsgi_app(environ, start_response)
+            iterator = iter(iterable)
+            # start_response может быть вызвана только при первой итерации
+            chunk = next(iterator, None)
+            if b'content-length' not in dict(response['headers']):
+                return iterable, iterator, [chunk], False
+            # Тело известной длины (обычный ответ Flask) дочитываем в этом же потоке,
+            # чтобы пул потоковых ответов оставался только для настоящих потоков
+            try:
+                return iterable, iterator, ([chunk] if chunk is not None else []) + list(iterator), True
+            finally:
+                close = getattr(iterable, 'close', None)
+                if close is not None:
+                    close()
+
+        # Контекст запроса (contextvars Flask) переходит вместе с ответом между потоками пулов
+        context = contextvars.copy_context()
+        try:
+            iterable, iterator, chunks, finished = await loop.run_in_executor(self.executor, context.run, start)
+        except Exception as e:
+            print(f"Ошибка обработки запроса {scope['path']}: {e}")
+            await send({'type': 'http.response.start', 'status': 500,
+                        'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+            await send({'type': 'http.response.body', 'body': 'Внутренняя ошибка сервера'.encode('utf-8')})
+            return
+
+        await send({'type': 'http.response.start', 'status': response['status'],
+                    'headers': response['headers']})
+        # Данные, переданные через write() из start_response, идут перед телом
+        for data in response.get('written', []):
+            await send({'type': 'http.response.body', 'body': data, 'more_body': True})
+        if finished:
+            await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+            return
+        await self._stream(scope, iterable, iterator, chunks[0], context, receive, send)
+
+    async def _stream(self, scope, iterable, iterator, chunk, context, receive, send):
+        """Отдает потоковый ответ, читая его по частям в пуле stream_executor"""
+        loop = asyncio.get_running_loop()
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            while chunk is not None and not disconnected.is_set():
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.stream_executor, context.run, next, iterator, None)
+            if not disconnected.is_set():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            watcher.cancel()
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                try:
+                    await loop.run_in_executor(self.stream_executor, context.run, close)
+                except Exception as e:
+                    print(f"Ошибка закрытия ответа {scope['path']}: {e}")
+
+    @staticmethod
+    def _environ(scope, body) -> dict:
+        """Окружение WSGI (PEP 3333) из ASGI-описания запроса"""
+        server = scope.get('server') or ('localhost', 80)
+        root_path = scope.get('root_path', '')
+        path = scope['path']
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+            'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        client = scope.get('client')
+        if client:
+            environ['REMOTE_ADDR'] = client[0]
+            environ['REMOTE_PORT'] = str(client[1])
+
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1')
+            value = value.decode('latin-1')
+            if name == 'content-type':
+                key = 'CONTENT_TYPE'
+            elif name == 'content-length':
+                key = 'CONTENT_LENGTH'
+            else:
+                key = 'HTTP_' + name.upper().replace('-', '_')
+            if key in environ:
+                separator = '; ' if key == 'HTTP_COOKIE' else ','
+                environ[key] += separator + value
+            else:
+                environ[key] = value
+        return environ
+
+
+application = WsgiToAsgi(app)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Нагрузочный тест основных страниц и API веб-сервера склада.
+
+Несколько клиентов параллельно запрашивают каждый адрес в течение заданного
+времени. Для каждого адреса печатаются число запросов в секунду (RPS)
+и задержки p50/p99.
+
+Цели:
+    --url http://localhost:8080   запущенный сервер (python run.py, run.py --asgi, ...)
+    --inprocess asgi              ASGI-приложение из asgi.py без сети, на временной базе
+    --inprocess wsgi              Flask-приложение по одному запросу за раз, как
+                                  однопоточный сервер разработки (для сравнения)
+
+Пример запуска:
+    python loadtest.py --inprocess asgi --concurrency 1 8 32 --duration 5
+"""
+
+import argparse
+import asyncio
+import http.client
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Адреса, которые открывает главная страница и её автообновление
+ENDPOINTS = [
+    '/',
+    '/api/sklad',
+    '/api/current_recipe',
+    '/api/needed_products',
+    '/api/recipes?limit=50',
+    '/api/cookable?max_missing=1',
+]
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    """Перцентиль по отсортированному списку задержек"""
+    if not latencies:
+        return 0.0
+    return latencies[min(len(latencies) - 1, int(round(fraction * (len(latencies) - 1))))]
+
+
+def report(path: str, concurrency: int, latencies: List[float], errors: int, duration: float):
+    latencies.sort()
+    print(f"{path:<28} {concurrency:>8} {len(latencies) / duration:>9.1f} "
+          f"{percentile(latencies, 0.5) * 1000:>9.1f} {percentile(latencies, 0.99) * 1000:>9.1f} {errors:>7}")
+
+
+def run_http(base_url: str, path: str, concurrency: int, duration: float) -> Tuple[List[float], int]:
+    """Нагрузка по HTTP: concurrency потоков с постоянными соединениями"""
+    parts = urlsplit(base_url)
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        own = []
+        failed = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.request('GET', parts.path.rstrip('/') + path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed += 1
+                else:
+                    own.append(time.perf_counter() - started)
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        conn.close()
+        with lock:
+            latencies.extend(own)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+async def _asgi_request(application, path: str) -> int:
+    """Один GET-запрос к ASGI-приложению; возвращает код ответа"""
+    route, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': route, 'raw_path': route.encode('utf-8'), 'root_path': '',
+        'query_string': query.encode('latin-1'), 'headers': [(b'host', b'localhost')],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+    request_sent = False
+    finished = asyncio.Event()
+    status = [0]
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status[0] = message['status']
+        elif not message.get('more_body', False):
+            finished.set()
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def run_asgi(application, path: str, concurrency: int, duration: float) -> Tuple[List[float], int]:
+    """Нагрузка на ASGI-приложение в одном цикле событий: concurrency сопрограмм-клиентов"""
+    latencies: List[float] = []
+    errors = [0]
+
+    async def client(deadline):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            if await _asgi_request(application, path) >= 400:
+                errors[0] += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    async def main():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(client(deadline) for _ in range(concurrency)))
+
+    asyncio.run(main())
+    return latencies, errors[0]
+
+
+def run_serial_wsgi(flask_app, path: str, concurrency: int, duration: float) -> Tuple[List[float], int]:
+    """Нагрузка на Flask-приложение, которое обрабатывает запросы строго по одному"""
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        test_client = flask_app.test_client()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            with lock:
+                status = test_client.get(path).status_code
+            if status >= 400:
+                errors[0] += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def prepare_inprocess(tmp_dir: str, recipes: int):
+    """Подменяет базу приложения временной, заполненной синтетическим каталогом и складом"""
+    import app as app_module
+    from benchmark import PRODUCTS, populate_catalogue
+    from database import MultivarkaDatabase
+
+    database = MultivarkaDatabase(os.path.join(tmp_dir, 'loadtest.db'))
+    populate_catalogue(database, recipes)
+    database.update_products_bulk([
+        {'продукт': product, 'покупка': 100 + i, 'единица': 'г'}
+        for i, product in enumerate(PRODUCTS[::2])
+    ])
+    app_module.db = database
+    database.get_mixed_recipe()
+    return app_module
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест веб-сервера склада")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help="адрес запущенного сервера, например http://localhost:8080")
+    target.add_argument('--inprocess', choices=['asgi', 'wsgi'], help="приложение в этом процессе")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32],
+                        help="числа одновременных клиентов")
+    parser.add_argument('--duration', type=float, default=5.0, help="секунд на адрес и уровень нагрузки")
+    parser.add_argument('--recipes', type=int, default=2000, help="размер каталога для --inprocess")
+    parser.add_argument('--paths', nargs='+', default=ENDPOINTS, help="адреса для проверки")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        runner: Callable[[str, int, float], Tuple[List[float], int]]
+        if args.url:
+            runner = lambda path, concurrency, duration: run_http(args.url, path, concurrency, duration)
+            print(f"=== HTTP: {args.url} ===")
+        else:
+            app_module = prepare_inprocess(tmp_dir, args.recipes)
+            if args.inprocess == 'asgi':
+                from asgi import application
+                runner = lambda path, concurrency, duration: run_asgi(application, path, concurrency, duration)
+                print(f"=== ASGI в процессе, {args.recipes} рецептов ===")
+            else:
+                runner = lambda path, concurrency, duration: run_serial_wsgi(app_module.app, path,
+                                                                             concurrency, duration)
+                print(f"=== WSGI по одному запросу, {args.recipes} рецептов ===")
+
+        print(f"{'адрес':<28} {'клиентов':>8} {'RPS':>9} {'p50, мс':>9} {'p99, мс':>9} {'ошибок':>7}")
+        totals: Dict[int, List[float]] = {}
+        for concurrency in args.concurrency:
+            for path in args.paths:
+                latencies, errors = runner(path, concurrency, args.duration)
+                totals.setdefault(concurrency, []).extend(latencies)
+                report(path, concurrency, latencies, errors, args.duration)
+        for concurrency, latencies in totals.items():
+            report('все адреса', concurrency, latencies, 0, args.duration * len(args.paths))
+
+
+if __name__ == '__main__':
+    main()
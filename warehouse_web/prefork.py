@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Многопроцессный запуск веб-сервера склада (pre-fork).
+
+Главный процесс один раз импортирует приложение, и init_database выполняет
+схему и миграции. Затем он закрывает свои соединения с базой, открывает
+слушающий сокет и запускает рабочие процессы через fork. Каждый рабочий
+процесс принимает соединения с общего сокета своим многопоточным
+WSGI-сервером. Соединения SQLite он открывает уже после fork
+(MultivarkaDatabase._after_fork). Кэши процессов согласуются через общие
+счетчики изменений в таблице revisions.
+
+Упавший рабочий процесс перезапускается; SIGTERM или SIGINT главному
+процессу останавливает все рабочие.
+"""
+
+import os
+import signal
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from werkzeug.serving import make_server
+
+from app import app, db
+
+# Рабочий процесс, проживший меньше, перезапускается с паузой (защита от частых падений)
+MIN_WORKER_LIFETIME = 1.0
+# Сколько ждать завершения рабочих процессов после SIGTERM
+SHUTDOWN_TIMEOUT = 10.0
+
+
+def default_workers() -> int:
+    """Число рабочих процессов по умолчанию — по числу ядер"""
+    return os.cpu_count() or 1
+
+
+class PreforkServer:
+    """Главный процесс: общий сокет и N рабочих процессов"""
+
+    def __init__(self, host: str, port: int, workers: int):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.children = {}  # pid -> время запуска
+        self.stopping = False
+        self.socket = None
+
+    def _bind(self):
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(128)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            self._serve_worker()
+        self.children[pid] = time.monotonic()
+
+    def _serve_worker(self):
+        """Тело рабочего процесса; никогда не возвращается"""
+        code = 0
+        try:
+            # Ctrl+C получает вся группа процессов — останавливает их главный процесс
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            server = make_server(self.host, self.port, app, threaded=True, fd=self.socket.fileno())
+            server.serve_forever()
+        except Exception as e:
+            print(f"❌ Рабочий процесс {os.getpid()} завершился с ошибкой: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _stop(self, signum, frame):
+        if not self.stopping:
+            print(f"\n⏹️  Остановка {len(self.children)} рабочих процессов...")
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        # Работа до fork выполнена при импорте; соединения откроются в рабочих процессах
+        db.close()
+        self.socket = self._bind()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        for _ in range(self.workers):
+            self._spawn()
+        print(f"✅ Запущено {self.workers} рабочих процессов (главный PID {os.getpid()})")
+
+        stop_deadline = None
+        while self.children:
+            if self.stopping and stop_deadline is None:
+                stop_deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG if stop_deadline else 0)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                if time.monotonic() > stop_deadline:
+                    for child in list(self.children):
+                        os.kill(child, signal.SIGKILL)
+                    stop_deadline = float('inf')
+                time.sleep(0.1)
+                continue
+
+            started = self.children.pop(pid, None)
+            if self.stopping or started is None:
+                continue
+            print(f"⚠️  Рабочий процесс {pid} завершился (код {status}), перезапускаем")
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+            self._spawn()
+
+        self.socket.close()
+        print("👋 Сервер остановлен")
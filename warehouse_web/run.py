@@ -5,6 +5,7 @@
 Скрипт для запуска веб-сервера управления складом
 """
 
+import argparse
 import os
 import sys
 
@@ -13,14 +14,50 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app import app
 
+
+def run_asgi(host, port):
+    """Запускает приложение через ASGI-сервер uvicorn (см. asgi.py)"""
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ Для режима ASGI нужен uvicorn: pip install -r requirements-asgi.txt")
+        sys.exit(1)
+    uvicorn.run('asgi:application', host=host, port=port, log_level='info')
+
+
+def run_prefork(host, port, workers):
+    """Запускает несколько рабочих процессов на общем сокете (см. prefork.py)"""
+    if not hasattr(os, 'fork'):
+        print("❌ Многопроцессный режим доступен только в Unix-системах")
+        sys.exit(1)
+    from prefork import PreforkServer, default_workers
+    PreforkServer(host, port, default_workers() if workers is None else max(1, workers)).run()
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Веб-сервер управления складом")
+    parser.add_argument('--asgi', action='store_true',
+                        help="рабочий режим: ASGI-сервер uvicorn с пулом потоков для базы данных")
+    parser.add_argument('--prefork', action='store_true',
+                        help="рабочий режим: несколько процессов с общим сокетом и базой данных")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="число рабочих процессов для --prefork (по умолчанию — число ядер)")
+    parser.add_argument('--host', default='0.0.0.0', help="адрес для прослушивания")
+    parser.add_argument('--port', type=int, default=8080, help="порт")
+    args = parser.parse_args()
+    
     print("🚀 Запуск веб-сервера управления складом...")
-    print("📱 Откройте браузер и перейдите по адресу: http://localhost:8080")
+    print(f"📱 Откройте браузер и перейдите по адресу: http://localhost:{args.port}")
     print("⏹️  Для остановки сервера нажмите Ctrl+C")
     print("-" * 50)
     
     try:
-        app.run(debug=True, host='0.0.0.0', port=8080)
+        if args.asgi:
+            run_asgi(args.host, args.port)
+        elif args.prefork:
+            run_prefork(args.host, args.port, args.workers)
+        else:
+            app.run(debug=True, host=args.host, port=args.port)
     except KeyboardInterrupt:
         print("\n👋 Сервер остановлен")
     except Exception as e: